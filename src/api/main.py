@@ -1,32 +1,78 @@
 import os
 import json
-import joblib
-import pandas as pd
-import sqlite3
+import time
+import queue
+import asyncio
+import threading
+import numpy as np
 from datetime import datetime
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 # Internal imports
 from src.utils.rule_engine import RuleEngine
-from src.utils.llm_helper import generate_explanation
+from src.utils.customer_stats import CustomerAggregates
+from src.utils.velocity import VelocityStore
+from src.utils.db_pool import get_pool, close_all
+from src.utils.prediction_writer import PredictionWriter, WRITE_BEHIND, write_rows
+from src.utils.db_schema import ensure_column, ensure_unique_index, migrate_model_predictions
+from src.utils.prediction_cache import PredictionCache, PREDICTION_LOOKUP_DB, load_stored_predictions
+from src.utils.llm_helper import ExplanationService
+from src.utils.compiled_model import CompiledModel
+from src.utils.score_table import ScoreTable, SCORE_TABLE, TABLE_FILE, model_fingerprint
+from src.utils.model_registry import ModelRegistry, ModelWatcher, UnknownVersion
+from src.utils.runtime_metrics import metrics
+from src.utils.backpressure import BoundedExecutor, InFlightLimiter, Overloaded, RETRY_AFTER_S
+from src.utils.micro_batcher import MicroBatcher, MICROBATCH
 
-# Paths
+# Paths (models are resolved through the registry, see src/utils/model_registry.py)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-MODEL_PATH = os.path.join(BASE_DIR, 'models', 'fraud_model.pkl')
 METRICS_PATH = os.path.join(BASE_DIR, 'models', 'metrics.json')
 DB_PATH = os.path.join(BASE_DIR, 'data', 'processed', 'transactions.db')
 
+# Model inputs, in the order the Pipeline was trained on
+FEATURE_COLUMNS = ['account_age_days', 'transaction_amount', 'channel', 'kyc_verified_flag', 'hour', 'weekday']
+MAX_BATCH_SIZE = 10000
+# Above this many rows the sklearn Pipeline is faster than the compiled engine
+COMPILED_MAX_ROWS = 256
+# 'full': serve from the memory-mapped compiled engine as soon as it is loaded
+#   and unpickle the Pipeline in the background (before serving if there is
+#   no compiled artifact). /health reports 'warming' until it is attached.
+# 'eager': load the Pipeline and the compiled engine before serving.
+# 'shared': load only the memory-mapped compiled engine, so worker processes
+# share one copy of the model through the OS page cache (see src/scripts/serve.py).
+# pandas, joblib and sklearn are only imported with the Pipeline.
+MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "full")
+# Poll the registry for a new active version every N seconds (0 disables)
+MODEL_WATCH_INTERVAL_S = float(os.getenv("MODEL_WATCH_INTERVAL_S", "0"))
+
 # Global variables
-model = None
+model_registry = ModelRegistry()
+model_bundle = None  # Active ModelBundle; replaced as a whole on reload
+model = None  # Active Pipeline (model_bundle.pipeline)
+compiled_model = None  # NumPy-only engine exported from the same Pipeline
+model_watcher = None
+reload_lock = threading.Lock()
+reload_status = {'state': 'idle', 'version': None, 'error': None, 'finished_at': None}
+# cold: no model serving yet; warming: serving, deferred loading still running; warm
+startup_status = {'state': 'cold', 'started': None, 'ready_s': None, 'warm_s': None, 'error': None}
 rule_engine = None
+customer_stats = CustomerAggregates()
+velocity_store = VelocityStore()
+prediction_cache = PredictionCache()  # Results by transaction_id, so retries are not re-scored
+prediction_writer = None  # Background writer when write-behind is enabled
+explanation_service = None
+inference_executor = None  # Bounded pool for CPU work on the async /predict path
+scorer = None  # MicroBatcher coalescing concurrent /predict calls (None when MICROBATCH=0)
+admission = InFlightLimiter()  # Caps concurrent /predict requests
 
 def init_db():
     """Initialize SQLite database and tables."""
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_pool(DB_PATH).acquire()
     cursor = conn.cursor()
     
     # 1. Model Predictions Table (Existing)
@@ -38,9 +84,21 @@ def init_db():
             features_json TEXT,
             risk_score REAL,
             prediction INTEGER,
-            created_at TEXT
+            created_at TEXT,
+            model_version TEXT,
+            account_age_days REAL,
+            transaction_amount REAL,
+            channel TEXT,
+            kyc_verified_flag INTEGER,
+            hour INTEGER,
+            weekday INTEGER
         )
     ''')
+    ensure_column(cursor, 'model_predictions', 'model_version', 'TEXT')
+    # Typed feature columns + indexes; backfills rows that only have features_json
+    backfilled = migrate_model_predictions(cursor)
+    if backfilled:
+        print(f"Backfilled typed features for {backfilled} predictions")
     
     # 2. Fraud Alerts Table (New)
     cursor.execute('''
@@ -50,37 +108,259 @@ def init_db():
             customer_id TEXT,
             risk_score REAL,
             reason TEXT,
-            created_at TEXT
+            created_at TEXT,
+            explanation TEXT
         )
     ''')
+    # AI explanation is filled in asynchronously after the alert is written
+    ensure_column(cursor, 'fraud_alerts', 'explanation', 'TEXT')
+    # One alert per transaction; explanation write-backs and lookups are by transaction_id
+    ensure_unique_index(cursor, 'fraud_alerts', 'transaction_id', 'idx_alerts_transaction_id',
+                        fallback='idx_alerts_transaction')
     
     conn.commit()
     conn.close()
 
+class ModelBundle:
+    """A loaded model version: the Pipeline and/or its compiled engine."""
+
+    def __init__(self, version, pipeline, compiled, table=None, model_path=None):
+        self.version = version
+        self.pipeline = pipeline
+        self.compiled = compiled
+        self.table = table  # Precomputed ScoreTable (SCORE_TABLE=1), else None
+        self.model_path = model_path  # Pipeline to load later when it was deferred
+
+def load_compiled_model(compiled_path, model_path):
+    """Load the compiled engine if it exists and is not older than the Pipeline."""
+    meta_path = os.path.join(compiled_path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    if os.path.exists(model_path) and os.path.getmtime(meta_path) < os.path.getmtime(model_path):
+        print(f"Compiled model at {compiled_path} is older than {model_path}; not using it")
+        return None
+    try:
+        compiled = CompiledModel.load(compiled_path)
+        print(f"Compiled model loaded from {compiled_path}")
+        return compiled
+    except Exception as e:
+        print(f"Error loading compiled model: {e}")
+        return None
+
+def load_score_table(table_path, model_path):
+    """Load the score table if it exists and is not older than the Pipeline."""
+    if not os.path.exists(table_path):
+        print(f"SCORE_TABLE=1 but {table_path} does not exist; scoring exactly")
+        return None
+    if os.path.exists(model_path) and os.path.getmtime(table_path) < os.path.getmtime(model_path):
+        print(f"Score table at {table_path} is older than {model_path}; not using it")
+        return None
+    table = ScoreTable.load(table_path)
+    print(f"Score table loaded from {table_path} ({table.cells} cells, band {table.band:.3f})")
+    return table
+
+def load_model_bundle(version=None, defer_pipeline=False):
+    """
+    Load a registry version (default: the active one). With defer_pipeline
+    and a compiled engine available, the Pipeline is left for load_deferred().
+    """
+    paths = model_registry.resolve(version)
+    if paths is None:
+        raise FileNotFoundError("No model available in the registry or models/")
+
+    compiled = load_compiled_model(paths['compiled_path'], paths['model_path'])
+    pipeline = None
+    if MODEL_LOAD_MODE == "shared" and compiled is not None:
+        print("Shared model mode: serving from the memory-mapped compiled model only")
+    elif defer_pipeline and compiled is not None:
+        print("Serving from the compiled model; the Pipeline loads in the background")
+    else:
+        import joblib
+        pipeline = joblib.load(paths['model_path'])
+        print(f"Model loaded from {paths['model_path']} (version {paths['version']})")
+    table = None
+    if SCORE_TABLE:
+        table = load_score_table(os.path.join(os.path.dirname(paths['model_path']), TABLE_FILE),
+                                 paths['model_path'])
+    return ModelBundle(paths['version'], pipeline, compiled, table, model_path=paths['model_path'])
+
+WARMUP_ROWS = [
+    {'account_age_days': 365.0, 'transaction_amount': 50.0, 'channel': 'Pos',
+     'kyc_verified_flag': 1, 'hour': 12, 'weekday': 2},
+    {'account_age_days': 3.0, 'transaction_amount': 25000.0, 'channel': 'web',
+     'kyc_verified_flag': 0, 'hour': 3, 'weekday': 6},
+]
+
+def warm_up(bundle):
+    """
+    Score a few rows with each engine; the engines must agree. A score table
+    built for another model is dropped (the bundle scores exactly).
+    """
+    probas = []
+    if bundle.compiled is not None:
+        probas.append(bundle.compiled.predict_proba(WARMUP_ROWS))
+    if bundle.pipeline is not None:
+        import pandas as pd
+        probas.append(bundle.pipeline.predict_proba(pd.DataFrame(WARMUP_ROWS, columns=FEATURE_COLUMNS)))
+    if len(probas) == 2 and not np.allclose(probas[0], probas[1], rtol=0, atol=1e-9):
+        raise ValueError(f"Compiled model disagrees with Pipeline for version {bundle.version}")
+    if bundle.table is not None and bundle.compiled is not None:
+        if bundle.table.fingerprint != model_fingerprint(bundle.compiled):
+            print(f"WARNING: score table was built for another model than version {bundle.version}; "
+                  f"scoring exactly. Rebuild it with python -m src.utils.score_table")
+            bundle.table = None
+
+def activate(bundle):
+    """Swap the serving model. Requests in flight keep the bundle they started with."""
+    global model_bundle, model, compiled_model
+    model_bundle = bundle
+    model = bundle.pipeline
+    compiled_model = bundle.compiled
+
+def reload_model(version=None, defer_pipeline=False):
+    """Load, warm up and activate a model version. Only one reload runs at a time."""
+    if not reload_lock.acquire(blocking=False):
+        raise RuntimeError("A model reload is already in progress")
+    try:
+        reload_status.update(state='loading', version=version, error=None)
+        bundle = load_model_bundle(version, defer_pipeline)
+        warm_up(bundle)
+        activate(bundle)
+        reload_status.update(state='idle', version=bundle.version, finished_at=datetime.now().isoformat())
+        metrics.incr('model_reloads')
+        print(f"Serving model version {bundle.version}")
+        return bundle.version
+    except Exception as e:
+        reload_status.update(state='failed', error=str(e), finished_at=datetime.now().isoformat())
+        raise
+    finally:
+        reload_lock.release()
+
+def load_deferred(bundle, started):
+    """
+    Background part of startup: page in the memory-mapped compiled engine,
+    then unpickle the deferred Pipeline, check it against the compiled engine
+    and attach it to the serving bundle.
+    """
+    global model
+    try:
+        if bundle.compiled is not None:
+            with metrics.timer('startup_page_in'):
+                bundle.compiled.page_in()
+        if bundle.pipeline is None and MODEL_LOAD_MODE == "full":
+            with metrics.timer('startup_pipeline'):
+                import joblib
+                pipeline = joblib.load(bundle.model_path)
+                warm_up(ModelBundle(bundle.version, pipeline, bundle.compiled))
+            bundle.pipeline = pipeline
+            if model_bundle is bundle:
+                model = pipeline
+            print(f"Pipeline loaded from {bundle.model_path} (version {bundle.version})")
+    except Exception as e:
+        startup_status['error'] = str(e)
+        print(f"Error loading deferred model: {e}")
+    if startup_status['started'] == started:  # not superseded by a later startup
+        startup_status.update(state='warm', warm_s=time.perf_counter() - started)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Load model and init DB
-    global model, rule_engine
+    global rule_engine, prediction_writer, explanation_service, model_watcher, inference_executor, scorer
+    started = time.perf_counter()
+    startup_status.update(state='cold', started=started, ready_s=None, warm_s=None, error=None)
     try:
-        model = joblib.load(MODEL_PATH)
-        print(f"Model loaded from {MODEL_PATH}")
+        with metrics.timer('startup_model'):
+            reload_model(defer_pipeline=MODEL_LOAD_MODE == "full")
     except Exception as e:
         print(f"Error loading model: {e}")
+
+    if MODEL_WATCH_INTERVAL_S > 0:
+        model_watcher = ModelWatcher(model_registry, reload_model, MODEL_WATCH_INTERVAL_S)
+        model_watcher.start()
+        print(f"Watching model registry every {MODEL_WATCH_INTERVAL_S}s")
     
+    init_db()
+    print(f"Database initialized at {DB_PATH}")
+
     try:
-        rule_engine = RuleEngine(DB_PATH)
-        print("Rule Engine initialized")
+        n_customers = customer_stats.warm_from_db(DB_PATH)
+        print(f"Customer aggregates warmed ({n_customers} customers)")
+    except Exception as e:
+        print(f"Error warming customer aggregates: {e}")
+
+    try:
+        n_events = velocity_store.warm_from_db(DB_PATH)
+        print(f"Velocity store warmed ({n_events} transactions, {len(velocity_store)} customers)")
+    except Exception as e:
+        print(f"Error warming velocity store: {e}")
+    metrics.register_gauges('velocity', velocity_store.stats)
+    metrics.register_gauges('prediction_cache', prediction_cache.stats)
+
+    try:
+        rule_engine = RuleEngine(DB_PATH, aggregates=customer_stats, velocity=velocity_store)
+        metrics.register_gauges('rules', rule_engine.rule_stats)
+        print(f"Rule Engine initialized ({len(rule_engine.plan.rules)} rules from {rule_engine.rules_path})")
     except Exception as e:
         print(f"Error initializing Rule Engine: {e}")
-        
-    init_db()
-    print(f"Database initialized at {DB_PATH}")
-    
+
+    if WRITE_BEHIND:
+        prediction_writer = PredictionWriter(DB_PATH, on_inserted=count_inserted)
+        prediction_writer.start()
+        metrics.register_gauges('write_behind', prediction_writer.stats)
+        print("Write-behind persistence started")
+
+    explanation_service = ExplanationService(on_result=save_explanation)
+    metrics.register_gauges('llm_cache', explanation_service.cache.stats)
+
+    inference_executor = BoundedExecutor()
+    metrics.register_gauges('inference', inference_executor.stats)
+    metrics.register_gauges('admission', admission.stats)
+    if MICROBATCH:
+        scorer = MicroBatcher(evaluate_transactions, inference_executor)
+        scorer.start()
+        metrics.register_gauges('microbatch', scorer.stats)
+
+    # Serving from here; paging in and the deferred Pipeline finish in the background
+    startup_status['ready_s'] = time.perf_counter() - started
+    if model_bundle is not None:
+        startup_status['state'] = 'warming'
+        threading.Thread(target=load_deferred, args=(model_bundle, started), daemon=True,
+                         name="model-warmup").start()
+    print(f"Ready in {startup_status['ready_s']:.2f}s")
+
     yield
-    # Clean up if needed
+    # Clean up: finish explanations, then flush pending writes before closing connections
+    if model_watcher is not None:
+        model_watcher.stop()
+        model_watcher = None
+    if scorer is not None:
+        metrics.unregister_gauges('microbatch')
+        await scorer.stop()
+        scorer = None
+    await explanation_service.aclose()
+    explanation_service = None
+    metrics.unregister_gauges('inference')
+    metrics.unregister_gauges('admission')
+    inference_executor.shutdown()
+    inference_executor = None
+    metrics.unregister_gauges('velocity')
+    metrics.unregister_gauges('prediction_cache')
+    metrics.unregister_gauges('rules')
+    if prediction_writer is not None:
+        metrics.unregister_gauges('write_behind')
+        prediction_writer.stop()
+        prediction_writer = None
+    close_all()
 
 app = FastAPI(title="Fraud Detection API", lifespan=lifespan)
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc):
+    """Shed load: 429 (too many requests in flight) or 503 (inference queue full)."""
+    metrics.incr(f'rejected_{exc.status_code}')
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail},
+                        headers={"Retry-After": str(RETRY_AFTER_S)})
+
 class TransactionInput(BaseModel):
     transaction_id: str
     customer_id: str
@@ -100,43 +380,67 @@ class PredictionOutput(BaseModel):
 
 @app.get("/metrics")
 def get_metrics():
-    if not os.path.exists(METRICS_PATH):
+    # Metrics of the serving registry version, else the legacy models/metrics.json
+    metrics_path = METRICS_PATH
+    bundle = model_bundle
+    if bundle is not None and bundle.version in model_registry.list_versions():
+        version_metrics = os.path.join(model_registry.version_dir(bundle.version), 'metrics.json')
+        if os.path.exists(version_metrics):
+            metrics_path = version_metrics
+    if not os.path.exists(metrics_path):
         raise HTTPException(status_code=404, detail="Metrics not found")
-    with open(METRICS_PATH, 'r') as f:
+    with open(metrics_path, 'r') as f:
         return json.load(f)
 
-@app.post("/predict", response_model=PredictionOutput)
-def predict(txn: TransactionInput):
-    global model, rule_engine
-    
-    if model is None:
-        raise HTTPException(status_code=503, detail="Model not loaded")
-    
-    # 1. Prepare input for Model
-    input_data = {
-        'account_age_days': [txn.account_age_days],
-        'transaction_amount': [txn.transaction_amount],
-        'channel': [txn.channel],
-        'kyc_verified_flag': [txn.kyc_verified_flag],
-        'hour': [txn.hour],
-        'weekday': [txn.weekday]
-    }
-    df = pd.DataFrame(input_data)
-    
-    # 2. ML Prediction
-    try:
-        risk_score = float(model.predict_proba(df)[:, 1][0])
-        ml_prediction = int(model.predict(df)[0])
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
-    
-    # 3. Rule Engine
-    rule_result = rule_engine.check_rules(txn.dict())
-    
-    # 4. Combine Logic
-    # Fraud if ML says fraud OR Rule Engine says fraud
+def build_features(txns):
+    """Build the model input frame (one row per transaction) in column order."""
+    import pandas as pd
+    return pd.DataFrame(
+        [[getattr(txn, col) for col in FEATURE_COLUMNS] for txn in txns],
+        columns=FEATURE_COLUMNS
+    )
+
+def score(txns, bundle=None):
+    """
+    Run the model once over a list of transactions.
+    With a score table (SCORE_TABLE=1), rows are answered from it and only
+    the rows it cannot answer (off-grid or near the decision threshold) are
+    scored exactly. Small inputs use the compiled engine, large batches (or
+    no compiled artifact) go through the sklearn Pipeline.
+    Returns (risk_scores, ml_predictions) as numpy arrays. The class label is
+    derived from the same probabilities instead of a second model.predict pass.
+    """
+    bundle = bundle or model_bundle
+    if bundle.table is not None:
+        with metrics.timer('score_table'):
+            risk_scores = bundle.table.lookup(txns)
+        exact = np.flatnonzero(np.isnan(risk_scores))
+        metrics.incr('score_table_hits', len(txns) - len(exact))
+        if len(exact):
+            metrics.incr('score_table_fallbacks', len(exact))
+            risk_scores[exact] = score_exact([txns[i] for i in exact], bundle)[0]
+        return risk_scores, bundle.table.predict(risk_scores).astype(int)
+    return score_exact(txns, bundle)
+
+def score_exact(txns, bundle):
+    """score() with the full model."""
+    if bundle.compiled is not None and (len(txns) <= COMPILED_MAX_ROWS or bundle.pipeline is None):
+        engine = bundle.compiled
+        with metrics.timer('predict_proba'):
+            proba = engine.predict_proba(txns)
+    else:
+        engine = bundle.pipeline
+        with metrics.timer('build_features'):
+            df = build_features(txns)
+        with metrics.timer('predict_proba'):
+            proba = engine.predict_proba(df)
+    ml_predictions = engine.classes_.take(np.argmax(proba, axis=1)).astype(int)
+    return proba[:, 1].astype(float), ml_predictions
+
+def combine_verdict(risk_score, ml_prediction, rule_result):
+    """Fraud if ML says fraud OR Rule Engine says fraud. Returns (is_fraud, reason)."""
     is_fraud = bool(ml_prediction == 1) or rule_result['triggered']
-    
+
     final_reason = ""
     if is_fraud:
         reasons = []
@@ -145,62 +449,437 @@ def predict(txn: TransactionInput):
         if rule_result['triggered']:
             reasons.append(f"Rules: {rule_result['reason']}")
         final_reason = " | ".join(reasons)
-        
-        # 5. LLM Explanation (Optional)
-        # Only call if we have a real fraud case to explain
-        try:
-            llm_explanation = generate_explanation(
-                txn.dict(),
-                risk_score,
-                rule_result['rules_triggered'] if rule_result['triggered'] else ["High ML Risk Score"]
-            )
-            if llm_explanation:
-                 final_reason += f" | AI Explanation: {llm_explanation}"
-        except Exception as e:
-            print(f"LLM Error: {e}")
+    return is_fraud, final_reason
 
-    # 6. Persistence
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Log prediction
-        cursor.execute('''
-            INSERT INTO model_predictions 
-            (transaction_id, customer_id, features_json, risk_score, prediction, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
+def persist_predictions(records, model_version=None, block=True):
+    """
+    Persist predictions (and alerts for fraud).
+    Rows go to the background writer when write-behind is enabled,
+    otherwise they are written in a single transaction.
+    records: list of (txn, features, risk_score, is_fraud, reason, explanation);
+    an explanation (or None) is stored with the transaction's alert.
+    With block=False, stops at a full write-behind queue instead of waiting
+    and returns the records that were not persisted (else []).
+    The user averages and velocity windows are updated only for rows that
+    were inserted (count_inserted), once they are committed; a retry whose
+    transaction_id is already stored is not counted again.
+    """
+    now = datetime.now().isoformat()
+    prediction_rows = []
+    alert_rows = []
+    explanation_rows = []
+    remaining = []
+    for i, (txn, features, risk_score, is_fraud, reason, explanation) in enumerate(records):
+        prediction_row = (
             txn.transaction_id,
             txn.customer_id,
-            json.dumps(input_data),
+            json.dumps(features),
             risk_score,
             1 if is_fraud else 0, # Storing final decision
-            datetime.now().isoformat()
-        ))
-        
-        # Log Alert if Fraud
+            now,
+            model_version,
+            *(getattr(txn, c) for c in FEATURE_COLUMNS)
+        )
+        alert_row = (txn.transaction_id, txn.customer_id, risk_score, reason, now) if is_fraud else None
+        explanation_row = (explanation, txn.transaction_id) if is_fraud and explanation else None
+
+        if prediction_writer is not None:
+            try:
+                prediction_writer.submit(prediction_row, alert_row, explanation_row, block=block)
+            except queue.Full:
+                records, remaining = records[:i], records[i:]
+                break
+        else:
+            prediction_rows.append(prediction_row)
+            if alert_row is not None:
+                alert_rows.append(alert_row)
+            if explanation_row is not None:
+                explanation_rows.append(explanation_row)
+
+    if prediction_rows:
+        with metrics.timer('db_write'), get_pool(DB_PATH).connection() as conn:
+            inserted = write_rows(conn, prediction_rows, alert_rows, explanation_rows)
+        count_inserted(inserted)
+    return remaining
+
+def count_inserted(prediction_rows):
+    """Keep the in-memory user averages and velocity windows in step with the inserted predictions."""
+    for row in prediction_rows:
+        transaction_id, customer_id, created_at, amount = row[0], row[1], row[5], row[8]
+        customer_stats.update(customer_id, amount)
+        velocity_store.add(customer_id, amount, datetime.fromisoformat(created_at).timestamp(), transaction_id)
+
+def lookup_predictions(transaction_ids):
+    """
+    Results of transactions that were already scored: from the prediction
+    cache, else (PREDICTION_LOOKUP_DB) from the DB, for retries after
+    eviction, a restart or to another worker. Returns {transaction_id: result}
+    for the ids found.
+    """
+    results = {}
+    missing = []
+    for transaction_id in transaction_ids:
+        cached = prediction_cache.get(transaction_id)
+        if cached is not None:
+            results[transaction_id] = cached
+        else:
+            missing.append(transaction_id)
+    if missing and PREDICTION_LOOKUP_DB:
+        try:
+            with metrics.timer('lookup_prediction'), get_pool(DB_PATH).connection() as conn:
+                stored = load_stored_predictions(conn, missing)
+        except Exception as e:
+            print(f"DB Error: {e}")
+            stored = {}
+        for transaction_id, result in stored.items():
+            prediction_cache.put(transaction_id, result)
+        results.update(stored)
+    if results:
+        metrics.incr('prediction_replays', len(results))
+    return results
+
+def save_explanation(transaction_id, explanation):
+    """
+    Write an AI explanation back to its fraud_alerts row. Runs in a worker
+    thread (see ExplanationService). When the write-behind queue is full the
+    write-back is dropped and counted ('explanation_writes_dropped'); the
+    explanation is still served from memory by GET /alerts/{id}/explanation.
+    """
+    if prediction_writer is not None:
+        try:
+            prediction_writer.submit_explanation(transaction_id, explanation, block=False)
+        except queue.Full:
+            metrics.incr('explanation_writes_dropped')
+            print(f"Write-behind queue full; explanation for {transaction_id} not saved")
+    else:
+        with get_pool(DB_PATH).connection() as conn:
+            write_rows(conn, [], [], [(explanation, transaction_id)])
+
+@app.get("/metrics/persistence")
+def get_persistence_metrics():
+    """Write-behind queue depth, commit counts and flush latency."""
+    if prediction_writer is None:
+        return {"write_behind": False}
+    return {"write_behind": True, **prediction_writer.stats()}
+
+@app.get("/health")
+def get_health():
+    """
+    Readiness: 503 while no model is serving ('cold'), else 200 with
+    'warming' (deferred loading still running) or 'warm'.
+    """
+    bundle = model_bundle
+    body = {
+        "status": startup_status['state'] if bundle else "cold",
+        "version": bundle.version if bundle else None,
+        "engines": {
+            "pipeline": bool(bundle and bundle.pipeline is not None),
+            "compiled": bool(bundle and bundle.compiled is not None),
+        },
+        "ready_s": startup_status['ready_s'],
+        "warm_s": startup_status['warm_s'],
+        "error": startup_status['error'],
+    }
+    if bundle is None:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@app.get("/model")
+def get_model_info():
+    """Active model version, loaded engines and registry contents."""
+    bundle = model_bundle
+    return {
+        "version": bundle.version if bundle else None,
+        "engines": {
+            "pipeline": bool(bundle and bundle.pipeline is not None),
+            "compiled": bool(bundle and bundle.compiled is not None),
+        },
+        # Size, band and measured error of the lookup table when SCORE_TABLE=1
+        "score_table": bundle.table.stats() if bundle and bundle.table is not None else None,
+        "registry_current": model_registry.current_version(),
+        "available_versions": model_registry.list_versions(),
+        "reload": dict(reload_status),
+    }
+
+@app.post("/model/reload", status_code=202)
+def post_model_reload(version: Optional[str] = None, wait: bool = False):
+    """
+    Load a model version (default: the registry's active one) in the background,
+    warm it up and swap it in. With wait=true, respond once the swap is done.
+    Only published versions are loaded; anything else is a 404.
+    """
+    if version is not None and version not in model_registry.list_versions():
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    if reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+    if wait:
+        try:
+            return {"status": "reloaded", "version": reload_model(version)}
+        except UnknownVersion as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Reload failed: {e}")
+
+    def run():
+        try:
+            reload_model(version)
+        except Exception as e:
+            print(f"Model reload failed: {e}")
+
+    threading.Thread(target=run, name="model-reload", daemon=True).start()
+    return {"status": "reloading", "version": version}
+
+@app.get("/rules")
+def get_rules():
+    """Loaded rules in evaluation order, with per-rule evaluation counts, hits and latency."""
+    if rule_engine is None:
+        raise HTTPException(status_code=503, detail="Rule Engine not initialized")
+    return {"path": rule_engine.rules_path, "rules": rule_engine.plan.describe()}
+
+@app.post("/rules/reload")
+def post_rules_reload():
+    """Recompile the rules file now; the current rules stay active if it is invalid."""
+    if rule_engine is None:
+        raise HTTPException(status_code=503, detail="Rule Engine not initialized")
+    try:
+        plan = rule_engine.reload_rules()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Reload failed: {e}")
+    return {"status": "reloaded", "rules": len(plan.rules)}
+
+@app.get("/metrics/runtime")
+def get_runtime_metrics(format: str = "json"):
+    """
+    Hot-path stage latencies, counters and gauges.
+    format=json (default) or format=prometheus for the text exposition format.
+    """
+    if format == "prometheus":
+        return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+    return metrics.to_json()
+
+def evaluate_transactions(txns, bundle=None):
+    """
+    Model scores (one call) and rule checks for a list of /predict requests.
+    CPU work; runs on the inference executor, batched by the MicroBatcher.
+    Returns (risk_score, ml_prediction, rule_result, model_version) per
+    transaction, or an HTTPException for a transaction that failed; the
+    MicroBatcher raises it to that request only.
+    """
+    # Snapshot the active model so a concurrent reload cannot mix versions
+    bundle = bundle or model_bundle
+    try:
+        risk_scores, ml_predictions = score(txns, bundle)
+    except Exception as e:
+        if len(txns) > 1:
+            # Score each transaction alone so a bad one fails only its own request
+            return [evaluate_transactions([txn], bundle)[0] for txn in txns]
+        metrics.incr('prediction_errors')
+        return [HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")]
+    results = []
+    for txn, risk_score, ml_prediction in zip(txns, risk_scores, ml_predictions):
+        try:
+            with metrics.timer('check_rules'):
+                rule_result = rule_engine.check_rules(txn.dict())
+        except Exception as e:
+            metrics.incr('prediction_errors')
+            results.append(HTTPException(status_code=500, detail=f"Rule engine error: {str(e)}"))
+            continue
+        results.append((float(risk_score), int(ml_prediction), rule_result, bundle.version))
+    return results
+
+@app.post("/predict", response_model=PredictionOutput)
+async def predict(txn: TransactionInput):
+    """
+    Score one transaction. Runs on the event loop: CPU work goes to the
+    bounded inference executor (coalesced with concurrent requests into one
+    model call by the MicroBatcher), the LLM call is made with httpx in the
+    background and DB access runs off the loop. Returns 429 when too many
+    requests are in flight and 503 when the inference queue is full.
+    """
+    with admission:
+        # 0. Retry of an already scored transaction: return the stored verdict
+        if PREDICTION_LOOKUP_DB:
+            stored = await asyncio.to_thread(lookup_predictions, [txn.transaction_id])
+        else:
+            stored = lookup_predictions([txn.transaction_id])
+        if stored:
+            return stored[txn.transaction_id]
+
+        if model_bundle is None:
+            raise HTTPException(status_code=503, detail="Model not loaded")
+        start = time.perf_counter()
+
+        # 1-3. ML Prediction and Rule Engine
+        if scorer is not None:
+            evaluated = await scorer.submit(txn)
+        else:
+            evaluated = (await inference_executor.run(evaluate_transactions, [txn]))[0]
+            if isinstance(evaluated, Exception):
+                raise evaluated
+        risk_score, ml_prediction, rule_result, model_version = evaluated
+
+        # 4. Combine Logic
+        is_fraud, final_reason = combine_verdict(risk_score, ml_prediction, rule_result)
+
+        llm_explanation = None
         if is_fraud:
-            cursor.execute('''
-                INSERT INTO fraud_alerts
-                (transaction_id, customer_id, risk_score, reason, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
+            # 5. LLM Explanation (Optional)
+            # A cached explanation for similar alerts is returned right away and stored
+            # with the alert; otherwise one is generated once the alert is persisted.
+            explanation_args = (
                 txn.transaction_id,
-                txn.customer_id,
-                risk_score,
-                final_reason,
-                datetime.now().isoformat()
-            ))
-            
-        conn.commit()
-        conn.close()
+                txn.dict(),
+                rule_result['rules_triggered'] if rule_result['triggered'] else ["High ML Risk Score"],
+                rule_result['rule_ids'] if rule_result['triggered'] else None
+            )
+            try:
+                llm_explanation = explanation_service.cached(*explanation_args)
+                if llm_explanation:
+                     final_reason += f" | AI Explanation: {llm_explanation}"
+            except Exception as e:
+                print(f"LLM Error: {e}")
+
+        result = {
+            "transaction_id": txn.transaction_id,
+            "risk_score": risk_score,
+            "is_fraud": is_fraud,
+            "prediction": 1 if is_fraud else 0,
+            "reason": final_reason if is_fraud else "Legit"
+        }
+        prediction_cache.put(txn.transaction_id, result)
+
+        # 6. Persistence: enqueue for the write-behind writer, or write on a worker thread
+        try:
+            features = {col: [getattr(txn, col)] for col in FEATURE_COLUMNS}
+            records = [(txn, features, risk_score, is_fraud, final_reason, llm_explanation)]
+            # Enqueue without blocking the loop; a full queue is waited on from a worker thread
+            if prediction_writer is not None:
+                records = persist_predictions(records, model_version, block=False)
+            if records:
+                await asyncio.to_thread(persist_predictions, records, model_version)
+        except Exception as e:
+            print(f"DB Error: {e}")
+
+        # 7. Cache miss: generate the explanation in the background; it is written back to
+        # the alert persisted (or enqueued) above and served by GET /alerts/{transaction_id}/explanation
+        if is_fraud and not llm_explanation:
+            transaction_id, transaction_data, rules_triggered, rule_ids = explanation_args
+            try:
+                explanation_service.request_async(transaction_id, transaction_data, risk_score,
+                                                  rules_triggered, rule_ids=rule_ids)
+            except Exception as e:
+                print(f"LLM Error: {e}")
+
+        metrics.observe('predict_total', time.perf_counter() - start)
+        metrics.incr('predictions')
+        if is_fraud:
+            metrics.incr('fraud_verdicts')
+
+        return result
+
+def evaluate_batch(txns, bundle):
+    """
+    Model scores (one vectorized call) and batched rule checks for
+    /predict/batch. CPU work; runs on the inference executor.
+    Returns (results, persistence records) in input order.
+    """
+    try:
+        risk_scores, ml_predictions = score(txns, bundle)
     except Exception as e:
-        print(f"DB Error: {e}")
+        metrics.incr('prediction_errors')
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
-    return {
-        "transaction_id": txn.transaction_id,
-        "risk_score": risk_score,
-        "is_fraud": is_fraud,
-        "prediction": 1 if is_fraud else 0,
-        "reason": final_reason if is_fraud else "Legit"
-    }
+    txn_dicts = [txn.dict() for txn in txns]
+    with metrics.timer('check_rules_batch'):
+        rule_results = rule_engine.check_rules_batch(txn_dicts)
+
+    results = []
+    records = []
+    for txn, txn_dict, risk_score, ml_prediction, rule_result in zip(
+        txns, txn_dicts, risk_scores, ml_predictions, rule_results
+    ):
+        risk_score = float(risk_score)
+        is_fraud, final_reason = combine_verdict(risk_score, int(ml_prediction), rule_result)
+        features = {col: [txn_dict[col]] for col in FEATURE_COLUMNS}
+        records.append((txn, features, risk_score, is_fraud, final_reason, None))
+        results.append({
+            "transaction_id": txn.transaction_id,
+            "risk_score": risk_score,
+            "is_fraud": is_fraud,
+            "prediction": 1 if is_fraud else 0,
+            "reason": final_reason if is_fraud else "Legit"
+        })
+    return results, records
+
+@app.post("/predict/batch", response_model=List[PredictionOutput])
+async def predict_batch(txns: List[TransactionInput]):
+    """
+    Score many transactions with a single vectorized model call.
+    Results are returned in input order. AI explanations are not generated
+    here, only on the single-transaction /predict path. Transactions that
+    were already scored (or repeat within the batch) are not scored again.
+    Admission and the inference executor are shared with /predict, so a
+    saturated server answers 429/503 here too.
+    """
+    if len(txns) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size exceeds {MAX_BATCH_SIZE}")
+    if not txns:
+        return []
+    with admission:
+        ids = {txn.transaction_id for txn in txns}
+        if PREDICTION_LOOKUP_DB:
+            stored = await asyncio.to_thread(lookup_predictions, ids)
+        else:
+            stored = lookup_predictions(ids)
+        pending = {}
+        for txn in txns:
+            if txn.transaction_id not in stored:
+                pending.setdefault(txn.transaction_id, txn)
+        if not pending:
+            return [stored[txn.transaction_id] for txn in txns]
+        all_txns, txns = txns, list(pending.values())
+
+        bundle = model_bundle
+        if bundle is None:
+            raise HTTPException(status_code=503, detail="Model not loaded")
+        start = time.perf_counter()
+
+        # 1-4. ML Prediction (one model call for the whole batch), rules, combine
+        results, records = await inference_executor.run(evaluate_batch, txns, bundle)
+        for result in results:
+            prediction_cache.put(result['transaction_id'], result)
+
+        # 5. Persistence (one bulk insert), off the event loop
+        try:
+            await asyncio.to_thread(persist_predictions, records, bundle.version)
+        except Exception as e:
+            print(f"DB Error: {e}")
+
+        metrics.observe('predict_batch_total', time.perf_counter() - start)
+        metrics.incr('batch_requests')
+        metrics.incr('predictions', len(results))
+        metrics.incr('fraud_verdicts', sum(1 for r in results if r['is_fraud']))
+        stored.update((r['transaction_id'], r) for r in results)
+        return [stored[txn.transaction_id] for txn in all_txns]
+
+@app.get("/alerts/{transaction_id}/explanation")
+def get_alert_explanation(transaction_id: str):
+    """
+    AI explanation for a fraud alert.
+    status is 'pending' while the explanation is being generated,
+    'ready' once available and 'failed' if generation did not succeed.
+    """
+    job = explanation_service.get(transaction_id) if explanation_service is not None else None
+    if job is not None:
+        return {"transaction_id": transaction_id, **job}
+
+    with get_pool(DB_PATH).connection() as conn:
+        row = conn.execute(
+            "SELECT explanation FROM fraud_alerts WHERE transaction_id = ? ORDER BY alert_id DESC LIMIT 1",
+            (transaction_id,)
+        ).fetchone()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    if row[0] is None:
+        return {"transaction_id": transaction_id, "status": "unavailable", "explanation": None}
+    return {"transaction_id": transaction_id, "status": "ready", "explanation": row[0]}
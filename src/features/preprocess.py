@@ -0,0 +1,86 @@
+"""
+Feature loading and preprocessing for model training
+----------------------------------------------------
+See docs/features.md for the dataset columns and preprocessing logic.
+
+Processed data can be stored as CSV or Parquet (see
+src/preprocessing/preprocess.py --format). Parquet keeps typed columns
+(categorical channel, int8 flags/hour/weekday), is read with column
+projection and memory-mapped I/O, and is preferred over a CSV path when
+an up-to-date .parquet file sits next to it. Parquet needs the optional
+pyarrow package.
+"""
+
+import os
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+NUMERIC_FEATURES = ['account_age_days', 'transaction_amount', 'kyc_verified_flag', 'hour', 'weekday']
+CATEGORICAL_FEATURES = ['channel']
+FEATURE_COLUMNS = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+TARGET = 'is_fraud'
+DROP_COLUMNS = ['transaction_id', 'customer_id', 'timestamp', 'kyc_verified']
+
+
+def pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def parquet_path_for(path):
+    return os.path.splitext(path)[0] + '.parquet'
+
+
+def resolve_data_path(path):
+    """Use the Parquet copy of a CSV file when it exists, is not older and can be read."""
+    if path.endswith('.parquet'):
+        return path
+    candidate = parquet_path_for(path)
+    if os.path.exists(candidate) and pyarrow_available() and (
+        not os.path.exists(path) or os.path.getmtime(candidate) >= os.path.getmtime(path)
+    ):
+        return candidate
+    return path
+
+
+def read_table(path, columns=None):
+    """Read a processed CSV or Parquet file, loading only the given columns."""
+    path = resolve_data_path(path)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    return pd.read_csv(path, usecols=columns)
+
+
+def load_data(path, columns=None):
+    """
+    Load processed data and split it into features X and target y.
+    By default only the model features and target are read.
+    """
+    columns = list(columns or FEATURE_COLUMNS)
+    df = read_table(path, columns=columns + [TARGET])
+    y = df[TARGET]
+    # Same column order for CSV and Parquet
+    X = df[[c for c in columns if c not in DROP_COLUMNS and c != TARGET]]
+    return X, y
+
+
+def get_preprocessing_pipeline():
+    """ColumnTransformer for the features in docs/features.md."""
+    numeric = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler()),
+    ])
+    categorical = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='most_frequent')),
+        ('onehot', OneHotEncoder(handle_unknown='ignore')),
+    ])
+    return ColumnTransformer(transformers=[
+        ('num', numeric, NUMERIC_FEATURES),
+        ('cat', categorical, CATEGORICAL_FEATURES),
+    ])
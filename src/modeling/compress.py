@@ -0,0 +1,270 @@
+"""
+Model compression: forest size and depth vs. accuracy
+-----------------------------------------------------
+The production forest has 200 unlimited-depth trees. Single-row scoring
+walks every tree to its leaf and the artifact grows with the node count, so
+smaller variants are often nearly as accurate at a fraction of the cost.
+This tool builds variants of a trained Pipeline and measures each one.
+
+Variant specs are comma-separated key=value pairs:
+    trees=50              keep the first 50 trees (they are i.i.d. bootstrap fits)
+    depth=12              truncate every tree at depth 12, without refitting: a
+                          node at that depth becomes a leaf with its class mix
+    trees=50,depth=12     both
+    distill=1,depth=10    fit a student (1 tree, or a forest of N trees) of that
+                          depth on the teacher's probabilities for the training rows
+
+The fitted preprocessor is shared, so every variant takes the same input and
+compiles to the NumPy engine (src/utils/compiled_model.py). For each variant
+the report has the on-disk size of the pickle and the compiled artifact,
+load time, single-row latency (compiled engine, the /predict path), latency
+for a 1000-row batch (Pipeline, the /predict/batch path) and ROC-AUC /
+recall on the same test split as train.py.
+
+    python src/modeling/compress.py
+    python src/modeling/compress.py --variants trees=20 depth=8 distill=1,depth=8
+    python src/modeling/compress.py --export trees=50,depth=12
+"""
+
+import sys
+import os
+import copy
+import time
+import shutil
+import argparse
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score, recall_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.tree._tree import Tree
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.features.preprocess import load_data
+from src.utils.compiled_model import CompiledModel, export_compiled_model
+from src.utils.model_registry import ModelRegistry
+
+DATA_PATH = 'data/processed/transactions_processed.csv'
+REPORT_PATH = os.path.join('models', 'compression_report.csv')
+DEFAULT_VARIANTS = [
+    'trees=100', 'trees=50', 'trees=20',
+    'depth=16', 'depth=12', 'depth=8',
+    'trees=50,depth=12', 'trees=20,depth=8',
+    'distill=1,depth=8', 'distill=1,depth=12', 'distill=20,depth=10',
+]
+SINGLE_ROW_CALLS = 200
+BATCH_ROWS = 1000
+
+
+def parse_spec(spec):
+    """'trees=50,depth=12' -> {'trees': 50, 'depth': 12}"""
+    params = {}
+    for part in spec.split(','):
+        key, _, value = part.partition('=')
+        if key not in ('trees', 'depth', 'distill') or not value.isdigit() or int(value) < 1:
+            raise ValueError(f"Invalid variant '{spec}': expected trees=N, depth=N and/or distill=N")
+        params[key] = int(value)
+    if 'distill' in params and 'trees' in params:
+        raise ValueError(f"Invalid variant '{spec}': distill=N sets the student's tree count")
+    return params
+
+
+def _truncate_tree(tree, max_depth):
+    """A copy of a fitted sklearn Tree cut at max_depth, with unreachable nodes removed."""
+    state = tree.__getstate__()
+    nodes, values = state['nodes'], state['values']
+    keep = []
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        keep.append((node, depth))
+        if depth < max_depth and nodes['left_child'][node] != -1:
+            stack.append((nodes['right_child'][node], depth + 1))
+            stack.append((nodes['left_child'][node], depth + 1))
+
+    new_index = {node: i for i, (node, _) in enumerate(keep)}
+    old = [node for node, _ in keep]
+    new_nodes = nodes[old].copy()
+    for i, (node, depth) in enumerate(keep):
+        if depth >= max_depth or nodes['left_child'][node] == -1:
+            new_nodes[i]['left_child'] = new_nodes[i]['right_child'] = -1
+            new_nodes[i]['feature'] = -2
+            new_nodes[i]['threshold'] = -2.0
+        else:
+            new_nodes[i]['left_child'] = new_index[nodes['left_child'][node]]
+            new_nodes[i]['right_child'] = new_index[nodes['right_child'][node]]
+
+    truncated = Tree(*tree.__reduce__()[1])
+    truncated.__setstate__({
+        'max_depth': min(state['max_depth'], max_depth),
+        'node_count': len(keep),
+        'nodes': new_nodes,
+        'values': values[old].copy(),
+    })
+    return truncated
+
+
+def subset_trees(classifier, n_trees):
+    classifier = copy.deepcopy(classifier)
+    classifier.estimators_ = classifier.estimators_[:n_trees]
+    classifier.n_estimators = len(classifier.estimators_)
+    return classifier
+
+
+def cap_depth(classifier, max_depth):
+    classifier = copy.deepcopy(classifier)
+    for estimator in getattr(classifier, 'estimators_', [classifier]):
+        estimator.tree_ = _truncate_tree(estimator.tree_, max_depth)
+        estimator.max_depth = max_depth
+    return classifier
+
+
+def distill(teacher, X_train, n_trees=1, max_depth=8):
+    """
+    Fit a smaller tree model to the teacher's fraud probabilities. Each row is
+    used twice, as class 0 and class 1 weighted by 1 - p and p, so the
+    student's leaf probabilities average the teacher's instead of hard labels.
+    """
+    Xt = teacher.named_steps['preprocessor'].transform(X_train)
+    p = teacher.predict_proba(X_train)[:, 1]
+    X2 = np.concatenate([Xt, Xt])
+    y2 = np.concatenate([np.zeros(len(p), dtype=int), np.ones(len(p), dtype=int)])
+    w2 = np.concatenate([1 - p, p])
+    if n_trees == 1:
+        student = DecisionTreeClassifier(max_depth=max_depth, random_state=42)
+    else:
+        student = RandomForestClassifier(n_estimators=n_trees, max_depth=max_depth, random_state=42, n_jobs=-1)
+    return student.fit(X2, y2, sample_weight=w2)
+
+
+def build_variant(pipeline, spec, X_train=None):
+    """A new Pipeline for a variant spec, sharing the fitted preprocessor."""
+    params = parse_spec(spec)
+    if 'distill' in params:
+        if X_train is None:
+            raise ValueError("Distillation needs training data")
+        classifier = distill(pipeline, X_train, params['distill'], params.get('depth', 8))
+    else:
+        classifier = pipeline.named_steps['classifier']
+        if 'trees' in params:
+            classifier = subset_trees(classifier, params['trees'])
+        if 'depth' in params:
+            classifier = cap_depth(classifier, params['depth'])
+    return Pipeline(steps=[
+        ('preprocessor', pipeline.named_steps['preprocessor']),
+        ('classifier', classifier),
+    ])
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def measure(pipeline, X_test, y_test):
+    """Size, load time, latency and test metrics of a variant."""
+    workdir = tempfile.mkdtemp(prefix='compress_')
+    try:
+        model_path = os.path.join(workdir, 'model.pkl')
+        compiled_path = os.path.join(workdir, 'compiled')
+        joblib.dump(pipeline, model_path)
+        export_compiled_model(pipeline, compiled_path)
+
+        start = time.perf_counter()
+        joblib.load(model_path)
+        load_s = time.perf_counter() - start
+        start = time.perf_counter()
+        compiled = CompiledModel.load(compiled_path)
+        compiled_load_s = time.perf_counter() - start
+
+        records = X_test.head(SINGLE_ROW_CALLS).to_dict(orient='records')
+        timings = []
+        for record in records:
+            start = time.perf_counter()
+            compiled.predict_proba([record])
+            timings.append(time.perf_counter() - start)
+        batch = X_test.head(BATCH_ROWS)
+        start = time.perf_counter()
+        pipeline.predict_proba(batch)
+        batch_s = time.perf_counter() - start
+
+        classifier = pipeline.named_steps['classifier']
+        y_prob = pipeline.predict_proba(X_test)[:, 1]
+        return {
+            'trees': compiled.n_trees,
+            'max_depth': compiled.max_depth,
+            'nodes': sum(e.tree_.node_count for e in getattr(classifier, 'estimators_', [classifier])),
+            'pickle_kb': os.path.getsize(model_path) / 1024,
+            'compiled_kb': _dir_size(compiled_path) / 1024,
+            'load_ms': load_s * 1000,
+            'compiled_load_ms': compiled_load_s * 1000,
+            'single_row_p50_us': float(np.median(timings)) * 1e6,
+            'batch_ms': batch_s * 1000,
+            'roc_auc': float(roc_auc_score(y_test, y_prob)),
+            'recall': float(recall_score(y_test, (y_prob >= 0.5).astype(int), zero_division=0)),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_variants(pipeline, X_train, X_test, y_test, specs=None):
+    """Report (one row per variant, the baseline first) as a DataFrame."""
+    rows = [dict(variant='baseline', **measure(pipeline, X_test, y_test))]
+    for spec in specs or DEFAULT_VARIANTS:
+        start = time.perf_counter()
+        variant = build_variant(pipeline, spec, X_train)
+        build_s = time.perf_counter() - start
+        rows.append(dict(variant=spec, build_s=build_s, **measure(variant, X_test, y_test)))
+        print(f"{spec}: AUC {rows[-1]['roc_auc']:.4f}, {rows[-1]['single_row_p50_us']:.0f}us/row")
+    report = pd.DataFrame(rows)
+    base = report.iloc[0]
+    report['auc_delta'] = report['roc_auc'] - base['roc_auc']
+    report['size_ratio'] = report['compiled_kb'] / base['compiled_kb']
+    report['speedup'] = base['single_row_p50_us'] / report['single_row_p50_us']
+    return report
+
+
+def _split(data_path):
+    """The same held-out test split as train.py."""
+    X, y = load_data(data_path)
+    return train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and measure smaller variants of the fraud model")
+    parser.add_argument('--model', default=None, help="Pipeline to compress (default: the active model)")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--variants', nargs='+', default=None, help="variant specs (default: DEFAULT_VARIANTS)")
+    parser.add_argument('--report', default=REPORT_PATH)
+    parser.add_argument('--export', metavar='SPEC', default=None,
+                        help="publish this variant to the registry as the serving model")
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    resolved = registry.resolve()
+    model_path = args.model or (resolved and resolved['model_path'])
+    if not model_path:
+        sys.exit("No model found; run train.py first")
+    pipeline = joblib.load(model_path)
+    X_train, X_test, y_train, y_test = _split(args.data)
+
+    if args.export:
+        variant = build_variant(pipeline, args.export, X_train)
+        result = measure(variant, X_test, y_test)
+        version = registry.publish(variant, metrics={k: result[k] for k in ('roc_auc', 'recall')}, info={
+            'compressed_from': model_path if args.model else resolved['version'],
+            'variant': args.export,
+        })
+        print(f"Published {args.export} as {version}: AUC {result['roc_auc']:.4f}, "
+              f"{result['compiled_kb']:.0f} KB, {result['single_row_p50_us']:.0f}us/row")
+    else:
+        report = compare_variants(pipeline, X_train, X_test, y_test, args.variants)
+        os.makedirs(os.path.dirname(args.report) or '.', exist_ok=True)
+        report.to_csv(args.report, index=False)
+        columns = ['variant', 'trees', 'nodes', 'compiled_kb', 'load_ms', 'single_row_p50_us', 'batch_ms',
+                   'roc_auc', 'recall', 'speedup']
+        print(report[columns].to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+        print(f"Report saved to {args.report}")
@@ -0,0 +1,203 @@
+"""
+Incremental retraining
+----------------------
+train.py refits from scratch on the full processed CSV. This command
+instead updates the active model with only the outcomes that arrived since
+it was published:
+
+1. Delta: model_predictions rows with id > the version's
+   'last_prediction_id' (recorded in its model_version.txt), joined with
+   their label (transactions.is_fraud) on transaction_id. The id is the
+   table's primary key, so the query is a range seek whose cost depends on
+   the new rows only.
+2. Rows are used in id order up to the first one still waiting for a label;
+   rows left unlabeled for longer than --label-wait-hours are skipped.
+3. The newest --holdout fraction of those rows is held out. The forest is
+   grown with --trees warm-start trees fitted on the rest, through the
+   already fitted preprocessor (the oldest trees are dropped beyond
+   --max-trees so the forest tracks recent data).
+4. The current and the candidate model are scored on the held-out window;
+   the candidate is published to the registry only if its ROC-AUC is at
+   most --max-auc-drop below the current one.
+
+The new version's watermark is the last training row, so the held-out rows
+are trained on by the next run. A rejected candidate leaves the watermark
+where it was.
+
+    python src/modeling/retrain.py
+    python src/modeling/retrain.py --trees 50 --holdout 0.25 --dry-run
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import warnings
+import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score, precision_score, recall_score
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.features.preprocess import FEATURE_COLUMNS
+from src.utils.model_registry import ModelRegistry, LEGACY_VERSION_PATH
+from src.utils.db_connection import DB_PATH
+from src.utils.db_pool import get_pool
+
+NEW_TREES = 20
+MAX_TREES = 500
+HOLDOUT_FRACTION = 0.2
+MIN_TRAIN_ROWS = 200
+MAX_AUC_DROP = 0.005
+LABEL_WAIT_HOURS = 72
+
+
+def current_watermark(registry, version):
+    """'last_prediction_id' of the active version (0 if it was never recorded)."""
+    info = registry.info(version) if version in registry.list_versions() else {}
+    if not info:
+        try:
+            with open(LEGACY_VERSION_PATH, 'r') as f:
+                info = json.load(f)
+        except (FileNotFoundError, ValueError):
+            info = {}
+    return int(info.get('last_prediction_id') or 0)
+
+
+def load_delta(conn, after_id):
+    """Predictions after the watermark with their label (NaN while unknown), in id order."""
+    features = ", ".join(f"p.{c}" for c in FEATURE_COLUMNS)
+    query = (f"SELECT p.id, p.transaction_id, p.created_at, {features}, {{label}} AS is_fraud "
+             f"FROM model_predictions p {{join}} WHERE p.id > ? ORDER BY p.id")
+    try:
+        delta = pd.read_sql_query(
+            query.format(label="t.is_fraud", join="LEFT JOIN transactions t ON t.transaction_id = p.transaction_id"),
+            conn, params=(after_id,)
+        )
+    except pd.errors.DatabaseError:
+        # No transactions table yet: nothing is labeled
+        delta = pd.read_sql_query(query.format(label="NULL", join=""), conn, params=(after_id,))
+    delta['is_fraud'] = delta['is_fraud'].astype(float)
+    return delta
+
+
+def usable_rows(delta, label_wait_hours=LABEL_WAIT_HOURS, now=None):
+    """
+    Labeled rows up to the first row still waiting for its label.
+    Rows unlabeled for longer than label_wait_hours are skipped.
+    """
+    now = now or datetime.datetime.now()
+    created = pd.to_datetime(delta['created_at'], format='ISO8601', errors='coerce')
+    waiting = delta['is_fraud'].isna() & ~(created < now - datetime.timedelta(hours=label_wait_hours))
+    if waiting.any():
+        delta = delta.iloc[:int(np.argmax(waiting.to_numpy()))]
+    return delta[delta['is_fraud'].notna()]
+
+
+def grow_forest(pipeline, X, y, n_trees=NEW_TREES, max_trees=MAX_TREES):
+    """
+    Add n_trees warm-start trees fitted on (X, y) to the Pipeline's forest.
+    The preprocessor is not refitted. Oldest trees beyond max_trees are dropped.
+    """
+    clf = pipeline.named_steps['classifier']
+    Xt = pipeline.named_steps['preprocessor'].transform(X)
+    clf.set_params(warm_start=True, n_estimators=len(clf.estimators_) + n_trees)
+    with warnings.catch_warnings():
+        # class_weight='balanced' is computed on the delta on purpose
+        warnings.filterwarnings('ignore', message='class_weight presets')
+        clf.fit(Xt, y)
+    if len(clf.estimators_) > max_trees:
+        clf.estimators_ = clf.estimators_[-max_trees:]
+    clf.set_params(warm_start=False, n_estimators=len(clf.estimators_))
+    return pipeline
+
+
+def holdout_metrics(pipeline, X, y):
+    y_prob = pipeline.predict_proba(X)[:, 1]
+    y_pred = (y_prob >= 0.5).astype(int)
+    return {
+        'roc_auc': float(roc_auc_score(y, y_prob)),
+        'precision': float(precision_score(y, y_pred, zero_division=0)),
+        'recall': float(recall_score(y, y_pred, zero_division=0)),
+    }
+
+
+def retrain(db_path=DB_PATH, registry=None, n_trees=NEW_TREES, max_trees=MAX_TREES,
+            holdout=HOLDOUT_FRACTION, min_rows=MIN_TRAIN_ROWS, max_auc_drop=MAX_AUC_DROP,
+            label_wait_hours=LABEL_WAIT_HOURS, dry_run=False):
+    """
+    One incremental retraining round. Returns a dict with 'status'
+    ('published', 'rejected', 'dry_run' or 'skipped'), the reason and metrics.
+    """
+    registry = registry or ModelRegistry()
+    resolved = registry.resolve()
+    if resolved is None:
+        return {'status': 'skipped', 'reason': 'no model to update; run train.py first'}
+    watermark = current_watermark(registry, resolved['version'])
+
+    start = time.perf_counter()
+    with get_pool(db_path).connection() as conn:
+        delta = load_delta(conn, watermark)
+    rows = usable_rows(delta, label_wait_hours)
+    load_s = time.perf_counter() - start
+    print(f"{len(delta)} predictions after id {watermark}, {len(rows)} usable ({load_s:.2f}s)")
+
+    n_holdout = int(round(len(rows) * holdout))
+    train_rows, test_rows = rows.iloc[:len(rows) - n_holdout], rows.iloc[len(rows) - n_holdout:]
+    result = {'base_version': resolved['version'], 'delta_rows': len(delta), 'train_rows': len(train_rows),
+              'holdout_rows': len(test_rows), 'load_s': load_s}
+    if len(train_rows) < min_rows or train_rows['is_fraud'].nunique() < 2:
+        return dict(result, status='skipped', reason=f'need {min_rows}+ new labeled rows with both classes')
+    if test_rows['is_fraud'].nunique() < 2:
+        return dict(result, status='skipped', reason='held-out window needs both classes')
+
+    X_train, y_train = train_rows[FEATURE_COLUMNS], train_rows['is_fraud'].astype(int)
+    X_test, y_test = test_rows[FEATURE_COLUMNS], test_rows['is_fraud'].astype(int)
+    current = joblib.load(resolved['model_path'])
+    baseline = holdout_metrics(current, X_test, y_test)
+
+    start = time.perf_counter()
+    candidate = grow_forest(joblib.load(resolved['model_path']), X_train, y_train, n_trees, max_trees)
+    result['fit_s'] = time.perf_counter() - start
+    metrics = holdout_metrics(candidate, X_test, y_test)
+    result.update(metrics=metrics, baseline=baseline)
+    print(f"Grew {n_trees} trees on {len(train_rows)} rows in {result['fit_s']:.2f}s; "
+          f"holdout AUC {baseline['roc_auc']:.4f} -> {metrics['roc_auc']:.4f}")
+
+    if metrics['roc_auc'] < baseline['roc_auc'] - max_auc_drop:
+        return dict(result, status='rejected',
+                    reason=f"holdout AUC dropped by more than {max_auc_drop}")
+    if dry_run:
+        return dict(result, status='dry_run', reason='passed; not published')
+
+    info = {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'parent_version': resolved['version'],
+        'retrain': 'incremental',
+        'last_prediction_id': int(train_rows['id'].iloc[-1]),
+        'n_estimators': len(candidate.named_steps['classifier'].estimators_),
+    }
+    published_metrics = dict(metrics, baseline_roc_auc=baseline['roc_auc'],
+                             train_rows=len(train_rows), holdout_rows=len(test_rows))
+    result['version'] = registry.publish(candidate, metrics=published_metrics, info=info)
+    return dict(result, status='published', reason='passed')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the active model with new labeled predictions")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--trees', type=int, default=NEW_TREES, help="warm-start trees to add")
+    parser.add_argument('--max-trees', type=int, default=MAX_TREES, help="drop the oldest trees beyond this")
+    parser.add_argument('--holdout', type=float, default=HOLDOUT_FRACTION, help="newest fraction held out")
+    parser.add_argument('--min-rows', type=int, default=MIN_TRAIN_ROWS)
+    parser.add_argument('--max-auc-drop', type=float, default=MAX_AUC_DROP)
+    parser.add_argument('--label-wait-hours', type=float, default=LABEL_WAIT_HOURS)
+    parser.add_argument('--dry-run', action='store_true', help="evaluate but do not publish")
+    args = parser.parse_args()
+    result = retrain(args.db, n_trees=args.trees, max_trees=args.max_trees, holdout=args.holdout,
+                     min_rows=args.min_rows, max_auc_drop=args.max_auc_drop,
+                     label_wait_hours=args.label_wait_hours, dry_run=args.dry_run)
+    print(f"{result['status']}: {result['reason']}" + (f" ({result['version']})" if 'version' in result else ""))
+    sys.exit(1 if result['status'] == 'rejected' else 0)
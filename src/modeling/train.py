@@ -1,25 +1,155 @@
 import sys
 import os
 import json
+import time
+import shutil
+import argparse
+import itertools
+import sqlite3
+import tempfile
 import joblib
 import pandas as pd
 import numpy as np
+from joblib import Memory, Parallel, delayed
 from sklearn.model_selection import train_test_split, StratifiedKFold, cross_validate
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import classification_report, roc_auc_score, precision_recall_curve
+from sklearn.metrics import (
+    classification_report, roc_auc_score,
+    accuracy_score, precision_score, recall_score, f1_score
+)
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from src.features.preprocess import get_preprocessing_pipeline, load_data
+from src.utils.compiled_model import export_compiled_model
+from src.utils.model_registry import ModelRegistry
+from src.utils.db_connection import DB_PATH
+from src.utils.db_pool import get_pool
 
 DATA_PATH = 'data/processed/transactions_processed.csv'
 MODELS_DIR = 'models'
 METRICS_PATH = os.path.join(MODELS_DIR, 'metrics.json')
 MODEL_PATH = os.path.join(MODELS_DIR, 'fraud_model.pkl')
+COMPILED_MODEL_PATH = os.path.join(MODELS_DIR, 'fraud_model_compiled')
 ENCODER_PATH = os.path.join(MODELS_DIR, 'scaler_encoders.pkl')
+SEARCH_RESULTS_PATH = os.path.join(MODELS_DIR, 'search_results.csv')
 
-def train():
+# Hyperparameter search space (--search); every combination is cross-validated
+SEARCH_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [None, 12, 24],
+    'min_samples_leaf': [1, 5],
+    'class_weight': ['balanced', 'balanced_subsample'],
+}
+SCORING = ['accuracy', 'precision', 'recall', 'f1', 'roc_auc']
+
+def build_model(memory=None, n_jobs=-1, **params):
+    """Preprocessor + RandomForest Pipeline. memory caches the fitted preprocessor per fold."""
+    clf_params = dict(n_estimators=200, class_weight='balanced', random_state=42, n_jobs=n_jobs)
+    clf_params.update(params)
+    return Pipeline(steps=[
+        ('preprocessor', get_preprocessing_pipeline()),
+        ('classifier', RandomForestClassifier(**clf_params))
+    ], memory=memory)
+
+def grid_configs(grid):
+    """All parameter combinations of a {name: [values]} grid, in a stable order."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+def core_budget(n_tasks, n_jobs=None):
+    """
+    Split the cores between fold-level processes and forest threads so that
+    processes * threads never exceeds the budget (no oversubscription).
+    Returns (processes, threads_per_forest).
+    """
+    cores = n_jobs or os.cpu_count() or 1
+    processes = max(1, min(n_tasks, cores))
+    return processes, max(1, cores // processes)
+
+def fold_scores(y_true, y_prob):
+    y_pred = (y_prob >= 0.5).astype(int)
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'precision': precision_score(y_true, y_pred, zero_division=0),
+        'recall': recall_score(y_true, y_pred, zero_division=0),
+        'f1': f1_score(y_true, y_pred, zero_division=0),
+        'roc_auc': roc_auc_score(y_true, y_prob),
+    }
+
+def _fit_fold(config_id, params, fold, X, y, train_idx, val_idx, memory, threads):
+    """Fit one configuration on one fold (runs in a worker process)."""
+    started = time.time()
+    model = build_model(memory=memory, n_jobs=threads, **params)
+    model.fit(X.iloc[train_idx], y.iloc[train_idx])
+    y_prob = model.predict_proba(X.iloc[val_idx])[:, 1]
+    scores = fold_scores(y.iloc[val_idx].to_numpy(), y_prob)
+    return dict(config_id=config_id, fold=fold, started=started, finished=time.time(), **scores)
+
+def run_search(X, y, grid=None, folds=5, n_jobs=None, cache_dir=None, refit_metric='roc_auc'):
+    """
+    Cross-validate every configuration of the grid, with (configuration, fold)
+    fits spread over worker processes. The preprocessor of each fold is fitted
+    once and shared by all configurations through a joblib Memory cache.
+    Returns (results DataFrame sorted best first, best params).
+    """
+    configs = grid_configs(grid or SEARCH_GRID)
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    splits = list(cv.split(X, y))
+    processes, threads = core_budget(len(configs) * len(splits), n_jobs)
+    print(f"Searching {len(configs)} configurations x {folds} folds "
+          f"({processes} processes x {threads} forest threads)...")
+
+    own_cache = cache_dir is None
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix='train_cache_')
+    memory = Memory(cache_dir, verbose=0)
+    try:
+        start = time.time()
+        fold_results = Parallel(n_jobs=processes)(
+            delayed(_fit_fold)(i, params, fold, X, y, train_idx, val_idx, memory, threads)
+            for i, params in enumerate(configs)
+            for fold, (train_idx, val_idx) in enumerate(splits)
+        )
+        print(f"Search finished in {time.time() - start:.1f}s")
+    finally:
+        if own_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    per_fold = pd.DataFrame(fold_results)
+    rows = []
+    for i, params in enumerate(configs):
+        runs = per_fold[per_fold['config_id'] == i]
+        row = dict(config_id=i, **{f'param_{k}': v for k, v in params.items()})
+        for metric in SCORING:
+            row[f'mean_{metric}'] = float(runs[metric].mean())
+            row[f'std_{metric}'] = float(runs[metric].std(ddof=0))
+        # Wall clock from the first fold starting to the last one finishing,
+        # and the summed fold time (the configuration's compute cost)
+        row['wall_s'] = float(runs['finished'].max() - runs['started'].min())
+        row['fit_s'] = float((runs['finished'] - runs['started']).sum())
+        rows.append(row)
+
+    results = pd.DataFrame(rows).sort_values(f'mean_{refit_metric}', ascending=False, kind='stable')
+    results.insert(0, 'rank', range(1, len(results) + 1))
+    best = configs[int(results.iloc[0]['config_id'])]
+    return results.reset_index(drop=True), best
+
+def prediction_watermark(db_path=DB_PATH):
+    """
+    Highest model_predictions id in the API database (0 if there is none).
+    Recorded in the version info as 'last_prediction_id': incremental
+    retraining (src/modeling/retrain.py) reads only rows after it.
+    """
+    if not os.path.exists(db_path):
+        return 0
+    with get_pool(db_path).connection() as conn:
+        try:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM model_predictions").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+
+def train(search=False, grid=None, folds=5, n_jobs=None, cache_dir=None):
     print("Loading data...")
     X, y = load_data(DATA_PATH)
     
@@ -32,33 +162,25 @@ def train():
         X, y, test_size=0.2, stratify=y, random_state=42
     )
     
-    # Pipeline
-    preprocessor = get_preprocessing_pipeline()
-    clf = RandomForestClassifier(
-        n_estimators=200, 
-        class_weight='balanced', 
-        random_state=42,
-        n_jobs=-1
-    )
-    
-    model = Pipeline(steps=[
-        ('preprocessor', preprocessor),
-        ('classifier', clf)
-    ])
-    
-    # CV
-    print("Running 5-fold CV...")
-    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-    scoring = ['accuracy', 'precision', 'recall', 'f1', 'roc_auc']
-    scores = cross_validate(model, X_train, y_train, cv=cv, scoring=scoring)
-    
-    metrics = {
-        'accuracy': float(np.mean(scores['test_accuracy'])),
-        'precision': float(np.mean(scores['test_precision'])),
-        'recall': float(np.mean(scores['test_recall'])),
-        'f1': float(np.mean(scores['test_f1'])),
-        'roc_auc': float(np.mean(scores['test_roc_auc']))
-    }
+    search_results = None
+    if search:
+        # Parallel cross-validated search; the best configuration is refitted below
+        search_results, best_params = run_search(X_train, y_train, grid=grid, folds=folds,
+                                                 n_jobs=n_jobs, cache_dir=cache_dir)
+        best = search_results.iloc[0]
+        metrics = {m: float(best[f'mean_{m}']) for m in SCORING}
+        metrics['best_params'] = best_params
+        print(search_results.head(5).to_string(index=False))
+        model = build_model(n_jobs=n_jobs or -1, **best_params)
+    else:
+        model = build_model(n_jobs=n_jobs or -1)
+
+        # CV
+        print(f"Running {folds}-fold CV...")
+        cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+        scores = cross_validate(model, X_train, y_train, cv=cv, scoring=SCORING)
+
+        metrics = {m: float(np.mean(scores[f'test_{m}'])) for m in SCORING}
     
     print("CV Metrics:", json.dumps(metrics, indent=2))
     
@@ -80,11 +202,21 @@ def train():
     # Save full pipeline (includes preprocessor and model)
     joblib.dump(model, MODEL_PATH)
     print(f"Model saved to {MODEL_PATH}")
+
+    # Export NumPy-only version for fast single-row serving
+    export_compiled_model(model, COMPILED_MODEL_PATH)
+    print(f"Compiled model saved to {COMPILED_MODEL_PATH}")
     
     # Save metrics
     with open(METRICS_PATH, 'w') as f:
         json.dump(metrics, f, indent=2)
     print(f"Metrics saved to {METRICS_PATH}")
+
+    artifacts = []
+    if search_results is not None:
+        search_results.to_csv(SEARCH_RESULTS_PATH, index=False)
+        artifacts.append(SEARCH_RESULTS_PATH)
+        print(f"Search results saved to {SEARCH_RESULTS_PATH}")
     
     # Save version info
     import datetime
@@ -96,10 +228,23 @@ def train():
         
     version_info = {
         'timestamp': datetime.datetime.now().isoformat(),
-        'git_hash': git_hash
+        'git_hash': git_hash,
+        'last_prediction_id': prediction_watermark()
     }
     with open(os.path.join(MODELS_DIR, 'model_version.txt'), 'w') as f:
         json.dump(version_info, f, indent=2)
 
+    # Publish as a new registry version; a running API picks it up via
+    # POST /model/reload (or automatically with MODEL_WATCH_INTERVAL_S set)
+    version = ModelRegistry().publish(model, metrics=metrics, info=version_info, artifacts=artifacts)
+    print(f"Published model version {version}")
+    return model, metrics
+
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the fraud model")
+    parser.add_argument('--search', action='store_true', help="cross-validated hyperparameter search over SEARCH_GRID")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--n-jobs', type=int, default=None, help="core budget (default: all cores)")
+    parser.add_argument('--cache-dir', default=None, help="joblib cache for fitted preprocessors (default: temp dir)")
+    args = parser.parse_args()
+    train(search=args.search, folds=args.folds, n_jobs=args.n_jobs, cache_dir=args.cache_dir)
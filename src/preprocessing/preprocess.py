@@ -10,12 +10,32 @@ This script performs all preprocessing steps:
 ✔ Encode categorical variables
 ✔ Feature Engineering (optional but recommended)
 ✔ Save processed dataset
+
+Streaming mode (--chunksize N) processes the raw file in bounded-memory
+chunks for exports larger than RAM. --format parquet|both also writes
+typed Parquet files (needs pyarrow), read by src/features/preprocess.py.
 """
 
 import os
+import sys
+import argparse
+import time
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 from sklearn.model_selection import train_test_split
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Allow `python src/preprocessing/preprocess.py` from the project root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
 # Define paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 RAW_FILE = os.path.join(BASE_DIR, "data", "raw", "transactions.csv")
@@ -31,7 +51,12 @@ def load_raw_data():
     return pd.read_csv(RAW_FILE)
 
 
-def clean_data(df):
+KYC_TRUE_VALUES = ['yes', 'y', 'true', '1']
+# Strings pandas skips when inferring a datetime format from the first value
+NAT_STRINGS = {'', 'NaT', 'nat', 'NAT', 'nan', 'NaN', 'NAN'}
+
+
+def clean_data(df, timestamp_format=None):
     """Apply cleaning operations"""
     print("🧹 Cleaning data...")
 
@@ -51,12 +76,12 @@ def clean_data(df):
         .astype(float)
     )
 
-    # Convert timestamp
-    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    # Convert timestamp (format is inferred from the first value unless given)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format=timestamp_format, errors='coerce')
 
     # Encode categorical variables
     df['channel'] = df['channel'].astype(str).str.title().str.strip()
-    df['kyc_verified_flag'] = df['kyc_verified'].str.lower().map(lambda x: 1 if x in ['yes', 'y', 'true', '1'] else 0)
+    df['kyc_verified_flag'] = df['kyc_verified'].str.lower().isin(KYC_TRUE_VALUES).astype(int)
 
     # Optional Feature Engineering
     df['hour'] = df['timestamp'].dt.hour
@@ -65,50 +90,367 @@ def clean_data(df):
     return df
 
 
-def save_processed_data(df):
+def infer_timestamp_format(series):
+    """
+    The format pd.to_datetime would infer for the whole column (from its
+    first non-null value), or 'mixed' when none can be guessed.
+    """
+    for value in series:
+        if isinstance(value, str):
+            if value not in NAT_STRINGS:
+                return guess_datetime_format(value) or 'mixed'
+        elif not pd.isna(value):
+            return None
+    return None
+
+
+def _clean_shard(args):
+    shard, timestamp_format = args
+    return clean_data(shard, timestamp_format)
+
+
+def parallel_clean_data(df, workers=None, executor=None, timestamp_format=None):
+    """
+    clean_data over contiguous shards in a process pool. Shards are merged in
+    order and de-duplicated again on transaction_id, and the timestamp format
+    is inferred once for the whole column, so the result is identical to
+    clean_data(df). Pass an executor to reuse a pool across calls.
+    """
+    workers = workers or os.cpu_count() or 1
+    if timestamp_format is None:
+        # Only rows clean_data keeps count, like pd.to_datetime on the serial path
+        kept = df.dropna(subset=['transaction_amount']).drop_duplicates(subset=['transaction_id'])
+        timestamp_format = infer_timestamp_format(kept['timestamp'])
+    if workers <= 1 or len(df) < 2 * workers:
+        return clean_data(df, timestamp_format)
+
+    shards = [df.iloc[idx] for idx in np.array_split(np.arange(len(df)), workers)]
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        cleaned = list(executor.map(_clean_shard, [(shard, timestamp_format) for shard in shards]))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    # First occurrence wins across shards, same as the serial drop_duplicates
+    return pd.concat(cleaned).drop_duplicates(subset=['transaction_id'])
+
+
+def compact_int(series):
+    """int8 column, nullable if it has missing values"""
+    return series.astype('Int8' if series.isna().any() else 'int8')
+
+
+def to_columnar(df):
+    """Typed copy for Parquet: categorical channel, int8 flags/hour/weekday"""
+    df = df.copy()
+    df['channel'] = df['channel'].astype('category')
+    for col in ('kyc_verified_flag', 'hour', 'weekday', 'is_fraud'):
+        if col in df.columns:
+            df[col] = compact_int(df[col])
+    return df
+
+
+def write_table(df, name, fmt='csv'):
+    """Write data/processed/<name>.csv and/or <name>.parquet; returns the paths written"""
+    paths = []
+    if fmt in ('csv', 'both'):
+        paths.append(os.path.join(PROCESSED_DIR, f'{name}.csv'))
+        df.to_csv(paths[-1], index=False)
+    if fmt in ('parquet', 'both'):
+        paths.append(os.path.join(PROCESSED_DIR, f'{name}.parquet'))
+        to_columnar(df).to_parquet(paths[-1], index=False)
+    return paths
+
+
+def append_parquet(writers, path, df):
+    """Append a chunk to a Parquet file, keeping the first chunk's schema"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(to_columnar(df), preserve_index=False)
+    if path not in writers:
+        writers[path] = pq.ParquetWriter(path, table.schema)
+    else:
+        table = table.cast(writers[path].schema)
+    writers[path].write_table(table)
+
+
+def save_processed_data(df, fmt='csv'):
     """Save cleaned dataset"""
-    processed_path = os.path.join(PROCESSED_DIR, 'transactions_processed.csv')
-    df.to_csv(processed_path, index=False)
-    print(f"💾 Processed data saved to: {processed_path}")
-    return processed_path
+    paths = write_table(df, 'transactions_processed', fmt)
+    for path in paths:
+        print(f"💾 Processed data saved to: {path}")
+    return paths[0]
 
 
-def train_test_split_data(df):
+def train_test_split_data(df, fmt='csv'):
     """Split data"""
     if 'is_fraud' not in df.columns:
         raise ValueError("❌ 'is_fraud' column missing!")
 
     train, test = train_test_split(df, test_size=0.2, stratify=df['is_fraud'], random_state=42)
 
-    train.to_csv(os.path.join(PROCESSED_DIR, 'train.csv'), index=False)
-    test.to_csv(os.path.join(PROCESSED_DIR, 'test.csv'), index=False)
+    write_table(train, 'train', fmt)
+    write_table(test, 'test', fmt)
     print("📊 Train and test datasets created.")
 
 
-def run_pipeline():
+def run_pipeline(fmt='csv', workers=1):
     """Run full preprocessing pipeline"""
     print("\n🚀 Starting Preprocessing Pipeline...")
 
     df = load_raw_data()
-    df = clean_data(df)
-    save_processed_data(df)
-    train_test_split_data(df)
+    df = parallel_clean_data(df, workers) if workers > 1 else clean_data(df)
+    save_processed_data(df, fmt)
+    train_test_split_data(df, fmt)
     insert_data(df)
     print("\n🎯 Preprocessing Completed Successfully!\n")
 
-def insert_data(df):
-    """Insert cleaned data into database"""
-    from src.utils.db_connection import get_db_connection
+# Columns of the transactions table (src/utils/db_connection.py)
+TRANSACTION_COLUMNS = ['transaction_id', 'customer_id', 'account_age_days', 'transaction_amount', 'channel',
+                       'timestamp', 'is_fraud', 'kyc_verified_flag', 'hour', 'weekday']
+INSERT_BATCH_SIZE = 50_000
+LOAD_CACHE_SIZE_KB = 200_000
+
+
+def upsert_sql(columns, on_conflict='update'):
+    """INSERT ... ON CONFLICT(transaction_id) DO UPDATE / DO NOTHING"""
+    placeholders = ", ".join("?" for _ in columns)
+    sql = f"INSERT INTO transactions ({', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT(transaction_id) "
+    if on_conflict == 'ignore':
+        return sql + "DO NOTHING"
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != 'transaction_id')
+    return sql + f"DO UPDATE SET {updates}"
+
+
+def ensure_upsert_key(conn):
+    """
+    Tables created by older to_sql loads have no key on transaction_id; add a
+    unique index. Raises ValueError if the table already holds duplicate ids,
+    which the index (and the upsert) cannot be built on.
+    """
+    pk = [row[1] for row in conn.execute("PRAGMA table_info(transactions)") if row[5]]
+    if pk == ['transaction_id']:
+        return
+    duplicates = conn.execute(
+        "SELECT transaction_id, COUNT(*) FROM transactions GROUP BY transaction_id HAVING COUNT(*) > 1"
+    ).fetchall()
+    if duplicates:
+        examples = ", ".join(repr(t) for t, _ in duplicates[:5])
+        extra = sum(n - 1 for _, n in duplicates)
+        raise ValueError(
+            f"transactions has {len(duplicates)} duplicated transaction_ids ({extra} extra rows, e.g. {examples}); "
+            "remove the duplicates before loading, or load into a new database"
+        )
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_transactions_transaction_id ON transactions (transaction_id)")
+
+
+def insert_data(df, conn=None, on_conflict='update', batch_size=INSERT_BATCH_SIZE):
+    """
+    Bulk upsert cleaned data into the transactions table.
+    Rows are written with executemany in batches inside one transaction, so
+    re-running the pipeline updates (or with on_conflict='ignore', keeps)
+    existing rows. When the load is at least as large as the table, secondary
+    indexes are dropped and rebuilt afterwards.
+    """
+    from src.utils.db_connection import get_db_connection, create_table, TRANSACTION_INDEXES
+
+    start = time.perf_counter()
+    # 'kyc_verified' and any other extra columns are not stored
+    columns = [c for c in TRANSACTION_COLUMNS if c in df.columns]
+    if 'timestamp' in df.columns:
+        timestamps = df['timestamp']
+        df = df.assign(timestamp=timestamps.astype(str).where(timestamps.notna(), None))
+    # NaN is stored as NULL by SQLite
+    rows = list(zip(*(df[c].tolist() for c in columns)))
+
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    synchronous, cache_size = (conn.execute(f"PRAGMA {p}").fetchone()[0] for p in ('synchronous', 'cache_size'))
+    try:
+        create_table(conn)
+        ensure_upsert_key(conn)
+        existing = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM transactions").fetchone()[0]
+        defer_indexes = len(rows) >= existing
+
+        # Load pragmas: no fsync per commit, bigger page cache
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(f"PRAGMA cache_size=-{LOAD_CACHE_SIZE_KB}")
+        conn.execute("BEGIN")
+        if defer_indexes:
+            for name in TRANSACTION_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+        sql = upsert_sql(columns, on_conflict)
+        for i in range(0, len(rows), batch_size):
+            conn.executemany(sql, rows[i:i + batch_size])
+        if defer_indexes:
+            for index_sql in TRANSACTION_INDEXES.values():
+                conn.execute(index_sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        conn.execute(f"PRAGMA cache_size={cache_size}")
+        if own_conn:
+            conn.close()
+
+    elapsed = time.perf_counter() - start
+    rate = len(rows) / elapsed if elapsed > 0 else 0.0
+    print(f"📥 Cleaned data upserted into DB: {len(rows):,} rows in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+    return {'rows': len(rows), 'seconds': elapsed, 'rows_per_s': rate}
+
+
+class SeenIds:
+    """
+    Set of transaction_ids already emitted, for de-duplication across chunks.
+    'disk' keeps exact ids in a temporary SQLite file (bounded memory);
+    'memory' keeps 64-bit hashes of the ids in a Python set (faster, tiny
+    collision risk on very large files).
+    """
+
+    def __init__(self, backend='disk'):
+        self.backend = backend
+        if backend == 'disk':
+            self._dir = tempfile.TemporaryDirectory(prefix='seen_ids_')
+            self._conn = sqlite3.connect(os.path.join(self._dir.name, 'seen.db'))
+            self._conn.execute("PRAGMA journal_mode=OFF")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute("CREATE TABLE seen (id TEXT PRIMARY KEY) WITHOUT ROWID")
+            self._conn.execute("CREATE TEMP TABLE batch (pos INTEGER PRIMARY KEY, id TEXT)")
+        else:
+            self._hashes = set()
+
+    def filter_new(self, ids):
+        """Return a boolean mask of ids not seen before, and remember them."""
+        ids = pd.Series(ids).astype(str).reset_index(drop=True)
+        if self.backend == 'disk':
+            cursor = self._conn.cursor()
+            cursor.execute("DELETE FROM batch")
+            cursor.executemany("INSERT INTO batch (pos, id) VALUES (?, ?)", enumerate(ids))
+            new_pos = [row[0] for row in cursor.execute(
+                "SELECT pos FROM batch WHERE id NOT IN (SELECT id FROM seen)"
+            )]
+            cursor.execute("INSERT OR IGNORE INTO seen (id) SELECT id FROM batch")
+            self._conn.commit()
+            mask = pd.Series(False, index=ids.index)
+            mask.iloc[new_pos] = True
+            return (mask & ~ids.duplicated()).to_numpy()
+
+        hashes = pd.util.hash_pandas_object(ids, index=False).tolist()
+        mask = []
+        for h in hashes:
+            mask.append(h not in self._hashes)
+            self._hashes.add(h)
+        return pd.Series(mask, dtype=bool).to_numpy()
+
+    def close(self):
+        if self.backend == 'disk':
+            self._conn.close()
+            self._dir.cleanup()
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def split_chunk(df):
+    """Stratified 80/20 split of one chunk (plain split if a class is too small)."""
+    stratify = df['is_fraud'] if df['is_fraud'].value_counts().min() >= 2 else None
+    if len(df) < 5:
+        return df, df.iloc[0:0]
+    return train_test_split(df, test_size=0.2, stratify=stratify, random_state=42)
+
+
+def run_streaming_pipeline(chunksize=100_000, seen_backend='disk', fmt='csv', workers=1):
+    """
+    Preprocess the raw file chunk by chunk with bounded memory.
+    Duplicates on transaction_id are removed across chunks (first occurrence wins),
+    and the processed CSV, train/test splits and DB are written incrementally.
+    The train/test split is stratified within each chunk, and the timestamp
+    format inferred from the first chunk is used for the whole file.
+    """
+    print(f"\n🚀 Starting Streaming Preprocessing Pipeline (chunksize={chunksize})...")
+    names = ('transactions_processed', 'train', 'test')
+    csv_paths = [os.path.join(PROCESSED_DIR, f'{n}.csv') for n in names]
+    parquet_paths = [os.path.join(PROCESSED_DIR, f'{n}.parquet') for n in names]
+
+    def write_chunk(frames, first):
+        for df, csv_path, parquet_path in zip(frames, csv_paths, parquet_paths):
+            if fmt in ('csv', 'both'):
+                df.to_csv(csv_path, mode='w' if first else 'a', header=first, index=False)
+            if fmt in ('parquet', 'both'):
+                append_parquet(writers, parquet_path, df)
+
+    seen = SeenIds(seen_backend)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    writers = {}
+    rows_in = rows_out = 0
+    timestamp_format = None
+    first = True
+    try:
+        for chunk in pd.read_csv(RAW_FILE, chunksize=chunksize):
+            rows_in += len(chunk)
+            if timestamp_format is None:
+                kept = chunk.dropna(subset=['transaction_amount'])
+                timestamp_format = infer_timestamp_format(kept['timestamp'])
+            df = parallel_clean_data(chunk, workers, executor, timestamp_format)
+            df = df[seen.filter_new(df['transaction_id'])]
+            if df.empty:
+                continue
+            rows_out += len(df)
+
+            frames = [df]
+            if 'is_fraud' in df.columns:
+                frames.extend(split_chunk(df))
+            write_chunk(frames, first)
+            insert_data(df)
+            first = False
+            print(f"   … {rows_in:,} rows read, {rows_out:,} kept")
+    finally:
+        seen.close()
+        if executor is not None:
+            executor.shutdown()
+        for writer in writers.values():
+            writer.close()
+
+    peak = peak_rss_mb()
+    print(f"💾 Processed data saved to: {PROCESSED_DIR}")
+    print(f"📊 Rows read: {rows_in:,}, written: {rows_out:,}, dropped: {rows_in - rows_out:,}")
+    if peak is not None:
+        print(f"🧠 Peak RSS: {peak:.1f} MB")
+    print("\n🎯 Streaming Preprocessing Completed Successfully!\n")
+    return {'rows_in': rows_in, 'rows_out': rows_out, 'peak_rss_mb': peak}
+
 
-    # Drop original 'kyc_verified' since DB doesn't contain it
-    if 'kyc_verified' in df.columns:
-        df = df.drop(columns=['kyc_verified'])
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preprocess raw transactions")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="stream the raw file in chunks of N rows (bounded memory)")
+    parser.add_argument('--seen-backend', choices=['disk', 'memory'], default='disk',
+                        help="streaming de-duplication store")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'both'], default='csv',
+                        help="processed data format (parquet needs pyarrow)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="clean the data in N processes (0 = all cores)")
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
 
-    conn = get_db_connection()
-    df.to_sql('transactions', conn, if_exists='append', index=False)
-    conn.close()
-    print("📥 Cleaned data inserted into DB.")
+    if args.chunksize:
+        run_streaming_pipeline(args.chunksize, args.seen_backend, args.format, workers)
+    else:
+        run_pipeline(args.format, workers)
 
 
 if __name__ == "__main__":
-    run_pipeline()
+    main()
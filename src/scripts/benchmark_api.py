@@ -0,0 +1,410 @@
+"""
+Load & Benchmark Harness for /predict
+-------------------------------------
+Replays synthetic or recorded transactions against the API and reports
+p50/p95/p99 latency, throughput and a per-stage breakdown
+(inference, rules, DB write, LLM stub), plus the server's own
+/metrics/runtime snapshot. Results are saved as JSON so runs
+can be compared between model versions.
+
+Modes:
+    inprocess   FastAPI TestClient against src.api.main.app (temp DB by default)
+    http        real HTTP to a running server, or one started with --spawn-server
+
+Examples:
+    python src/scripts/benchmark_api.py --requests 2000 --concurrency 8
+    python src/scripts/benchmark_api.py --mode http --spawn-server --concurrency 32
+    python src/scripts/benchmark_api.py --source data/processed/transactions_processed.csv
+    python src/scripts/benchmark_api.py --compare data/benchmarks/baseline.json
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESULTS_DIR = os.path.join(BASE_DIR, 'data', 'benchmarks')
+MODEL_VERSION_PATH = os.path.join(BASE_DIR, 'models', 'model_version.txt')
+PAYLOAD_FIELDS = ['transaction_id', 'customer_id', 'account_age_days', 'transaction_amount',
+                  'channel', 'kyc_verified_flag', 'hour', 'weekday']
+
+
+# ---------------------------------------------------------------------------
+# Transaction sources
+# ---------------------------------------------------------------------------
+
+def run_id():
+    """Transaction id prefix for one run; ids are idempotency keys, so reruns must not reuse them."""
+    return datetime.now().strftime('%Y%m%d%H%M%S')
+
+
+def synthetic_transactions(n, seed=42, n_customers=500):
+    """Random payloads shaped like the processed dataset."""
+    rng = np.random.default_rng(seed)
+    prefix = run_id()
+    channels = ['Atm', 'Pos', 'Mobile', 'Web', 'web', 'unknown']
+    return [
+        {
+            'transaction_id': f"BENCH_{prefix}_{i:07d}",
+            'customer_id': f"BENCH_C{int(rng.integers(n_customers)):05d}",
+            'account_age_days': float(rng.integers(1, 3650)),
+            'transaction_amount': round(float(rng.lognormal(6, 1.2)), 2),
+            'channel': str(rng.choice(channels)),
+            'kyc_verified_flag': int(rng.random() < 0.8),
+            'hour': int(rng.integers(0, 24)),
+            'weekday': int(rng.integers(0, 7)),
+        }
+        for i in range(n)
+    ]
+
+
+def load_transactions(source, n):
+    """Load payloads from a CSV (processed dataset) or JSONL file, cycling to n rows."""
+    if source is None:
+        return synthetic_transactions(n)
+
+    if source.endswith('.jsonl'):
+        rows = []
+        with open(source, 'r') as f:
+            for line in f:
+                record = json.loads(line)
+                if all(field in record for field in PAYLOAD_FIELDS):
+                    rows.append({field: record[field] for field in PAYLOAD_FIELDS})
+    else:
+        import pandas as pd
+        df = pd.read_csv(source, usecols=PAYLOAD_FIELDS, nrows=n).dropna()
+        rows = df.to_dict(orient='records')
+
+    if not rows:
+        raise ValueError(f"No usable transactions in {source}")
+
+    # Cycle through the recorded rows with unique ids so retries/caches do not skew results
+    prefix = run_id()
+    return [
+        dict(rows[i % len(rows)], transaction_id=f"{rows[i % len(rows)]['transaction_id']}_B{prefix}_{i}")
+        for i in range(n)
+    ]
+
+
+# ---------------------------------------------------------------------------
+# LLM stub
+# ---------------------------------------------------------------------------
+
+class _StubLLMHandler(BaseHTTPRequestHandler):
+    delay_s = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.delay_s)
+        body = json.dumps({"candidates": [{"content": {"parts": [{"text": "Benchmark stub explanation."}]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_llm_stub(delay_ms):
+    """Start a local stand-in for the Gemini API. Returns (server, url)."""
+    _StubLLMHandler.delay_s = delay_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/generate"
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+def summarize(latencies_s):
+    if not latencies_s:
+        return {}
+    ms = np.asarray(latencies_s) * 1000
+    return {
+        'count': int(len(ms)),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def run_load(post, payloads, concurrency, batch_size=1):
+    """
+    Send payloads with `concurrency` workers. post(path, json) -> status code.
+    Returns latency summary, throughput and status counts.
+    """
+    if batch_size > 1:
+        work = [('/predict/batch', payloads[i:i + batch_size]) for i in range(0, len(payloads), batch_size)]
+    else:
+        work = [('/predict', p) for p in payloads]
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def send(item):
+        path, body = item
+        start = time.perf_counter()
+        try:
+            status = post(path, body)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, work))
+    wall = time.perf_counter() - wall_start
+
+    return {
+        'latency': summarize(latencies),
+        'requests': len(work),
+        'transactions': len(payloads),
+        'wall_s': wall,
+        'requests_per_s': len(work) / wall if wall else 0.0,
+        'transactions_per_s': len(payloads) / wall if wall else 0.0,
+        'status_counts': statuses,
+    }
+
+
+async def time_llm_calls(txns):
+    """Seconds per LLM explanation call, one at a time over one client."""
+    import httpx
+    from src.utils.llm_helper import _request_explanation_async
+
+    times = []
+    async with httpx.AsyncClient() as client:
+        for txn in txns:
+            start = time.perf_counter()
+            try:
+                await _request_explanation_async(txn.dict(), 0.9, ["Benchmark"], client)
+            except Exception:
+                pass
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def stage_breakdown(main, payloads, n=200):
+    """
+    Time each /predict stage in isolation, in-process, on the first n payloads:
+    model inference, rule engine, a synchronous DB write and one LLM call.
+    """
+    from src.utils.db_pool import get_pool
+    from src.utils.prediction_writer import write_rows
+
+    stages = {'inference': [], 'rules': [], 'db_write': [], 'llm': []}
+    txns = [main.TransactionInput(**p) for p in payloads[:n]]
+    now = datetime.now().isoformat()
+    for txn in txns:
+        start = time.perf_counter()
+        risk_scores, _ = main.score([txn])
+        stages['inference'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        main.rule_engine.check_rules(txn.dict())
+        stages['rules'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with get_pool(main.DB_PATH).connection() as conn:
+            features = tuple(getattr(txn, c) for c in main.FEATURE_COLUMNS)
+            write_rows(conn, [(txn.transaction_id, txn.customer_id, '{}', float(risk_scores[0]), 0, now, None,
+                               *features)], [])
+        stages['db_write'].append(time.perf_counter() - start)
+
+    stages['llm'] = asyncio.run(time_llm_calls(txns[:20]))
+    return {stage: summarize(values) for stage, values in stages.items()}
+
+
+# ---------------------------------------------------------------------------
+# Modes
+# ---------------------------------------------------------------------------
+
+def bench_inprocess(args, payloads, stub_url):
+    from fastapi.testclient import TestClient
+    from src.utils import llm_helper
+    from src.api import main
+
+    if stub_url:
+        llm_helper.API_KEY = llm_helper.API_KEY or 'benchmark'
+        llm_helper.URL = stub_url
+    if not args.use_real_db:
+        main.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'transactions.db')
+
+    with TestClient(main.app) as client:
+        def post(path, body):
+            return client.post(path, json=body).status_code
+
+        # Warm up model, caches and connections
+        run_load(post, payloads[:min(50, len(payloads))], 1)
+        main.metrics.reset()
+        result = run_load(post, payloads, args.concurrency, args.batch_size)
+        result['server_metrics'] = client.get('/metrics/runtime').json()
+        result['stages'] = stage_breakdown(main, payloads)
+    return result
+
+
+def bench_http(args, payloads, stub_url):
+    import httpx
+
+    server = None
+    if args.spawn_server:
+        env = dict(os.environ)
+        if stub_url:
+            env['LLM_API_URL'] = stub_url
+            env.setdefault('GEMINI_API_KEY', 'benchmark')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'src.api.main:app', '--port', str(args.port), '--log-level', 'warning'],
+            cwd=BASE_DIR, env=env
+        )
+        url = f"http://127.0.0.1:{args.port}"
+        wait_for_server(url)
+    else:
+        url = args.url
+
+    try:
+        client = httpx.Client(base_url=url, timeout=30, limits=httpx.Limits(max_connections=args.concurrency))
+
+        def post(path, body):
+            return client.post(path, json=body).status_code
+
+        run_load(post, payloads[:min(50, len(payloads))], 1)
+        result = run_load(post, payloads, args.concurrency, args.batch_size)
+        # Server-side stage timings (cumulative since server start)
+        response = client.get('/metrics/runtime')
+        if response.status_code == 200:
+            result['server_metrics'] = response.json()
+        client.close()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return result
+
+
+def wait_for_server(url, timeout=60):
+    import httpx
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            # 503 until a model is serving
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+def compare(result, baseline_path, tolerance):
+    """Return regressions where p99 latency or throughput is worse than baseline by > tolerance."""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    regressions = []
+    base_p99 = baseline.get('latency', {}).get('p99_ms')
+    p99 = result.get('latency', {}).get('p99_ms')
+    if base_p99 and p99 and p99 > base_p99 * (1 + tolerance):
+        regressions.append(f"p99 latency {p99:.2f}ms vs baseline {base_p99:.2f}ms")
+    base_rps = baseline.get('transactions_per_s')
+    rps = result.get('transactions_per_s')
+    if base_rps and rps and rps < base_rps * (1 - tolerance):
+        regressions.append(f"throughput {rps:.1f}/s vs baseline {base_rps:.1f}/s")
+    return regressions
+
+
+def model_version():
+    try:
+        with open(MODEL_VERSION_PATH, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the /predict endpoint")
+    parser.add_argument('--mode', choices=['inprocess', 'http'], default='inprocess')
+    parser.add_argument('--source', help="CSV or JSONL of transactions (default: synthetic)")
+    parser.add_argument('--requests', type=int, default=1000, help="number of transactions to send")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=1, help=">1 sends to /predict/batch")
+    parser.add_argument('--url', default="http://127.0.0.1:8000")
+    parser.add_argument('--spawn-server', action='store_true', help="start a local uvicorn for http mode")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--llm-stub-delay-ms', type=float, default=200.0,
+                        help="latency of the local LLM stub; negative disables the stub")
+    parser.add_argument('--use-real-db', action='store_true', help="inprocess: write to the real DB")
+    parser.add_argument('--output', help="results JSON path (default: data/benchmarks/<timestamp>.json)")
+    parser.add_argument('--compare', help="baseline results JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    payloads = load_transactions(args.source, args.requests)
+
+    stub, stub_url = (None, None)
+    if args.llm_stub_delay_ms >= 0:
+        stub, stub_url = start_llm_stub(args.llm_stub_delay_ms)
+
+    try:
+        if args.mode == 'inprocess':
+            result = bench_inprocess(args, payloads, stub_url)
+        else:
+            result = bench_http(args, payloads, stub_url)
+    finally:
+        if stub is not None:
+            stub.shutdown()
+
+    result['config'] = {
+        'mode': args.mode,
+        'source': args.source or 'synthetic',
+        'concurrency': args.concurrency,
+        'batch_size': args.batch_size,
+        'llm_stub_delay_ms': args.llm_stub_delay_ms,
+    }
+    result['model_version'] = model_version()
+    result['timestamp'] = datetime.now().isoformat()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    latency = result['latency']
+    print(f"Requests: {result['requests']}  Throughput: {result['transactions_per_s']:.1f} txn/s")
+    print(f"Latency ms  p50={latency['p50_ms']:.2f}  p95={latency['p95_ms']:.2f}  p99={latency['p99_ms']:.2f}")
+    for stage, summary in result.get('stages', {}).items():
+        if summary:
+            print(f"  {stage:<10} p50={summary['p50_ms']:.3f}ms  p99={summary['p99_ms']:.3f}ms")
+    print(f"Status counts: {result['status_counts']}")
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        regressions = compare(result, args.compare, args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION: {r}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Startup Benchmark for the API
+-----------------------------
+Measures cold start in fresh interpreter processes, the way a new uvicorn
+worker or a test's TestClient sees it:
+    import_s          import src.api.main
+    ready_s           lifespan startup until the app serves (/health is 200)
+    first_predict_s   the first /predict call
+    warm_s            until /health reports 'warm' (deferred Pipeline loaded)
+Each run also lists the heavy modules (pandas, sklearn, joblib, ...) that the
+import pulled in; they should only be loaded with the Pipeline.
+
+The median of --runs runs is saved as JSON to data/benchmarks/. With
+--compare, the script exits non-zero when a median is slower than the
+baseline's by more than --tolerance (and by at least MIN_REGRESSION_S).
+
+Examples:
+    python src/scripts/benchmark_startup.py --runs 5
+    MODEL_LOAD_MODE=eager python src/scripts/benchmark_startup.py
+    python src/scripts/benchmark_startup.py --compare data/benchmarks/startup_baseline.json
+"""
+
+import sys
+import os
+import json
+import argparse
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESULTS_DIR = os.path.join(BASE_DIR, 'data', 'benchmarks')
+HEAVY_MODULES = ['pandas', 'sklearn', 'scipy', 'joblib', 'requests', 'httpx', 'dotenv']
+STAGES = ['import_s', 'ready_s', 'first_predict_s', 'warm_s']
+# Differences below this are noise for a process start
+MIN_REGRESSION_S = 0.05
+
+# Runs in a fresh interpreter and prints one JSON line
+CHILD = r'''
+import sys, json, time, tempfile, os
+start = time.perf_counter()
+from src.api import main
+import_s = time.perf_counter() - start
+heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+main.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='startup_'), 'transactions.db')
+
+from fastapi.testclient import TestClient
+start = time.perf_counter()
+with TestClient(main.app) as client:
+    ready_s = time.perf_counter() - start
+    health = client.get('/health').json()
+    start = time.perf_counter()
+    client.post('/predict', json={
+        "transaction_id": "STARTUP_1", "customer_id": "STARTUP_C", "account_age_days": 365,
+        "transaction_amount": 50.0, "channel": "Pos", "kyc_verified_flag": 1, "hour": 12, "weekday": 2})
+    first_predict_s = time.perf_counter() - start
+    deadline = time.time() + 120
+    while health['status'] == 'warming' and time.time() < deadline:
+        time.sleep(0.02)
+        health = client.get('/health').json()
+print(json.dumps({'import_s': import_s, 'ready_s': ready_s, 'first_predict_s': first_predict_s,
+                  'warm_s': health['warm_s'], 'status': health['status'], 'engines': health['engines'],
+                  'heavy_imports': heavy}))
+'''
+
+
+def run_once():
+    """One cold start in a subprocess."""
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{CHILD}"
+    env = dict(os.environ, PYTHONPATH=BASE_DIR)
+    out = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, env=env,
+                         capture_output=True, text=True, timeout=300)
+    if out.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    medians = {}
+    for stage in STAGES:
+        values = [r[stage] for r in runs if r.get(stage) is not None]
+        medians[stage] = float(np.median(values)) if values else None
+    return medians
+
+
+def compare(result, baseline_path, tolerance):
+    """Return regressions where a median stage time is worse than baseline by > tolerance."""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    regressions = []
+    for stage in STAGES:
+        base = baseline.get('median', {}).get(stage)
+        value = result['median'].get(stage)
+        if base and value and value > base * (1 + tolerance) and value - base >= MIN_REGRESSION_S:
+            regressions.append(f"{stage} {value:.3f}s vs baseline {base:.3f}s")
+    new_heavy = set(result['heavy_imports']) - set(baseline.get('heavy_imports', []))
+    if new_heavy:
+        regressions.append(f"import now loads {', '.join(sorted(new_heavy))}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark API cold start")
+    parser.add_argument('--runs', type=int, default=5, help="fresh processes to start")
+    parser.add_argument('--output', help="results JSON path (default: data/benchmarks/startup_<timestamp>.json)")
+    parser.add_argument('--compare', help="baseline results JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for i in range(args.runs):
+        runs.append(run_once())
+        print(f"run {i + 1}: " + "  ".join(
+            f"{stage}={runs[-1][stage]:.3f}" for stage in STAGES if runs[-1][stage] is not None))
+
+    result = {
+        'runs': runs,
+        'median': summarize(runs),
+        'heavy_imports': sorted({m for r in runs for m in r['heavy_imports']}),
+        'config': {'runs': args.runs, 'model_load_mode': os.getenv('MODEL_LOAD_MODE', 'full')},
+        'timestamp': datetime.now().isoformat(),
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"startup_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    print("Median: " + "  ".join(
+        f"{stage}={value:.3f}s" for stage, value in result['median'].items() if value is not None))
+    print(f"Heavy modules at import: {result['heavy_imports'] or 'none'}")
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        regressions = compare(result, args.compare, args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION: {r}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+CSV vs Parquet storage benchmark for processed transactions
+-----------------------------------------------------------
+Writes the processed dataset in both formats and compares file size,
+write time, full load time, projected load time (model features + target,
+as used by src/modeling/train.py) and in-memory size of the loaded frame.
+
+Examples:
+    python src/scripts/benchmark_storage.py
+    python src/scripts/benchmark_storage.py --rows 2000000
+    python src/scripts/benchmark_storage.py --source data/processed/transactions_processed.csv
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from src.features.preprocess import FEATURE_COLUMNS, TARGET
+from src.preprocessing.preprocess import to_columnar
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESULTS_DIR = os.path.join(BASE_DIR, 'data', 'benchmarks')
+DATA_PATH = os.path.join(BASE_DIR, 'data', 'processed', 'transactions_processed.csv')
+
+
+def synthetic_processed(n, seed=42):
+    """Processed-format rows (as written by clean_data)."""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 90 * 86400, n), unit='s')
+    kyc = rng.choice(['Yes', 'No'], n)
+    return pd.DataFrame({
+        'transaction_id': [f"T{i:09d}" for i in range(n)],
+        'customer_id': [f"C{i:06d}" for i in rng.integers(0, max(1, n // 20), n)],
+        'kyc_verified': kyc,
+        'account_age_days': rng.integers(1, 3650, n),
+        'transaction_amount': rng.lognormal(6, 1.2, n).round(2),
+        'channel': rng.choice(['Web', 'Mobile', 'Pos', 'Atm'], n),
+        'timestamp': timestamps,
+        'is_fraud': (rng.random(n) < 0.03).astype(int),
+        'kyc_verified_flag': (kyc == 'Yes').astype(int),
+        'hour': timestamps.hour,
+        'weekday': timestamps.weekday,
+    })
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def run(df, repeat=3):
+    projection = FEATURE_COLUMNS + [TARGET]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {'csv': os.path.join(tmp, 'data.csv'), 'parquet': os.path.join(tmp, 'data.parquet')}
+        writers = {
+            'csv': lambda: df.to_csv(paths['csv'], index=False),
+            'parquet': lambda: to_columnar(df).to_parquet(paths['parquet'], index=False),
+        }
+        readers = {
+            'csv': lambda columns=None: pd.read_csv(paths['csv'], usecols=columns),
+            'parquet': lambda columns=None: pd.read_parquet(paths['parquet'], columns=columns, memory_map=True),
+        }
+        for fmt in ('csv', 'parquet'):
+            write_s, _ = best_of(writers[fmt], 1)
+            full_s, full = best_of(readers[fmt], repeat)
+            projected_s, projected = best_of(lambda: readers[fmt](projection), repeat)
+            results.append({
+                'format': fmt,
+                'rows': len(df),
+                'file_mb': os.path.getsize(paths[fmt]) / 1e6,
+                'write_s': write_s,
+                'load_full_s': full_s,
+                'load_projected_s': projected_s,
+                'memory_full_mb': full.memory_usage(deep=True).sum() / 1e6,
+                'memory_projected_mb': projected.memory_usage(deep=True).sum() / 1e6,
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CSV vs Parquet for processed data")
+    parser.add_argument('--source', default=None, help="processed CSV to benchmark (default: synthetic)")
+    parser.add_argument('--rows', type=int, default=500_000, help="synthetic rows when no --source")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    if args.source:
+        df = pd.read_csv(args.source, parse_dates=['timestamp'])
+    else:
+        df = synthetic_processed(args.rows)
+
+    results = run(df, args.repeat)
+    print(f"\n{'format':<9}{'rows':>10}{'file MB':>9}{'write s':>9}{'load s':>8}{'proj s':>8}{'mem MB':>8}")
+    for r in results:
+        print(f"{r['format']:<9}{r['rows']:>10}{r['file_mb']:>9.1f}{r['write_s']:>9.2f}"
+              f"{r['load_full_s']:>8.3f}{r['load_projected_s']:>8.3f}{r['memory_projected_mb']:>8.1f}")
+
+    os.makedirs(args.output, exist_ok=True)
+    output = os.path.join(args.output, f"storage_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ import time
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from src.features.preprocess import load_data
+from src.features.preprocess import load_data, read_table, FEATURE_COLUMNS
 
 DATA_PATH = 'data/processed/transactions_processed.csv'
 API_URL = "http://localhost:8000/predict"
@@ -21,8 +21,8 @@ def seed_predictions():
     
     # We need to add back the ID columns for the API input if they were dropped in load_data
     # But load_data drops them. 
-    # Let's read the CSV directly to get IDs
-    df_full = pd.read_csv(DATA_PATH)
+    # Let's read the CSV (or its Parquet copy) directly to get IDs
+    df_full = read_table(DATA_PATH, columns=['transaction_id', 'customer_id'] + FEATURE_COLUMNS)
     sample_full = df_full.loc[sample.index]
     
     print(f"Sending {len(sample_full)} predictions to API (simulated)...")
@@ -68,18 +68,21 @@ def seed_predictions():
         # Insert
         features = input_df.to_dict(orient='records')[0]
         cursor.execute('''
-            INSERT INTO model_predictions 
-            (transaction_id, customer_id, features_json, risk_score, prediction, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT OR IGNORE INTO model_predictions
+            (transaction_id, customer_id, features_json, risk_score, prediction, created_at,
+             account_age_days, transaction_amount, channel, kyc_verified_flag, hour, weekday)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             row['transaction_id'],
             row['customer_id'],
             json.dumps(features),
             risk_score,
             prediction,
-            pd.Timestamp.now().isoformat()
+            pd.Timestamp.now().isoformat(),
+            features['account_age_days'], features['transaction_amount'], features['channel'],
+            features['kyc_verified_flag'], features['hour'], features['weekday']
         ))
-        count += 1
+        count += cursor.rowcount
         
     conn.commit()
     conn.close()
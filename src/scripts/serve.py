@@ -0,0 +1,206 @@
+"""
+Multi-process API launcher with a shared read-only model
+--------------------------------------------------------
+Runs src.api.main:app under uvicorn with several worker processes. Before
+starting, the compiled model (models/fraud_model_compiled, see
+src/utils/compiled_model.py) is exported once from fraud_model.pkl if it is
+missing or stale. Workers then start in MODEL_LOAD_MODE=shared and
+memory-map its .npy node arrays read-only, so every process scores with
+the same physical pages instead of unpickling its own copy of the forest.
+
+Per-customer rule state is per worker: the velocity windows
+(src/utils/velocity.py) and the user averages (src/utils/customer_stats.py)
+are in-process memory, warmed from the DB at startup and then updated only
+by the requests that worker serves. With N workers each one sees about 1/N
+of a customer's new transactions, so the velocity and user-average rules
+fire less often than with one worker. The launcher warns about this.
+The prediction cache is per worker as well, so with more than one worker
+the launcher sets PREDICTION_LOOKUP_DB=1 and retries are answered from the
+DB (see src/utils/prediction_cache.py).
+
+Usage:
+    python src/scripts/serve.py --workers 4 --port 8000
+    python src/scripts/serve.py --workers 4 --compare   # startup time / memory, full vs shared
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODEL_PATH = os.path.join(BASE_DIR, 'models', 'fraud_model.pkl')
+COMPILED_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'fraud_model_compiled')
+RESULTS_DIR = os.path.join(BASE_DIR, 'data', 'benchmarks')
+
+
+def ensure_compiled_model():
+    """Export the compiled model from the pickle if it is missing or older."""
+    from src.utils.model_registry import ModelRegistry
+    if ModelRegistry().current_version():
+        return False  # registry versions are published with their compiled export
+
+    meta_path = os.path.join(COMPILED_MODEL_PATH, 'meta.json')
+    if os.path.exists(meta_path) and (
+        not os.path.exists(MODEL_PATH) or os.path.getmtime(meta_path) >= os.path.getmtime(MODEL_PATH)
+    ):
+        return False
+
+    import joblib
+    from src.utils.compiled_model import export_compiled_model
+    print(f"Exporting compiled model from {MODEL_PATH}...")
+    export_compiled_model(joblib.load(MODEL_PATH), COMPILED_MODEL_PATH)
+    return True
+
+
+def process_memory_kb(pid):
+    """Rss / Pss / private memory of a process from /proc (Linux only)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(':') in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    values[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+    values['Private'] = values.pop('Private_Clean', 0) + values.pop('Private_Dirty', 0)
+    return values
+
+
+def process_cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", 'rb') as f:
+            return f.read().replace(b'\0', b' ').decode(errors='replace')
+    except OSError:
+        return ""
+
+
+def child_pids(parent_pid):
+    """Direct children of a process (scans /proc)."""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # Field 4 is the parent pid; the command name may contain spaces
+                stat = f.read().rsplit(')', 1)[1].split()
+            if int(stat[1]) == parent_pid:
+                children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+def measure_mode(mode, workers, port, warmup_requests=200):
+    """Start a server in the given model mode and measure readiness time and memory."""
+    import httpx
+
+    env = dict(os.environ, MODEL_LOAD_MODE=mode)
+    payload = {
+        "transaction_id": "SERVE_WARMUP", "customer_id": "SERVE_C", "account_age_days": 365,
+        "transaction_amount": 50.0, "channel": "Pos", "kyc_verified_flag": 1, "hour": 12, "weekday": 2
+    }
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--workers', str(workers), '--port', str(port),
+         '--mode', mode, '--log-level', 'warning'],
+        cwd=BASE_DIR, env=env
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        ready_s = None
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            try:
+                if httpx.get(f"{url}/health", timeout=5).status_code == 200:
+                    ready_s = time.perf_counter() - start
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        if ready_s is None:
+            raise RuntimeError(f"Server in {mode} mode did not become ready")
+
+        # Let every worker finish startup and score some requests
+        with httpx.Client(base_url=url, timeout=10) as client:
+            for i in range(warmup_requests):
+                client.post("/predict", json=dict(payload, transaction_id=f"SERVE_WARMUP_{i}"))
+        time.sleep(1)
+
+        # The launcher process is the uvicorn supervisor; its children are the workers
+        worker_pids = [pid for pid in child_pids(server.pid) if 'resource_tracker' not in process_cmdline(pid)]
+        per_worker = {pid: process_memory_kb(pid) for pid in worker_pids}
+        per_worker = {pid: m for pid, m in per_worker.items() if m}
+        totals = {k: sum(m.get(k, 0) for m in per_worker.values()) for k in ('Rss', 'Pss', 'Private')}
+        return {
+            'mode': mode,
+            'workers': len(per_worker),
+            'ready_s': ready_s,
+            'total_rss_mb': totals['Rss'] / 1024,
+            'total_pss_mb': totals['Pss'] / 1024,
+            'total_private_mb': totals['Private'] / 1024,
+            'per_worker_pss_mb': [m['Pss'] / 1024 for m in per_worker.values()],
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(workers, port):
+    ensure_compiled_model()
+    results = [measure_mode(mode, workers, port) for mode in ('full', 'shared')]
+
+    print(f"\n{'mode':<8}{'workers':>8}{'ready (s)':>11}{'RSS (MB)':>10}{'PSS (MB)':>10}{'private (MB)':>14}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['workers']:>8}{r['ready_s']:>11.2f}{r['total_rss_mb']:>10.1f}"
+              f"{r['total_pss_mb']:>10.1f}{r['total_private_mb']:>14.1f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"serve_compare_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with multiple workers sharing one model")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--mode', choices=['shared', 'full'], default='shared',
+                        help="shared: mmap the compiled model only; full: every worker unpickles the Pipeline")
+    parser.add_argument('--log-level', default="info")
+    parser.add_argument('--compare', action='store_true', help="measure startup time and memory for both modes")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(args.workers, args.port)
+        return
+
+    if args.mode == 'shared':
+        ensure_compiled_model()
+    # Workers are spawned as fresh interpreters and read the mode from the environment
+    os.environ['MODEL_LOAD_MODE'] = args.mode
+    if args.workers > 1:
+        # A retry can land on a worker whose in-memory prediction cache has not seen the
+        # transaction; look it up in the DB so it is not scored (and alerted) twice
+        os.environ['PREDICTION_LOOKUP_DB'] = '1'
+        print(f"WARNING: velocity windows and user averages are kept per worker. Each of the "
+              f"{args.workers} workers only sees the transactions it serves, so the velocity and "
+              f"user-average rules under-count. Use --workers 1 where those rules must be exact.")
+
+    import uvicorn
+    uvicorn.run("src.api.main:app", host=args.host, port=args.port, workers=args.workers,
+                log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
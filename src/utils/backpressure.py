@@ -0,0 +1,96 @@
+"""
+Admission control for the async /predict path
+---------------------------------------------
+/predict is an async endpoint: waiting on the LLM, the DB or the model no
+longer holds one of FastAPI's threadpool threads, so the number of requests
+in flight is bounded by connections, not threads. Two limits keep a
+saturated server answering quickly instead of queueing without bound:
+
+- InFlightLimiter: at most PREDICT_MAX_IN_FLIGHT requests are admitted at
+  once; beyond that the request is rejected with 429 (client should back off
+  and retry).
+- BoundedExecutor: CPU work (model + rules) runs on a dedicated pool of
+  INFERENCE_WORKERS threads with at most INFERENCE_MAX_QUEUE tasks waiting;
+  when that queue is full the request fails fast with 503.
+
+Both are only touched from the event loop thread, so their counters need no
+lock. Rejections carry a Retry-After header.
+
+Configuration (environment variables):
+    PREDICT_MAX_IN_FLIGHT   admitted /predict requests (default 512)
+    INFERENCE_WORKERS       inference threads (default: CPU count, max 4)
+    INFERENCE_MAX_QUEUE     inference tasks allowed to wait (default 64)
+"""
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+PREDICT_MAX_IN_FLIGHT = int(os.getenv("PREDICT_MAX_IN_FLIGHT", "512"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "64"))
+RETRY_AFTER_S = 1
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; status_code is 429 or 503."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class InFlightLimiter:
+    """Context manager admitting at most `limit` concurrent requests."""
+
+    def __init__(self, limit=None):
+        self.limit = limit or PREDICT_MAX_IN_FLIGHT
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected = 0
+
+    def __enter__(self):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise Overloaded(429, f"Too many requests in flight (limit {self.limit})")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return self
+
+    def __exit__(self, *exc):
+        self.in_flight -= 1
+        return False
+
+    def stats(self):
+        return {'in_flight': self.in_flight, 'max_in_flight': self.max_in_flight,
+                'limit': self.limit, 'rejected': self.rejected}
+
+
+class BoundedExecutor:
+    """Thread pool for CPU-bound work with a bounded number of waiting tasks."""
+
+    def __init__(self, workers=None, max_queue=None, name="inference"):
+        self.workers = workers or INFERENCE_WORKERS
+        self.max_queue = INFERENCE_MAX_QUEUE if max_queue is None else max_queue
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self.pending = 0  # running + waiting
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool; raises Overloaded(503) if the queue is full."""
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise Overloaded(503, "Inference queue full")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': self.pending,
+                'queue_limit': self.max_queue, 'rejected': self.rejected}
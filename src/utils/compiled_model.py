@@ -0,0 +1,253 @@
+"""
+Compiled inference for the fraud model
+--------------------------------------
+Flattens the fitted Pipeline (ColumnTransformer + tree ensemble) into plain
+NumPy arrays: imputation/scaling constants, one-hot lookup tables and the
+node arrays of every tree concatenated into one forest. Scoring walks all
+trees at once with vectorized numpy ops, with no pandas or sklearn on the
+request path, and gives the same probabilities as pipeline.predict_proba.
+
+Artifact layout (a directory):
+    meta.json          feature layout, preprocessing constants, classes
+    <array>.npy        node arrays, loadable with mmap_mode='r'
+
+Export an existing model:
+    python -m src.utils.compiled_model models/fraud_model.pkl models/fraud_model_compiled
+"""
+
+import os
+import sys
+import json
+import mmap
+import numpy as np
+
+NODE_ARRAYS = ['children', 'feature', 'threshold', 'leaf_proba', 'roots']
+
+
+def _compile_preprocessor(preprocessor):
+    """Turn a fitted ColumnTransformer into a list of encoding blocks."""
+    blocks = []
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == 'drop' or len(columns) == 0:
+            continue
+        if transformer == 'passthrough':
+            steps = []
+        elif hasattr(transformer, 'steps'):
+            steps = [step for _, step in transformer.steps]
+        else:
+            steps = [transformer]
+
+        columns = list(columns)
+        fill = [None] * len(columns)
+        mean = [0.0] * len(columns)
+        scale = [1.0] * len(columns)
+        onehot = None
+        for step in steps:
+            kind = type(step).__name__
+            if kind == 'SimpleImputer':
+                if len(step.statistics_) != len(columns):
+                    raise ValueError(f"Imputer in '{name}' dropped empty features; cannot compile")
+                fill = [v.item() if hasattr(v, 'item') else v for v in step.statistics_]
+            elif kind == 'StandardScaler':
+                if step.mean_ is not None:
+                    mean = [float(v) for v in step.mean_]
+                if step.scale_ is not None:
+                    scale = [float(v) for v in step.scale_]
+            elif kind == 'OneHotEncoder':
+                if step.drop is not None:
+                    raise ValueError(f"OneHotEncoder(drop=...) in '{name}' is not supported")
+                onehot = [[c.item() if hasattr(c, 'item') else c for c in cats] for cats in step.categories_]
+            else:
+                raise ValueError(f"Unsupported preprocessing step '{kind}' in '{name}'")
+
+        if onehot is None:
+            blocks.append({'type': 'numeric', 'columns': columns, 'fill': fill, 'mean': mean, 'scale': scale})
+        else:
+            for column, column_fill, categories in zip(columns, fill, onehot):
+                blocks.append({'type': 'onehot', 'column': column, 'fill': column_fill, 'categories': categories})
+    return blocks
+
+
+def _compile_forest(classifier):
+    """Concatenate the node arrays of every tree into one flat forest."""
+    trees = getattr(classifier, 'estimators_', [classifier])
+    left, right, feature, threshold, leaf_proba, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in trees:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(n) + offset
+        # Leaves point to themselves so every tree can be stepped a fixed number of times
+        left.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        right.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        values = tree.value[:, 0, :]
+        leaf_proba.append(values / values.sum(axis=1, keepdims=True))
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        # children[2 * node + went_right] -> next node
+        'children': np.stack([np.concatenate(left), np.concatenate(right)], axis=1).ravel().astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'leaf_proba': np.concatenate(leaf_proba).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+    }
+    return arrays, max_depth
+
+
+def compile_pipeline(pipeline):
+    """Compile a fitted Pipeline(preprocessor, classifier). Returns (meta, arrays)."""
+    preprocessor = pipeline.named_steps['preprocessor']
+    classifier = pipeline.named_steps['classifier']
+    blocks = _compile_preprocessor(preprocessor)
+    arrays, max_depth = _compile_forest(classifier)
+    meta = {
+        'input_columns': [str(c) for c in preprocessor.feature_names_in_],
+        'blocks': blocks,
+        'classes': [c.item() if hasattr(c, 'item') else c for c in classifier.classes_],
+        'n_trees': int(len(arrays['roots'])),
+        'max_depth': int(max_depth),
+    }
+    return meta, arrays
+
+
+def save_compiled(meta, arrays, path):
+    os.makedirs(path, exist_ok=True)
+    for name in NODE_ARRAYS:
+        np.save(os.path.join(path, f'{name}.npy'), arrays[name])
+    # meta.json is written last; its presence marks a complete artifact
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def export_compiled_model(pipeline, path):
+    """Compile a fitted Pipeline and save it as an artifact directory."""
+    meta, arrays = compile_pipeline(pipeline)
+    save_compiled(meta, arrays, path)
+    return path
+
+
+class CompiledModel:
+    """NumPy-only scorer for a compiled Pipeline."""
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.classes_ = np.asarray(meta['classes'])
+        self.n_trees = meta['n_trees']
+        self.max_depth = meta['max_depth']
+        self.children = arrays['children']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.leaf_proba = arrays['leaf_proba']
+        self.roots = arrays['roots']
+        self.is_leaf = self.children[0::2] == np.arange(len(self.feature))
+        self._compile_encoder(meta['blocks'])
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in NODE_ARRAYS
+        }
+        return cls(meta, arrays)
+
+    def page_in(self):
+        """Read one value per page of the memory-mapped arrays, so requests do not fault them in."""
+        for name in NODE_ARRAYS:
+            array = getattr(self, name)
+            if isinstance(array, np.memmap):
+                flat = array.reshape(-1)
+                flat[::max(1, mmap.PAGESIZE // flat.itemsize)].sum()
+
+    def _compile_encoder(self, blocks):
+        # Numeric outputs: (input column, output index, fill, mean, scale)
+        self._numeric = []
+        # One-hot outputs: (input column, fill, {category: output index})
+        self._onehot = []
+        out = 0
+        for block in blocks:
+            if block['type'] == 'numeric':
+                for i, column in enumerate(block['columns']):
+                    fill = block['fill'][i]
+                    self._numeric.append((column, out, np.nan if fill is None else float(fill),
+                                          block['mean'][i], block['scale'][i]))
+                    out += 1
+            else:
+                lookup = {cat: out + i for i, cat in enumerate(block['categories'])}
+                self._onehot.append((block['column'], block['fill'], lookup))
+                out += len(block['categories'])
+        self.n_features = out
+        self._numeric_out = np.array([n[1] for n in self._numeric], dtype=np.intp)
+        self._numeric_fill = np.array([n[2] for n in self._numeric], dtype=np.float64)
+        self._numeric_mean = np.array([n[3] for n in self._numeric], dtype=np.float64)
+        self._numeric_scale = np.array([n[4] for n in self._numeric], dtype=np.float64)
+
+    def encode(self, records, out=None):
+        """
+        Encode records (dicts or objects with feature attributes) into the
+        model's feature matrix. Pass a preallocated float32 array as out to
+        avoid allocation; it must have at least len(records) rows.
+        """
+        n = len(records)
+        if out is None:
+            out = np.zeros((n, self.n_features), dtype=np.float32)
+        else:
+            out = out[:n]
+            out.fill(0.0)
+
+        get = (lambda r, c: r.get(c)) if n and isinstance(records[0], dict) else getattr
+        raw = np.empty((n, len(self._numeric)), dtype=np.float64)
+        for i, record in enumerate(records):
+            for j, (column, _, _, _, _) in enumerate(self._numeric):
+                value = get(record, column)
+                raw[i, j] = np.nan if value is None else value
+            for column, fill, lookup in self._onehot:
+                value = get(record, column)
+                idx = lookup.get(fill if value is None else value)
+                if idx is not None:  # unknown categories encode as all zeros
+                    out[i, idx] = 1.0
+
+        missing = np.isnan(raw)
+        if missing.any():
+            raw = np.where(missing, self._numeric_fill, raw)
+        # Same float64 arithmetic as StandardScaler, then float32 like sklearn trees
+        out[:, self._numeric_out] = (raw - self._numeric_mean) / self._numeric_scale
+        return out
+
+    def predict_proba_encoded(self, X):
+        """Class probabilities for an encoded float32 matrix (n_rows, n_features)."""
+        n, n_features = X.shape
+        X_flat = np.ascontiguousarray(X).ravel()
+        # node[t, r]: current node of tree t for row r
+        node = np.repeat(self.roots[:, None], n, axis=1)
+        row_offset = (np.arange(n) * n_features)[None, :]
+        for depth in range(1, self.max_depth + 1):
+            went_right = X_flat[row_offset + self.feature[node]] > self.threshold[node]
+            node = self.children[2 * node + went_right]
+            # Most paths end well before max_depth
+            if depth % 4 == 0 and self.is_leaf[node].all():
+                break
+        proba = self.leaf_proba[node].sum(axis=0)
+        return proba / self.n_trees
+
+    def predict_proba(self, records, out=None):
+        return self.predict_proba_encoded(self.encode(records, out=out))
+
+    def predict(self, records):
+        return self.classes_.take(np.argmax(self.predict_proba(records), axis=1))
+
+
+if __name__ == "__main__":
+    import joblib
+    model_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join('models', 'fraud_model.pkl')
+    out_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join('models', 'fraud_model_compiled')
+    export_compiled_model(joblib.load(model_path), out_path)
+    print(f"Compiled model saved to {out_path}")
@@ -0,0 +1,69 @@
+import math
+import threading
+from src.utils.db_pool import get_pool
+
+
+
+class CustomerAggregates:
+    """
+    Running per-customer transaction amount aggregates (count, sum, sum of squares).
+    Warmed once from model_predictions, then updated in O(1) per persisted prediction,
+    so user average lookups do not depend on history length.
+    """
+
+    def __init__(self):
+        # customer_id -> (count, sum, sum_sq)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def warm_from_db(self, db_path):
+        """Load aggregates for all customers from model_predictions. Returns customer count."""
+        with get_pool(db_path).connection() as conn:
+            cursor = conn.cursor()
+            query = """
+                SELECT customer_id, COUNT(transaction_amount), SUM(transaction_amount),
+                       SUM(transaction_amount * transaction_amount)
+                FROM model_predictions
+                WHERE transaction_amount IS NOT NULL
+                GROUP BY customer_id
+            """
+            stats = {}
+            for customer_id, count, total, total_sq in cursor.execute(query):
+                stats[customer_id] = (int(count), float(total), float(total_sq))
+
+        with self._lock:
+            self._stats = stats
+        return len(stats)
+
+    def update(self, customer_id, amount):
+        """Add one transaction amount to a customer's aggregates."""
+        if customer_id is None or amount is None:
+            return
+        amount = float(amount)
+        # Entries are replaced, never mutated, so readers see a consistent triple without locking
+        with self._lock:
+            count, total, total_sq = self._stats.get(customer_id, (0, 0.0, 0.0))
+            self._stats[customer_id] = (count + 1, total + amount, total_sq + amount * amount)
+
+    def count(self, customer_id):
+        stats = self._stats.get(customer_id)
+        return stats[0] if stats else 0
+
+    def average(self, customer_id):
+        """Mean transaction amount, 0.0 if the customer has no history."""
+        stats = self._stats.get(customer_id)
+        if not stats or stats[0] == 0:
+            return 0.0
+        return stats[1] / stats[0]
+
+    def std(self, customer_id):
+        """Population standard deviation of the amount, 0.0 if unknown."""
+        stats = self._stats.get(customer_id)
+        if not stats or stats[0] == 0:
+            return 0.0
+        count, total, total_sq = stats
+        mean = total / count
+        return math.sqrt(max(total_sq / count - mean * mean, 0.0))
+
+    def __len__(self):
+        return len(self._stats)
@@ -5,20 +5,25 @@ This sets up a basic SQLite database connection.
 Schema will be used to store processed transactions.
 """
 
-import sqlite3
 import os
+from src.utils.db_pool import get_pool
 
 DB_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 DB_PATH = os.path.join(DB_DIR, "data", "processed", "transactions.db")
 
 def get_db_connection():
-    """Creates a database connection (SQLite for now)"""
-    conn = sqlite3.connect(DB_PATH)
-    return conn
+    """Borrows a pooled database connection (SQLite for now). conn.close() returns it to the pool."""
+    return get_pool(DB_PATH).acquire()
 
-def create_table():
+# Secondary indexes on transactions, {name: CREATE INDEX sql}; bulk loads drop
+# and rebuild them (see insert_data). None yet: lookups are by transaction_id.
+TRANSACTION_INDEXES = {}
+
+def create_table(conn=None):
     """Creates transaction table if not exists"""
-    conn = get_db_connection()
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -35,10 +40,13 @@ def create_table():
             weekday INTEGER
         );
     """)
+    for sql in TRANSACTION_INDEXES.values():
+        cursor.execute(sql)
 
     conn.commit()
-    conn.close()
-    print("🗄️ Database schema created (if not already).")
+    if own_conn:
+        conn.close()
+        print("🗄️ Database schema created (if not already).")
 
 if __name__ == "__main__":
     create_table()
@@ -0,0 +1,149 @@
+"""
+Shared SQLite connection pool
+-----------------------------
+Persistent, pooled connections for the API, the rule engine and the
+preprocessing scripts. Every connection runs in WAL mode with tuned pragmas
+and keeps its own prepared-statement cache, so repeated queries are not
+re-parsed.
+
+Configuration (environment variables):
+    DB_POOL_SIZE           max open connections per database (default 8)
+    DB_BUSY_TIMEOUT_MS     wait for locks / a free connection (default 5000)
+    DB_CACHE_SIZE_KB       page cache per connection in KiB (default 20000)
+    DB_SYNCHRONOUS         SQLite synchronous level (default NORMAL)
+    DB_STATEMENT_CACHE     prepared statements cached per connection (default 256)
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))
+SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool."""
+
+    _pool = None
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def close_permanently(self):
+        super().close()
+
+
+class SQLitePool:
+    """Bounded pool of persistent connections to one SQLite database."""
+
+    def __init__(self, db_path, pool_size=None, busy_timeout_ms=None,
+                 cache_size_kb=None, synchronous=None):
+        self.db_path = db_path
+        self.pool_size = pool_size or POOL_SIZE
+        self.busy_timeout_ms = busy_timeout_ms or BUSY_TIMEOUT_MS
+        self.cache_size_kb = cache_size_kb or CACHE_SIZE_KB
+        self.synchronous = synchronous or SYNCHRONOUS
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # connections move between threads, one user at a time
+            cached_statements=STATEMENT_CACHE,
+            factory=PooledConnection,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn._pool = self
+        return conn
+
+    def acquire(self):
+        """Get an idle connection, opening a new one while under pool_size."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.pool_size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.busy_timeout_ms / 1000)
+        except queue.Empty:
+            raise TimeoutError(f"No free database connection for {self.db_path}")
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any uncommitted work."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close all idle connections."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close_permanently()
+            with self._lock:
+                self._opened -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """Shared pool for a database file (one per absolute path)."""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = SQLitePool(key)
+    return pool
+
+
+def close_all():
+    """Close idle connections in every pool (call on shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
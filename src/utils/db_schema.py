@@ -0,0 +1,166 @@
+"""
+Schema migrations for the API tables
+------------------------------------
+model_predictions originally stored the model features only as a
+features_json blob. The features now also live in typed columns, indexed
+for per-customer history (customer_id, created_at) and lookups by
+transaction_id, so history queries are index seeks instead of full scans
+with JSON parsing. features_json is still written for existing readers.
+
+migrate_model_predictions() runs from init_db on every startup: it adds
+missing columns and indexes, and backfills the typed columns of older rows
+once (tracked with PRAGMA user_version).
+
+A transaction is scored once (see src/utils/prediction_cache.py), so
+model_predictions and fraud_alerts have a unique index on transaction_id.
+Startup never deletes rows: when a table still has duplicates left by older
+versions, ensure_unique_index() logs an error and builds a plain
+(non-unique) transaction_id index instead, so lookups stay index seeks but
+INSERT OR IGNORE no longer deduplicates. Archive the duplicates
+explicitly, keeping the first row per transaction_id and moving the others
+to <table>_duplicates, then restart:
+
+    python -m src.utils.db_schema archive-duplicates data/processed/transactions.db
+"""
+
+import os
+import sys
+import sqlite3
+
+SCHEMA_VERSION = 1
+
+# Typed feature columns, in the API's FEATURE_COLUMNS order
+PREDICTION_FEATURE_COLUMNS = [
+    ('account_age_days', 'REAL'),
+    ('transaction_amount', 'REAL'),
+    ('channel', 'TEXT'),
+    ('kyc_verified_flag', 'INTEGER'),
+    ('hour', 'INTEGER'),
+    ('weekday', 'INTEGER'),
+]
+
+PREDICTION_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_predictions_customer_created ON model_predictions (customer_id, created_at)",
+    # Recent-window scans (velocity store warm-up)
+    "CREATE INDEX IF NOT EXISTS idx_predictions_created ON model_predictions (created_at)",
+]
+
+
+def ensure_column(cursor, table, column, decl):
+    """Add a column to an existing table if it is missing."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def json_feature_sql(column):
+    """
+    A feature value from features_json. The API writes {"col": [x]},
+    seed_db.py used to write {"col": x}; handle both.
+    """
+    return (f"COALESCE(json_extract(features_json, '$.{column}[0]'), "
+            f"json_extract(features_json, '$.{column}'))")
+
+
+def count_duplicates(cursor, table, column):
+    """Rows that share a non-NULL column value with an earlier row."""
+    return cursor.execute(f"""
+        SELECT COUNT(*) - COUNT(DISTINCT {column}) FROM {table} WHERE {column} IS NOT NULL
+    """).fetchone()[0]
+
+
+def ensure_unique_index(cursor, table, column, index, fallback=None):
+    """
+    Create a unique index on table(column), replacing the plain index
+    fallback if there is one. If the table has duplicates the unique index
+    is not created and an error is logged (see archive_duplicates()); the
+    plain fallback index is created instead, so lookups by column stay
+    index seeks. Returns True when the unique index exists.
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index,)
+    ).fetchone()
+    if not exists:
+        duplicates = count_duplicates(cursor, table, column)
+        if duplicates:
+            print(f"ERROR: {table} has {duplicates} rows with a duplicate {column}; unique index {index} "
+                  f"not created. Run 'python -m src.utils.db_schema archive-duplicates <db_path>' to move "
+                  f"them to {table}_duplicates.")
+            if fallback:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {fallback} ON {table} ({column})")
+            return False
+        cursor.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({column})")
+    if fallback:
+        cursor.execute(f"DROP INDEX IF EXISTS {fallback}")
+    return True
+
+
+def archive_duplicates(cursor, table, column, row_id):
+    """
+    Move duplicate rows (all but the lowest row_id per column value) to
+    <table>_duplicates. Returns the number of rows moved.
+    """
+    archive = f"{table}_duplicates"
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {archive} AS SELECT * FROM {table} WHERE 0")
+    duplicates = f"""
+        {column} IS NOT NULL AND {row_id} NOT IN (
+            SELECT MIN({row_id}) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}
+        )
+    """
+    cursor.execute(f"INSERT INTO {archive} SELECT * FROM {table} WHERE {duplicates}")
+    cursor.execute(f"DELETE FROM {table} WHERE {duplicates}")
+    return max(cursor.rowcount, 0)
+
+
+def migrate_model_predictions(cursor):
+    """Add typed feature columns and indexes; backfill older rows. Returns rows backfilled."""
+    for column, decl in PREDICTION_FEATURE_COLUMNS:
+        ensure_column(cursor, 'model_predictions', column, decl)
+    for sql in PREDICTION_INDEXES:
+        cursor.execute(sql)
+    ensure_unique_index(cursor, 'model_predictions', 'transaction_id', 'idx_predictions_transaction_id',
+                        fallback='idx_predictions_transaction')
+
+    if cursor.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return 0
+    assignments = ", ".join(f"{column} = {json_feature_sql(column)}" for column, _ in PREDICTION_FEATURE_COLUMNS)
+    cursor.execute(f"""
+        UPDATE model_predictions SET {assignments}
+        WHERE transaction_amount IS NULL AND json_valid(features_json)
+    """)
+    backfilled = cursor.rowcount
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return backfilled
+
+
+# (table, column, row id, unique index, plain fallback index) for the transaction_id indexes
+UNIQUE_INDEXES = [
+    ('model_predictions', 'transaction_id', 'id', 'idx_predictions_transaction_id', 'idx_predictions_transaction'),
+    ('fraud_alerts', 'transaction_id', 'alert_id', 'idx_alerts_transaction_id', 'idx_alerts_transaction'),
+]
+
+
+def archive_all_duplicates(db_path):
+    """Archive duplicates in every table with a transaction_id unique index. Returns {table: rows moved}."""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        moved = {}
+        for table, column, row_id, index, fallback in UNIQUE_INDEXES:
+            if table in tables:
+                moved[table] = archive_duplicates(cursor, table, column, row_id)
+                ensure_unique_index(cursor, table, column, index, fallback)
+        conn.commit()
+        return moved
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'archive-duplicates':
+        print("Usage: python -m src.utils.db_schema archive-duplicates [db_path]")
+        sys.exit(2)
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join('data', 'processed', 'transactions.db')
+    for table, moved in archive_all_duplicates(db_path).items():
+        print(f"{table}: moved {moved} duplicate rows to {table}_duplicates")
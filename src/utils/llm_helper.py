@@ -1,54 +1,254 @@
 import os
-import requests
-import json
-from dotenv import load_dotenv
-
-load_dotenv()
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from src.utils.runtime_metrics import metrics
 
+# Read from the environment here and from .env on the first explanation request
 API_KEY = os.getenv("GEMINI_API_KEY")
-URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={API_KEY}"
+URL = os.getenv("LLM_API_URL")
+DEFAULT_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={key}"
+_env_loaded = False
 
-def generate_explanation(transaction_data, risk_score, rules_triggered):
-    """
-    Generates a human-readable explanation for a fraudulent transaction using Gemini API.
+# Async explanation settings
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "3600"))
+
+# Upper edges of the amount buckets used in cache keys
+AMOUNT_BUCKETS = [100, 500, 1000, 5000, 10000, 50000, 100000]
+
+
+class ExplanationError(Exception):
+    """Raised when the LLM API does not return a usable explanation."""
+
+
+def _load_env():
+    """Load .env once, on first use, so importing this module stays cheap."""
+    global _env_loaded, API_KEY, URL
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    if API_KEY is None:
+        API_KEY = os.getenv("GEMINI_API_KEY")
+    if URL is None:
+        URL = os.getenv("LLM_API_URL")
+    _env_loaded = True
+
+
+def _explanation_payload(transaction_data, risk_score, rules_triggered):
+    """Request body for the LLM API."""
+    # Construct prompt
+    prompt = f"""
+    Explain why this transaction is flagged as FRAUD.
+    
+    Transaction Data:
+    - Amount: ${transaction_data.get('transaction_amount')}
+    - Channel: {transaction_data.get('channel')}
+    - Hour: '{transaction_data.get('hour')}:00'
+    - Risk Score: {risk_score:.2f}
+    - Triggered Rules: {', '.join(rules_triggered) if rules_triggered else 'None'}
+    
+    Provide a concise 1-sentence explanation for a compliance officer. Focus on the most suspicious factors.
     """
+    
+    return {
+        "contents": [{
+            "parts": [{"text": prompt}]
+        }]
+    }
+
+
+def _parse_explanation(response):
+    """Explanation text from an httpx response, or raises ExplanationError."""
+    if response.status_code != 200:
+        raise ExplanationError(f"Explanation generation failed (Status {response.status_code}: {response.text}).")
+
+    # Extract text
+    try:
+        explanation = response.json()['candidates'][0]['content']['parts'][0]['text']
+        return explanation.strip()
+    except (KeyError, IndexError, ValueError):
+        raise ExplanationError("Explanation generation failed (Invalid response format).")
+
+
+async def _request_explanation_async(transaction_data, risk_score, rules_triggered, client):
+    """Call the LLM API over an httpx.AsyncClient. Returns the explanation text or raises ExplanationError."""
+    _load_env()
     if not API_KEY:
-        return "Explanation unavailable (API Key missing)."
+        raise ExplanationError("Explanation unavailable (API Key missing).")
 
+    payload = _explanation_payload(transaction_data, risk_score, rules_triggered)
     try:
-        # Construct prompt
-        prompt = f"""
-        Explain why this transaction is flagged as FRAUD.
-        
-        Transaction Data:
-        - Amount: ${transaction_data.get('transaction_amount')}
-        - Channel: {transaction_data.get('channel')}
-        - Hour: '{transaction_data.get('hour')}:00'
-        - Risk Score: {risk_score:.2f}
-        - Triggered Rules: {', '.join(rules_triggered) if rules_triggered else 'None'}
-        
-        Provide a concise 1-sentence explanation for a compliance officer. Focus on the most suspicious factors.
-        """
-        
-        payload = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }]
+        response = await client.post(URL or DEFAULT_URL.format(key=API_KEY), json=payload, timeout=10)
+    except Exception as e:
+        raise ExplanationError(f"Explanation generation failed (Error: {str(e)}).")
+    return _parse_explanation(response)
+
+
+def explanation_cache_key(transaction_data, rules_triggered, rule_ids=None):
+    """
+    Normalized prompt inputs: channel, amount bucket, hour and the rules.
+    Rules are keyed by rule_ids (rule names) when given, so per-user numbers
+    in the labels (e.g. '(Avg: 12.34)') do not split the cache; otherwise by
+    the full labels.
+    """
+    amount = float(transaction_data.get('transaction_amount') or 0)
+    bucket = next((i for i, edge in enumerate(AMOUNT_BUCKETS) if amount < edge), len(AMOUNT_BUCKETS))
+    rules = tuple(sorted(rule_ids if rule_ids is not None else (rules_triggered or [])))
+    return (
+        str(transaction_data.get('channel', '')).strip().lower(),
+        bucket,
+        transaction_data.get('hour'),
+        rules
+    )
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
         }
-        
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(URL, headers=headers, json=payload, timeout=10)
-        
-        if response.status_code == 200:
-            result = response.json()
-            # Extract text
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ExplanationService:
+    """
+    Generates explanations off the request path. request_async() runs a
+    cache miss as a task on the caller's event loop over a shared
+    httpx.AsyncClient, at most max_concurrency calls at a time. Successful
+    results are cached by normalized prompt inputs and handed to
+    on_result(transaction_id, explanation), run in a worker thread, so the
+    caller can write them back; call it only once the row to update is
+    persisted. cached() answers from
+    the cache alone, for callers that store the explanation with the row.
+    """
+
+    def __init__(self, on_result=None, max_concurrency=LLM_MAX_CONCURRENCY, cache=None, max_results=10000):
+        self.on_result = on_result
+        self.cache = cache if cache is not None else TTLCache()
+        # transaction_id -> {'status': 'pending' | 'ready' | 'failed', 'explanation': str}
+        self._results = OrderedDict()
+        self._max_results = max_results
+        self._lock = threading.Lock()
+        # Created on first use, on the caller's event loop
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._client = None
+        self._tasks = set()
+
+    def cached(self, transaction_id, transaction_data, rules_triggered, rule_ids=None):
+        """
+        Cached explanation for a flagged transaction, or None. A hit is
+        recorded for get() but not passed to on_result: the caller stores it.
+        """
+        explanation = self.cache.get(explanation_cache_key(transaction_data, rules_triggered, rule_ids))
+        if explanation is not None:
+            self._set(transaction_id, 'ready', explanation)
+        return explanation
+
+    def request_async(self, transaction_id, transaction_data, risk_score, rules_triggered, rule_ids=None):
+        """
+        Queue an explanation for a flagged transaction; call from a coroutine.
+        Returns the explanation immediately on a cache hit, otherwise None.
+        """
+        key = explanation_cache_key(transaction_data, rules_triggered, rule_ids)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._spawn(self._finish(transaction_id, 'ready', cached))
+            return cached
+
+        if self._semaphore is None:
+            import httpx  # deferred with the client itself, off the startup path
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._client = httpx.AsyncClient()
+        self._set(transaction_id, 'pending', None)
+        self._spawn(self._run_async(transaction_id, key, dict(transaction_data), risk_score, list(rules_triggered)))
+        return None
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get(self, transaction_id):
+        """In-memory job state for a transaction, or None if unknown."""
+        with self._lock:
+            return self._results.get(transaction_id)
+
+    async def aclose(self):
+        """Wait for running explanation tasks and close the HTTP client."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run_async(self, transaction_id, key, transaction_data, risk_score, rules_triggered):
+        async with self._semaphore:
+            start = time.perf_counter()
             try:
-                explanation = result['candidates'][0]['content']['parts'][0]['text']
-                return explanation.strip()
-            except (KeyError, IndexError):
-                return "Explanation generation failed (Invalid response format)."
-        else:
-            return f"Explanation generation failed (Status {response.status_code}: {response.text})."
-            
-    except Exception as e:
-        return f"Explanation generation failed (Error: {str(e)})."
+                explanation = await _request_explanation_async(
+                    transaction_data, risk_score, rules_triggered, self._client
+                )
+            except Exception as e:
+                metrics.incr('llm_failures')
+                await self._finish(transaction_id, 'failed', str(e))
+                return
+            finally:
+                metrics.observe('llm_call', time.perf_counter() - start)
+        self.cache.put(key, explanation)
+        await self._finish(transaction_id, 'ready', explanation)
+
+    async def _finish(self, transaction_id, status, explanation):
+        self._set(transaction_id, status, explanation)
+        if status == 'ready' and self.on_result is not None:
+            # on_result may do blocking I/O (a DB write); keep it off the event loop
+            try:
+                await asyncio.to_thread(self.on_result, transaction_id, explanation)
+            except Exception as e:
+                print(f"Error saving explanation: {e}")
+
+    def _set(self, transaction_id, status, explanation):
+        with self._lock:
+            self._results[transaction_id] = {'status': status, 'explanation': explanation}
+            self._results.move_to_end(transaction_id)
+            while len(self._results) > self._max_results:
+                self._results.popitem(last=False)
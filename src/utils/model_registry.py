@@ -0,0 +1,201 @@
+"""
+Local versioned model registry
+------------------------------
+Layout under models/registry/:
+    <version>/fraud_model.pkl          fitted Pipeline
+    <version>/fraud_model_compiled/    NumPy export (src/utils/compiled_model.py)
+    <version>/metrics.json             evaluation metrics
+    <version>/model_version.txt        version info (timestamp, git hash, ...)
+    CURRENT                            name of the active version
+
+CURRENT is replaced atomically, so readers always see a complete version.
+When the registry is empty the legacy models/fraud_model.pkl is used.
+
+Version names must match VERSION_PATTERN ('v' + letters, digits, '_', '.',
+'-'); names that could leave the registry directory are rejected before any
+path is built, and only published versions are ever loaded.
+"""
+
+import os
+import re
+import json
+import shutil
+import threading
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+REGISTRY_DIR = os.path.join(MODELS_DIR, 'registry')
+LEGACY_MODEL_PATH = os.path.join(MODELS_DIR, 'fraud_model.pkl')
+LEGACY_COMPILED_PATH = os.path.join(MODELS_DIR, 'fraud_model_compiled')
+LEGACY_VERSION_PATH = os.path.join(MODELS_DIR, 'model_version.txt')
+
+MODEL_FILE = 'fraud_model.pkl'
+COMPILED_DIR = 'fraud_model_compiled'
+METRICS_FILE = 'metrics.json'
+VERSION_FILE = 'model_version.txt'
+VERSION_PATTERN = re.compile(r'^v[\w.-]+$')
+
+
+class UnknownVersion(ValueError):
+    """A version name that is invalid or not published in the registry."""
+
+
+def is_valid_version(version):
+    return isinstance(version, str) and bool(VERSION_PATTERN.match(version)) and version not in ('.', '..')
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def _current_path(self):
+        return os.path.join(self.root, 'CURRENT')
+
+    def version_dir(self, version):
+        if not is_valid_version(version):
+            raise UnknownVersion(f"Invalid model version: {version!r}")
+        return os.path.join(self.root, version)
+
+    def list_versions(self):
+        """Published versions, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            v for v in os.listdir(self.root)
+            if is_valid_version(v) and os.path.exists(os.path.join(self.root, v, MODEL_FILE))
+        )
+
+    def current_version(self):
+        try:
+            with open(self._current_path(), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set_current(self, version):
+        if version not in self.list_versions():
+            raise UnknownVersion(f"Unknown model version: {version}")
+        tmp = self._current_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(version)
+        os.replace(tmp, self._current_path())
+
+    def info(self, version):
+        if version not in self.list_versions():
+            return {}
+        try:
+            with open(os.path.join(self.version_dir(version), VERSION_FILE), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def publish(self, pipeline, metrics=None, info=None, version=None, activate=True, artifacts=None):
+        """
+        Save a fitted Pipeline (plus compiled export) as a new version.
+        artifacts: extra files (e.g. the search results table) copied into the version dir.
+        """
+        import joblib
+        from src.utils.compiled_model import export_compiled_model
+
+        if version is None:
+            version = datetime.now().strftime('v%Y%m%d_%H%M%S')
+            # Several publishes within a second (e.g. back-to-back retrains)
+            base, n = version, 1
+            while os.path.exists(self.version_dir(version)):
+                n += 1
+                version = f"{base}_{n}"
+        final_dir = self.version_dir(version)
+        if os.path.exists(final_dir):
+            raise ValueError(f"Model version already exists: {version}")
+
+        # Write into a temp dir and rename, so a version is either complete or absent
+        tmp_dir = final_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        joblib.dump(pipeline, os.path.join(tmp_dir, MODEL_FILE))
+        export_compiled_model(pipeline, os.path.join(tmp_dir, COMPILED_DIR))
+        if metrics is not None:
+            with open(os.path.join(tmp_dir, METRICS_FILE), 'w') as f:
+                json.dump(metrics, f, indent=2)
+        version_info = dict(info or {}, version=version, published_at=datetime.now().isoformat())
+        with open(os.path.join(tmp_dir, VERSION_FILE), 'w') as f:
+            json.dump(version_info, f, indent=2)
+        for path in artifacts or ():
+            shutil.copy2(path, os.path.join(tmp_dir, os.path.basename(path)))
+        os.replace(tmp_dir, final_dir)
+
+        if activate:
+            self.set_current(version)
+        return version
+
+    def resolve(self, version=None):
+        """
+        Paths for a version (default: CURRENT).
+        Returns dict(version, model_path, compiled_path) or None if nothing is available.
+        """
+        version = version or self.current_version()
+        if version:
+            # Checked against the published versions before any path is built
+            if version not in self.list_versions():
+                raise UnknownVersion(f"Unknown model version: {version}")
+            path = self.version_dir(version)
+            return {
+                'version': version,
+                'model_path': os.path.join(path, MODEL_FILE),
+                'compiled_path': os.path.join(path, COMPILED_DIR),
+            }
+        if os.path.exists(LEGACY_MODEL_PATH) or os.path.exists(LEGACY_COMPILED_PATH):
+            return {
+                'version': legacy_version(),
+                'model_path': LEGACY_MODEL_PATH,
+                'compiled_path': LEGACY_COMPILED_PATH,
+            }
+        return None
+
+    def fingerprint(self):
+        """Changes whenever the active model changes (used by the watcher)."""
+        paths = [self._current_path(), LEGACY_MODEL_PATH]
+        return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+
+def legacy_version():
+    """Version label for the unregistered models/fraud_model.pkl."""
+    try:
+        with open(LEGACY_VERSION_PATH, 'r') as f:
+            info = json.load(f)
+        return f"legacy-{info.get('git_hash', 'unknown')}-{info.get('timestamp', '')[:19]}"
+    except (FileNotFoundError, ValueError):
+        return "legacy"
+
+
+class ModelWatcher:
+    """Polls the registry and calls on_change() when the active model changes."""
+
+    def __init__(self, registry, on_change, interval_s=5.0):
+        self.registry = registry
+        self.on_change = on_change
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._last = self.registry.fingerprint()
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            fingerprint = self.registry.fingerprint()
+            if fingerprint != self._last:
+                self._last = fingerprint
+                try:
+                    self.on_change()
+                except Exception as e:
+                    print(f"Model reload failed: {e}")
@@ -0,0 +1,112 @@
+"""
+Idempotent predictions by transaction_id
+----------------------------------------
+Clients retry /predict on timeouts. A transaction_id is scored once: its
+result is kept in a bounded LRU cache (entries expire after
+PREDICTION_CACHE_TTL_S), so a retry gets the stored verdict back without
+re-running the model, the rules or the LLM call.
+
+The database backs the cache: model_predictions and fraud_alerts have a
+unique index on transaction_id (see src/utils/db_schema.py) and rows are
+inserted with INSERT OR IGNORE, so a retry that misses the cache, or two
+concurrent first attempts, never write duplicate rows. With
+PREDICTION_LOOKUP_DB=1 a cache miss is also looked up in model_predictions
+(load_stored_predictions), so retries that land on another worker process
+or after a restart get the stored verdict too, at the cost of one indexed
+SELECT per new transaction.
+
+Configuration (environment variables):
+    PREDICTION_CACHE_SIZE    results kept in memory (default 100000)
+    PREDICTION_CACHE_TTL_S   seconds a result stays cached (default 3600)
+    PREDICTION_LOOKUP_DB     1 to look up cache misses in the DB (default 0)
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "100000"))
+PREDICTION_CACHE_TTL_S = float(os.getenv("PREDICTION_CACHE_TTL_S", "3600"))
+PREDICTION_LOOKUP_DB = os.getenv("PREDICTION_LOOKUP_DB", "0") == "1"
+
+# SQLite's default bound-parameter limit is 999
+LOOKUP_CHUNK_SIZE = 500
+
+
+class PredictionCache:
+    """Thread-safe LRU/TTL cache of /predict results keyed by transaction_id."""
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize or PREDICTION_CACHE_SIZE
+        self.ttl = PREDICTION_CACHE_TTL_S if ttl is None else ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, transaction_id):
+        with self._lock:
+            entry = self._data.get(transaction_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._data[transaction_id]
+                self.misses += 1
+                return None
+            self._data.move_to_end(transaction_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, transaction_id, result):
+        with self._lock:
+            self._data[transaction_id] = (result, time.monotonic() + self.ttl)
+            self._data.move_to_end(transaction_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+def load_stored_predictions(conn, transaction_ids):
+    """
+    Results of already persisted transactions, in the /predict response shape.
+    Returns {transaction_id: result} for the ids found.
+    """
+    transaction_ids = list(transaction_ids)
+    results = {}
+    for i in range(0, len(transaction_ids), LOOKUP_CHUNK_SIZE):
+        chunk = transaction_ids[i:i + LOOKUP_CHUNK_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            "SELECT p.transaction_id, p.risk_score, p.prediction, a.reason "
+            "FROM model_predictions p LEFT JOIN fraud_alerts a ON a.transaction_id = p.transaction_id "
+            f"WHERE p.transaction_id IN ({placeholders})",
+            chunk
+        ).fetchall()
+        for transaction_id, risk_score, prediction, reason in rows:
+            is_fraud = bool(prediction)
+            results[transaction_id] = {
+                "transaction_id": transaction_id,
+                "risk_score": risk_score,
+                "is_fraud": is_fraud,
+                "prediction": 1 if is_fraud else 0,
+                "reason": (reason or "") if is_fraud else "Legit",
+            }
+    return results
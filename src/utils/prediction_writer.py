@@ -0,0 +1,266 @@
+"""
+Write-behind persistence for model_predictions and fraud_alerts
+---------------------------------------------------------------
+Requests enqueue their rows on a bounded in-process queue and return.
+A background thread drains the queue and commits every BATCH_SIZE rows
+or FLUSH_INTERVAL_MS milliseconds, whichever comes first.
+
+Explanation updates go through the same FIFO queue, and a commit applies
+its updates after its inserts. An update therefore finds its alert only
+if the alert was enqueued first (or in the same item, see submit()) and
+its batch was not spilled. The API guarantees the first part: a cached
+explanation is submitted together with its alert, and a generated one is
+requested only after the alert is enqueued.
+
+A failed commit is retried WRITE_BEHIND_RETRIES times with exponential
+backoff. If it still fails, the batch is appended to a JSONL spill file
+next to the database instead of being dropped; the next writer to start
+replays it (inserts are idempotent by transaction_id).
+
+on_inserted(rows) is called after every commit with the prediction rows
+it inserted (not the ones skipped as retries), so the caller can keep
+in-memory aggregates in step with the table.
+
+Configuration (environment variables):
+    WRITE_BEHIND               1 to enable (default), 0 to write synchronously
+    WRITE_BEHIND_BATCH_SIZE    rows per commit (default 500)
+    WRITE_BEHIND_INTERVAL_MS   max time a row waits before commit (default 50)
+    WRITE_BEHIND_MAX_QUEUE     queue bound; submit blocks when full (default 10000)
+    WRITE_BEHIND_RETRIES       retries of a failed commit before spilling (default 3)
+    WRITE_BEHIND_SPILL_PATH    spill file (default: <db_path>.spill.jsonl)
+"""
+
+import os
+import json
+import queue
+import threading
+import time
+
+from src.utils.db_pool import get_pool
+from src.utils.runtime_metrics import metrics
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+FLUSH_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", "50"))
+MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "3"))
+RETRY_BACKOFF_S = 0.1  # doubled after every failed attempt
+
+# Rows: (transaction_id, customer_id, features_json, risk_score, prediction, created_at,
+#        model_version, account_age_days, transaction_amount, channel, kyc_verified_flag, hour, weekday)
+# A transaction_id is written once (unique indexes); a duplicate is a retry and is skipped
+INSERT_PREDICTION = '''
+    INSERT OR IGNORE INTO model_predictions
+    (transaction_id, customer_id, features_json, risk_score, prediction, created_at, model_version,
+     account_age_days, transaction_amount, channel, kyc_verified_flag, hour, weekday)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_ALERT = '''
+    INSERT OR IGNORE INTO fraud_alerts
+    (transaction_id, customer_id, risk_score, reason, created_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+UPDATE_EXPLANATION = '''
+    UPDATE fraud_alerts SET explanation = ? WHERE transaction_id = ?
+'''
+
+_STOP = object()
+
+
+def write_rows(conn, prediction_rows, alert_rows, explanation_rows=()):
+    """
+    Insert prediction and alert rows, apply explanation updates and commit
+    once. Returns the prediction rows that were inserted, i.e. not skipped
+    as a retry of a stored transaction_id.
+    """
+    cursor = conn.cursor()
+    inserted = []
+    for row in prediction_rows:
+        cursor.execute(INSERT_PREDICTION, row)
+        if cursor.rowcount == 1:
+            inserted.append(row)
+    if alert_rows:
+        cursor.executemany(INSERT_ALERT, alert_rows)
+    if explanation_rows:
+        cursor.executemany(UPDATE_EXPLANATION, explanation_rows)
+    conn.commit()
+    return inserted
+
+
+class PredictionWriter:
+    """Background writer that batches prediction/alert inserts into few commits."""
+
+    def __init__(self, db_path, batch_size=None, flush_interval_ms=None, max_queue=None,
+                 retries=None, retry_backoff_s=None, spill_path=None, on_inserted=None):
+        self.db_path = db_path
+        # Called on the writer thread with the prediction rows each commit inserted
+        self.on_inserted = on_inserted
+        self.batch_size = batch_size or BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or FLUSH_INTERVAL_MS) / 1000
+        self.retries = RETRIES if retries is None else retries
+        self.retry_backoff_s = RETRY_BACKOFF_S if retry_backoff_s is None else retry_backoff_s
+        self.spill_path = spill_path or os.getenv("WRITE_BEHIND_SPILL_PATH") or f"{db_path}.spill.jsonl"
+        # Items are (prediction_row, alert_row, explanation_row), any of them may be None
+        self._queue = queue.Queue(maxsize=max_queue or MAX_QUEUE)
+        self._thread = None
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.rows_written = 0
+        self.failed_rows = 0
+        self.retried_commits = 0
+        self.spilled_rows = 0
+        self.replayed_rows = 0
+        self.commits = 0
+        self.total_flush_s = 0.0
+        self.last_flush_s = 0.0
+        self.max_flush_s = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, prediction_row, alert_row=None, explanation_row=None, block=True):
+        """
+        Enqueue one prediction (and optional alert, and an explanation for that
+        alert, committed together). Blocks while the queue is full; with
+        block=False raises queue.Full instead.
+        """
+        self._queue.put((prediction_row, alert_row, explanation_row), block=block)
+
+    def submit_explanation(self, transaction_id, explanation, block=True):
+        """
+        Enqueue an explanation update for an alert submitted earlier. With
+        block=False raises queue.Full instead of waiting for space.
+        """
+        self._queue.put((None, None, (explanation, transaction_id)), block=block)
+
+    def flush(self):
+        """Block until everything submitted so far is committed."""
+        self._queue.join()
+
+    def stop(self):
+        """Flush remaining rows and stop the background thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'rows_written': self.rows_written,
+                'failed_rows': self.failed_rows,
+                'retried_commits': self.retried_commits,
+                'spilled_rows': self.spilled_rows,
+                'replayed_rows': self.replayed_rows,
+                'commits': self.commits,
+                'last_flush_ms': self.last_flush_s * 1000,
+                'avg_flush_ms': (self.total_flush_s / self.commits * 1000) if self.commits else 0.0,
+                'max_flush_ms': self.max_flush_s * 1000,
+            }
+
+    def _run(self):
+        self._replay_spill()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+
+            # Collect until the batch is full or the oldest row has waited long enough
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        prediction_rows = [p for p, _, _ in batch if p is not None]
+        alert_rows = [a for _, a, _ in batch if a is not None]
+        explanation_rows = [e for _, _, e in batch if e is not None]
+        start = time.perf_counter()
+        backoff = self.retry_backoff_s
+        for attempt in range(self.retries + 1):
+            try:
+                with get_pool(self.db_path).connection() as conn:
+                    inserted = write_rows(conn, prediction_rows, alert_rows, explanation_rows)
+                break
+            except Exception as e:
+                print(f"DB Error (attempt {attempt + 1}/{self.retries + 1}): {e}")
+                if attempt == self.retries:
+                    with self._stats_lock:
+                        self.failed_rows += len(batch)
+                    self._spill(batch)
+                    return
+                with self._stats_lock:
+                    self.retried_commits += 1
+                time.sleep(backoff)
+                backoff *= 2
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('db_write', elapsed)
+        with self._stats_lock:
+            self.rows_written += len(batch)
+            self.commits += 1
+            self.total_flush_s += elapsed
+            self.last_flush_s = elapsed
+            self.max_flush_s = max(self.max_flush_s, elapsed)
+        self._notify(inserted)
+
+    def _notify(self, inserted):
+        if inserted and self.on_inserted is not None:
+            try:
+                self.on_inserted(inserted)
+            except Exception as e:
+                print(f"Error in on_inserted callback: {e}")
+
+    def _spill(self, batch):
+        """Append a batch that could not be committed to the spill file."""
+        try:
+            with open(self.spill_path, 'a') as f:
+                for item in batch:
+                    f.write(json.dumps(item) + '\n')
+        except Exception as e:
+            print(f"Could not spill {len(batch)} rows to {self.spill_path}: {e}")
+            return
+        with self._stats_lock:
+            self.spilled_rows += len(batch)
+        print(f"Spilled {len(batch)} rows to {self.spill_path}")
+
+    def _replay_spill(self):
+        """Commit rows spilled by an earlier writer, then remove the spill file."""
+        if not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, 'r') as f:
+            batch = [json.loads(line) for line in f if line.strip()]
+        try:
+            with get_pool(self.db_path).connection() as conn:
+                inserted = write_rows(conn, [p for p, _, _ in batch if p is not None],
+                                      [a for _, a, _ in batch if a is not None],
+                                      [e for _, _, e in batch if e is not None])
+        except Exception as e:
+            print(f"Could not replay {self.spill_path}; keeping it: {e}")
+            return
+        os.remove(self.spill_path)
+        with self._stats_lock:
+            self.replayed_rows += len(batch)
+        print(f"Replayed {len(batch)} spilled rows from {self.spill_path}")
+        self._notify([tuple(row) for row in inserted])
@@ -1,13 +1,49 @@
-import sqlite3
-import pandas as pd
-import numpy as np
-from datetime import datetime
+import os
+import time
+from src.utils.db_pool import get_pool
+from src.utils.rule_plan import RulePlan, VELOCITY_WINDOWS, velocity_fields
+from src.utils.runtime_metrics import metrics
+
+# Rule definitions (see src/utils/rule_plan.py); checked for changes every RULES_RELOAD_INTERVAL_S
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RULES_PATH = os.getenv("RULES_CONFIG", os.path.join(BASE_DIR, 'configs', 'rules.json'))
+RULES_RELOAD_INTERVAL_S = float(os.getenv("RULES_RELOAD_INTERVAL_S", "5"))
 
 class RuleEngine:
-    def __init__(self, db_path):
+    def __init__(self, db_path, aggregates=None, velocity=None, rules_path=None):
         self.db_path = db_path
-        # Define risky channels
-        self.RISKY_CHANNELS = {'web', 'mobile_browser', 'unknown'} 
+        # Optional in-memory CustomerAggregates; falls back to SQL when not set
+        self.aggregates = aggregates
+        # Optional VelocityStore; velocity rules never match when not set
+        self.velocity = velocity
+        self.rules_path = rules_path or RULES_PATH
+        self.reload_interval_s = RULES_RELOAD_INTERVAL_S
+        self.reload_rules()
+
+    def reload_rules(self):
+        """Compile the rules file and swap it in. Raises (keeping the old plan) if it is invalid."""
+        mtime = os.path.getmtime(self.rules_path)
+        self.plan = RulePlan.from_file(self.rules_path)
+        self._rules_mtime = mtime
+        self._next_rules_check = time.monotonic() + self.reload_interval_s
+        return self.plan
+
+    def _maybe_reload_rules(self):
+        now = time.monotonic()
+        if self.reload_interval_s <= 0 or now < self._next_rules_check:
+            return
+        self._next_rules_check = now + self.reload_interval_s
+        try:
+            if os.path.getmtime(self.rules_path) != self._rules_mtime:
+                self.reload_rules()
+                print(f"Rules reloaded from {self.rules_path}")
+        except Exception as e:
+            # Don't retry a broken file until it changes again
+            self._rules_mtime = os.path.getmtime(self.rules_path) if os.path.exists(self.rules_path) else None
+            print(f"Error reloading rules: {e}")
+
+    def rule_stats(self):
+        return self.plan.stats()
 
     def check_rules(self, transaction_data):
         """
@@ -16,66 +52,111 @@ class RuleEngine:
             dict: {
                 'triggered': bool,
                 'rules_triggered': list_of_strings,
+                'rule_ids': names of those rules (configs/rules.json),
                 'reason': string
             }
         """
-        triggered_rules = []
-        is_fraud = False
-        
-        # Extract data
-        amount = transaction_data.get('transaction_amount', 0)
-        hour = transaction_data.get('hour', 0)
-        channel = transaction_data.get('channel', 'unknown')
-        kyc_verified = transaction_data.get('kyc_verified_flag', 1)  # Default to 1 (safe) if missing
-        customer_id = transaction_data.get('customer_id')
+        self._maybe_reload_rules()
+        # History (user average, velocity) is only fetched if a rule gets that far
+        triggered_rules = self.plan.evaluate(transaction_data, {
+            'user_average': self._load_user_average,
+            'velocity': self._load_velocity,
+        })
+        return self._result(triggered_rules)
 
-        # Rule 1: Odd-hour transaction (02:00–04:00)
-        if 2 <= hour <= 4:
-            triggered_rules.append("Odd Hours (02:00-04:00)")
-
-        # Rule 2: Risky Channel AND KYC Not Verified
-        if channel in self.RISKY_CHANNELS and not kyc_verified:
-            triggered_rules.append("Risky Channel & Unverified KYC")
-
-        # Rule 3: Amount > 5x User Average
-        # We need to query the DB for user history. 
-        # Ideally this should be cached or optimized, but for this milestone direct DB query is fine.
-        user_avg = self._get_user_average(customer_id)
-        if user_avg > 0 and amount > 5 * user_avg:
-            triggered_rules.append(f"Amount > 5x User Average (Avg: {user_avg:.2f})")
+    def check_rules_batch(self, transactions):
+        """
+        Apply rules to a list of transactions.
+        Rules are evaluated column-wise over the batch; user averages are
+        fetched with one query for the customers that need them.
+        Returns a list of check_rules results, in input order.
+        """
+        self._maybe_reload_rules()
+        results = self.plan.evaluate_batch(transactions, {
+            'user_average': self._load_user_averages,
+            'velocity': self._load_velocities,
+        })
+        return [self._result(triggered_rules) for triggered_rules in results]
 
-        if triggered_rules:
-            is_fraud = True
-            
+    def _result(self, triggered):
+        triggered_rules = [label for _, label in triggered]
         return {
-            'triggered': is_fraud,
+            'triggered': bool(triggered_rules),
             'rules_triggered': triggered_rules,
+            'rule_ids': [name for name, _ in triggered],
             'reason': "; ".join(triggered_rules) if triggered_rules else "No rules triggered"
         }
 
+    def _load_user_average(self, txn):
+        with metrics.timer('get_user_average'):
+            return {'user_avg': self._get_user_average(txn.get('customer_id'))}
+
+    def _load_user_averages(self, txns):
+        averages = self._get_user_averages({t.get('customer_id') for t in txns})
+        return {'user_avg': [averages.get(t.get('customer_id'), 0.0) for t in txns]}
+
+    def _load_velocity(self, txn):
+        if self.velocity is None:
+            return {}
+        with metrics.timer('velocity'):
+            snapshot = self.velocity.snapshot(txn.get('customer_id'))
+        return velocity_fields(snapshot, txn.get('transaction_amount') or 0)
+
+    def _load_velocities(self, txns):
+        if self.velocity is None:
+            return {}
+        snapshots = {c: self.velocity.snapshot(c) for c in {t.get('customer_id') for t in txns}}
+        rows = [snapshots[t.get('customer_id')] for t in txns]
+        amounts = [t.get('transaction_amount') or 0 for t in txns]
+        columns = {}
+        for window in VELOCITY_WINDOWS:
+            counts = [row[f'count_{window}'] for row in rows]
+            sums = [row[f'sum_{window}'] for row in rows]
+            columns[f'count_{window}'] = counts
+            columns[f'sum_{window}'] = sums
+            columns[f'txn_count_{window}'] = [count + 1 for count in counts]
+            columns[f'spend_{window}'] = [total + amount for total, amount in zip(sums, amounts)]
+        return columns
+
+    def _get_user_averages(self, customer_ids, chunk_size=500):
+        """Average transaction amount per customer, for many customers at once."""
+        customer_ids = [c for c in customer_ids if c is not None]
+        averages = {}
+        if not customer_ids:
+            return averages
+        if self.aggregates is not None:
+            for customer_id in customer_ids:
+                avg = self.aggregates.average(customer_id)
+                if avg > 0:
+                    averages[customer_id] = avg
+            return averages
+        try:
+            with get_pool(self.db_path).connection() as conn:
+                cursor = conn.cursor()
+                # Chunked to stay under SQLite's bound-parameter limit
+                for i in range(0, len(customer_ids), chunk_size):
+                    chunk = customer_ids[i:i + chunk_size]
+                    placeholders = ",".join("?" * len(chunk))
+                    query = (
+                        "SELECT customer_id, AVG(transaction_amount) "
+                        f"FROM model_predictions WHERE customer_id IN ({placeholders}) GROUP BY customer_id"
+                    )
+                    for customer_id, avg in cursor.execute(query, chunk):
+                        if avg is not None:
+                            averages[customer_id] = float(avg)
+        except Exception as e:
+            print(f"Error fetching user averages: {e}")
+        return averages
+
     def _get_user_average(self, customer_id):
+        if self.aggregates is not None:
+            return self.aggregates.average(customer_id)
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Query the model_predictions table (which stores txn history in this simplified backend)
-            # OR we should query the main transactions table if it exists. 
-            # In Milestone 1/2, 'transactions.db' was created.
-            # Let's check 'model_predictions' first as it's what we insert into.
-            # But wait, 'model_predictions' only has NEW transactions? 
-            # If so, we need historical data. 
-            # The prompt says "Reuse existing SQLite DB".
-            # 'seed_db.py' inserts into 'model_predictions'. 
-            # I'll check if there is another table with historical data.
-            # If not, I'll rely on 'model_predictions' which accumulates efficiently.
-            
             # Note: For the very first transaction of a user, average might be 0 or based on just this one. 
-            # I'll ignore the current transaction in the average calculation if possible, or just accept it.
-            
-            query = "SELECT AVG(json_extract(features_json, '$.transaction_amount')) FROM model_predictions WHERE customer_id = ?"
-            cursor.execute(query, (customer_id,))
-            result = cursor.fetchone()
-            conn.close()
+            query = "SELECT AVG(transaction_amount) FROM model_predictions WHERE customer_id = ?"
+            with get_pool(self.db_path).connection() as conn:
+                result = conn.execute(query, (customer_id,)).fetchone()
             
             if result and result[0] is not None:
                 return float(result[0])
@@ -0,0 +1,389 @@
+"""
+Declarative fraud rules
+-----------------------
+Rules are defined in a JSON (or YAML, with PyYAML installed) file, by
+default configs/rules.json, and compiled into a RulePlan:
+
+    {
+      "defaults": {"hour": 0, "channel": "unknown"},
+      "sets": {"risky_channels": ["web", "unknown"]},
+      "rules": [
+        {"name": "risky_channel_unverified_kyc",
+         "label": "Risky Channel & Unverified KYC",
+         "when": [{"field": "channel", "op": "in", "value": "$risky_channels"},
+                  {"field": "kyc_verified_flag", "op": "==", "value": 0}]}
+      ]
+    }
+
+A rule triggers when all of its "when" conditions hold. Operators:
+>, >=, <, <=, ==, !=, in, not_in, between. A value is a literal, a "$set"
+reference, or {"field": name, "times": k} for thresholds relative to
+another field. Labels are str.format templates over the same fields.
+
+Fields come from the transaction itself, or from history sources that are
+loaded lazily (see RuleEngine): user_avg, and the velocity fields
+count_<w> / sum_<w> / txn_count_<w> / spend_<w> for w in 1m, 1h, 24h
+(txn_ and spend_ include the transaction being checked). The plan runs
+rules and conditions cheapest first, so a history source is only fetched
+when a rule's cheaper conditions have passed. Results keep the file's rule
+order. Every rule counts evaluations and hits; evaluation time is sampled.
+Evaluations run on several inference threads; each one tallies locally and
+merges into the rule counters under one lock.
+"""
+
+import sys
+import json
+import time
+import string
+import operator
+import itertools
+import threading
+
+import numpy as np
+
+# Cost of reading a field, by source; transaction fields cost 0
+SOURCE_COSTS = {'velocity': 1, 'user_average': 2}
+VELOCITY_WINDOWS = ('1m', '1h', '24h')
+FIELD_SOURCES = {'user_avg': 'user_average'}
+for _w in VELOCITY_WINDOWS:
+    for _prefix in ('count', 'sum', 'txn_count', 'spend'):
+        FIELD_SOURCES[f'{_prefix}_{_w}'] = 'velocity'
+
+COMPARISONS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+    '==': operator.eq, '!=': operator.ne,
+}
+OPERATORS = set(COMPARISONS) | {'in', 'not_in', 'between'}
+
+# Single-row evaluations are timed one in TIMING_SAMPLE (timing costs more than most rules)
+TIMING_SAMPLE = 16
+
+
+class RuleConfigError(ValueError):
+    pass
+
+
+def velocity_fields(snapshot, amount):
+    """Velocity rule fields from a VelocityStore snapshot and the current amount."""
+    fields = dict(snapshot)
+    for window in VELOCITY_WINDOWS:
+        if f'count_{window}' in snapshot:
+            fields[f'txn_count_{window}'] = snapshot[f'count_{window}'] + 1
+            fields[f'spend_{window}'] = snapshot[f'sum_{window}'] + amount
+    return fields
+
+
+def load_rule_config(path):
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _numeric_column(values):
+    """float64 array (NaN for missing) if the values are numeric, else an object array."""
+    try:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array(values, dtype=object)
+
+
+def _frame_column(frame, field, default):
+    """_numeric_column for a DataFrame column, without a per-row loop; NaN is missing."""
+    if field not in frame.columns:
+        return _numeric_column([default] * len(frame))
+    values = frame[field]
+    if default is not None:
+        values = values.fillna(default)
+    try:
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    except (TypeError, ValueError):
+        return values.astype(object).where(values.notna(), None).to_numpy()
+
+
+class Condition:
+    """One compiled comparison: field <op> value."""
+
+    def __init__(self, spec, sets):
+        try:
+            self.field = spec['field']
+            self.op = spec['op']
+            value = spec['value']
+        except KeyError as e:
+            raise RuleConfigError(f"Condition {spec} is missing {e}")
+        if self.op not in OPERATORS:
+            raise RuleConfigError(f"Unknown operator '{self.op}'")
+
+        # Threshold relative to another field: {"field": name, "times": k}
+        self.ref_field = None
+        self.times = 1.0
+        if isinstance(value, dict):
+            self.ref_field = value['field']
+            self.times = value.get('times', 1.0)
+            value = None
+        elif isinstance(value, str) and value.startswith('$'):
+            if value[1:] not in sets:
+                raise RuleConfigError(f"Unknown set '{value}'")
+            value = sets[value[1:]]
+        if self.op in ('in', 'not_in'):
+            value = frozenset(value)
+        elif self.op == 'between':
+            low, high = value
+            value = (low, high)
+        self.value = value
+        self.fields = [f for f in (self.field, self.ref_field) if f is not None]
+        self.sources = tuple({FIELD_SOURCES[f] for f in self.fields if f in FIELD_SOURCES})
+        self.cost = max(SOURCE_COSTS.get(FIELD_SOURCES.get(f), 0) for f in self.fields)
+        self.test = self._compile()
+
+    def _compile(self):
+        """A closure over the row's field dict; missing values never match."""
+        field, ref, times, value = self.field, self.ref_field, self.times, self.value
+        if ref is not None:
+            compare = COMPARISONS[self.op]
+
+            def test(values):
+                left, right = values.get(field), values.get(ref)
+                return left is not None and right is not None and compare(left, right * times)
+        elif self.op == 'in':
+            def test(values):
+                return values.get(field) in value
+        elif self.op == 'not_in':
+            def test(values):
+                left = values.get(field)
+                return left is not None and left not in value
+        elif self.op == 'between':
+            low, high = value
+
+            def test(values):
+                left = values.get(field)
+                return left is not None and low <= left <= high
+        else:
+            compare = COMPARISONS[self.op]
+
+            def test(values):
+                left = values.get(field)
+                return left is not None and compare(left, value)
+        return test
+
+    def test_columns(self, column):
+        """Boolean mask over a batch; column(field) returns the field's array."""
+        left = column(self.field)
+        if left.dtype == object:
+            # Strings / mixed values: element-wise
+            rows = [{self.field: v} for v in left]
+            if self.ref_field is not None:
+                for row, r in zip(rows, column(self.ref_field)):
+                    row[self.ref_field] = None if r != r else r
+            return np.fromiter((self.test(row) for row in rows), dtype=bool, count=len(rows))
+
+        with np.errstate(invalid='ignore'):
+            if self.ref_field is not None:
+                result = COMPARISONS[self.op](left, column(self.ref_field).astype(np.float64) * self.times)
+            elif self.op in ('in', 'not_in'):
+                result = np.isin(left, [v for v in self.value if isinstance(v, (int, float))])
+                if self.op == 'not_in':
+                    result = ~result
+            elif self.op == 'between':
+                result = (left >= self.value[0]) & (left <= self.value[1])
+            else:
+                result = COMPARISONS[self.op](left, self.value)
+        # NaN (missing) never matches, including for != and not_in
+        return result & ~np.isnan(left)
+
+
+class Rule:
+    def __init__(self, spec, index, sets):
+        self.name = spec['name']
+        self.label = spec.get('label', self.name)
+        self.label_fields = [f for _, f, _, _ in string.Formatter().parse(self.label) if f]
+        self.index = index
+        self.conditions = sorted((Condition(c, sets) for c in spec['when']), key=lambda c: c.cost)
+        if not self.conditions:
+            raise RuleConfigError(f"Rule '{self.name}' has no conditions")
+        self.cost = max(c.cost for c in self.conditions)
+        # (sources to load first, test) per condition, for the single-row path
+        self.steps = tuple((c.sources, c.test) for c in self.conditions)
+        self.evaluated = 0
+        self.hits = 0
+        self.timed = 0
+        self.total_s = 0.0
+
+    @property
+    def mean_us(self):
+        return self.total_s / self.timed * 1e6 if self.timed else 0.0
+
+
+class RulePlan:
+    """Rules compiled from a config, ordered for cheapest-first evaluation."""
+
+    def __init__(self, config):
+        self.defaults = dict(config.get('defaults', {}))
+        sets = config.get('sets', {})
+        names = set()
+        self.rules = []
+        for i, spec in enumerate(config.get('rules', [])):
+            rule = Rule(spec, i, sets)
+            if rule.name in names:
+                raise RuleConfigError(f"Duplicate rule name '{rule.name}'")
+            names.add(rule.name)
+            self.rules.append(rule)
+        self.ordered = sorted(self.rules, key=lambda r: r.cost)
+        self._calls = itertools.count()
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_rule_config(path))
+
+    def _row_values(self, txn):
+        values = dict(self.defaults)
+        for key, value in txn.items():
+            if value is not None:
+                values[key] = value
+        return values
+
+    def evaluate(self, txn, loaders):
+        """
+        (name, label) of the rules a transaction triggers, in config order.
+        loaders[source](txn) returns a dict of that source's fields.
+        """
+        values = self._row_values(txn)
+        loaded = set()
+        hits = {}
+        timings = []
+        timed = next(self._calls) % TIMING_SAMPLE == 0
+        for rule in self.ordered:
+            if timed:
+                start = time.perf_counter()
+            matched = True
+            for sources, test in rule.steps:
+                for source in sources:
+                    if source not in loaded:
+                        loaded.add(source)
+                        values.update(loaders[source](txn))
+                if not test(values):
+                    matched = False
+                    break
+            if timed:
+                timings.append((rule, time.perf_counter() - start))
+            if matched:
+                hits[rule.index] = (rule.name, rule.label.format_map(values))
+        with self._stats_lock:
+            for rule in self.ordered:
+                rule.evaluated += 1
+                if rule.index in hits:
+                    rule.hits += 1
+            for rule, elapsed in timings:
+                rule.timed += 1
+                rule.total_s += elapsed
+        return [hits[i] for i in sorted(hits)]
+
+    def evaluate_batch(self, transactions, batch_loaders):
+        """
+        Column-wise evaluation over a batch (list of dicts or a DataFrame).
+        Transaction fields of a DataFrame are read as whole columns (NaN is
+        missing); row dicts are only built for rows that reach a history
+        loader or trigger a templated label.
+        batch_loaders[source](rows) returns {field: list of values} for the
+        given transaction dicts. Returns a list of (name, label) lists, in input order.
+        """
+        # pandas is not imported on the serving path; a DataFrame implies it is loaded
+        pd = sys.modules.get('pandas')
+        frame = transactions if pd is not None and isinstance(transactions, pd.DataFrame) else None
+        n = len(transactions)
+        if n == 0:
+            return []
+        columns = {}
+        history = {}  # field -> per-row values, None where not loaded (yet)
+        loaded = {}   # source -> rows loaded
+        rows = {}     # DataFrame rows as dicts, built only for rows that need a loader or a label
+
+        def row(i):
+            if frame is None:
+                return transactions[i]
+            if i not in rows:
+                rows[i] = {k: None if v is None or v != v else v for k, v in frame.iloc[i].items()}
+            return rows[i]
+
+        def column(field):
+            if field not in columns:
+                default = self.defaults.get(field)
+                if field in FIELD_SOURCES:
+                    columns[field] = _numeric_column(history.get(field, [None] * n))
+                elif frame is not None:
+                    columns[field] = _frame_column(frame, field, default)
+                else:
+                    raw = [default if v is None else v for v in (t.get(field) for t in transactions)]
+                    columns[field] = _numeric_column(raw)
+            return columns[field]
+
+        def ensure(source, mask):
+            done = loaded.setdefault(source, np.zeros(n, dtype=bool))
+            need = np.flatnonzero(mask & ~done)
+            if len(need) == 0:
+                return
+            values = batch_loaders[source]([row(i) for i in need])
+            for field, new in values.items():
+                if len(need) == n:
+                    history[field] = list(new)
+                else:
+                    full = history.setdefault(field, [None] * n)
+                    for i, v in zip(need, new):
+                        full[i] = v
+                columns.pop(field, None)
+            done[need] = True
+
+        matches = {}
+        elapsed = {}
+        for rule in self.ordered:
+            start = time.perf_counter()
+            mask = np.ones(n, dtype=bool)
+            for condition in rule.conditions:
+                for source in condition.sources:
+                    ensure(source, mask)
+                mask &= condition.test_columns(column)
+                if not mask.any():
+                    break
+            elapsed[rule.index] = time.perf_counter() - start
+            matches[rule.index] = mask
+        with self._stats_lock:
+            for rule in self.ordered:
+                rule.evaluated += n
+                rule.timed += n
+                rule.hits += int(matches[rule.index].sum())
+                rule.total_s += elapsed[rule.index]
+
+        results = [[] for _ in range(n)]
+        for rule in self.rules:
+            if not rule.label_fields:
+                for i in np.flatnonzero(matches[rule.index]):
+                    results[i].append((rule.name, rule.label))
+                continue
+            for i in np.flatnonzero(matches[rule.index]):
+                # Same values as the single-row path, for identical labels
+                txn = row(i)
+                values = {}
+                for field in rule.label_fields:
+                    value = history[field][i] if field in history else txn.get(field)
+                    values[field] = self.defaults.get(field) if value is None else value
+                results[i].append((rule.name, rule.label.format_map(values)))
+        return results
+
+    def stats(self):
+        stats = {'loaded': len(self.rules)}
+        with self._stats_lock:
+            for rule in self.rules:
+                stats[f'{rule.name}_evaluated'] = rule.evaluated
+                stats[f'{rule.name}_hits'] = rule.hits
+                stats[f'{rule.name}_mean_us'] = rule.mean_us
+        return stats
+
+    def describe(self):
+        with self._stats_lock:
+            return [
+                {'name': r.name, 'label': r.label, 'cost': r.cost, 'evaluated': r.evaluated, 'hits': r.hits,
+                 'mean_us': r.mean_us}
+                for r in self.rules
+            ]
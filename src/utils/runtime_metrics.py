@@ -0,0 +1,178 @@
+"""
+Runtime metrics for the API hot path
+------------------------------------
+Per-stage latency histograms and counters, cheap enough to leave on in
+production (one perf_counter pair, a bisect and a deque append per
+observation). Histograms keep cumulative Prometheus-style buckets plus a
+rolling window of recent samples for percentiles. Non-latency
+distributions (e.g. batch sizes) use observe_value() and are reported
+separately, without unit conversion.
+
+Usage:
+    from src.utils.runtime_metrics import metrics
+
+    with metrics.timer('check_rules'):
+        ...
+    metrics.incr('predictions')
+    metrics.observe_value('microbatch_size', 12)
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Bucket upper bounds in seconds (50us .. 10s)
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bucket upper bounds for observe_value() (counts, e.g. batch sizes)
+VALUE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+WINDOW = 2048
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS, window=WINDOW):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentiles(self, qs=(50, 95, 99)):
+        samples = sorted(self.recent)
+        if not samples:
+            return {f'p{q}': 0.0 for q in qs}
+        last = len(samples) - 1
+        return {f'p{q}': samples[min(last, int(round(q / 100 * last)))] for q in qs}
+
+
+class RuntimeMetrics:
+    """Registry of named histograms and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._values = {}  # name -> Histogram over VALUE_BUCKETS
+        self._counters = {}
+        self._gauges = {}  # name -> callable returning a dict of values
+        self.started_at = time.time()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    def observe_value(self, name, value):
+        """Record a unitless sample (e.g. a batch size)."""
+        with self._lock:
+            hist = self._values.get(name)
+            if hist is None:
+                hist = self._values[name] = Histogram(buckets=VALUE_BUCKETS)
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def register_gauges(self, name, fn):
+        """Report values from fn() (a dict of numbers) under name at scrape time."""
+        self._gauges[name] = fn
+
+    def unregister_gauges(self, name):
+        self._gauges.pop(name, None)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._values.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    def _collect_gauges(self):
+        gauges = {}
+        for name, fn in list(self._gauges.items()):
+            try:
+                values = fn() or {}
+            except Exception as e:
+                print(f"Error collecting gauges '{name}': {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f'{name}_{key}'] = value
+        return gauges
+
+    def to_json(self):
+        with self._lock:
+            stages = {}
+            for name, hist in self._histograms.items():
+                stages[name] = {
+                    'count': hist.count,
+                    'total_ms': hist.sum * 1000,
+                    'mean_ms': hist.sum / hist.count * 1000 if hist.count else 0.0,
+                }
+                for q, value in hist.percentiles().items():
+                    stages[name][f'{q}_ms'] = value * 1000
+            values = {}
+            for name, hist in self._values.items():
+                values[name] = {'count': hist.count, 'mean': hist.sum / hist.count if hist.count else 0.0}
+                values[name].update(hist.percentiles())
+            counters = dict(self._counters)
+        return {
+            'uptime_s': time.time() - self.started_at,
+            'stages': stages,
+            'distributions': values,
+            'counters': counters,
+            'gauges': self._collect_gauges(),
+        }
+
+    def to_prometheus(self, prefix='fraud_api'):
+        lines = []
+        with self._lock:
+            if self._histograms:
+                lines.append(f'# HELP {prefix}_stage_seconds Time spent per hot-path stage')
+                lines.append(f'# TYPE {prefix}_stage_seconds histogram')
+            for name, hist in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {hist.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {hist.count}')
+            for name, hist in sorted(self._values.items()):
+                lines.append(f'# TYPE {prefix}_{name} histogram')
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_{name}_bucket{{le="+Inf"}} {hist.count}')
+                lines.append(f'{prefix}_{name}_sum {hist.sum}')
+                lines.append(f'{prefix}_{name}_count {hist.count}')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'# TYPE {prefix}_{name}_total counter')
+                lines.append(f'{prefix}_{name}_total {value}')
+        for name, value in sorted(self._collect_gauges().items()):
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            lines.append(f'{prefix}_{name} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry
+metrics = RuntimeMetrics()
@@ -0,0 +1,282 @@
+"""
+Precomputed score lookup table
+------------------------------
+Four of the six model inputs are discrete (channel, kyc_verified_flag,
+hour, weekday); only account_age_days and transaction_amount are
+continuous. A tree only compares a continuous feature against its split
+thresholds, so between two consecutive thresholds its output is constant.
+ScoreTable precomputes the model's fraud probability over every discrete
+combination x bins of the two continuous features, with bin edges taken
+from the forest's own split thresholds (quantiles of them, weighted by how
+often each is used, when there are more than SCORE_TABLE_BINS). Scoring is
+then an array lookup instead of a walk through every tree.
+
+The error against the full model is measured when the table is built, on
+calibration rows (the test split or recent traffic), and stored with it:
+max / p99 / mean absolute error of the scores, the share of rows answered
+from the table and the number of verdicts that differ from the full model.
+Rows are scored exactly when:
+- an input is missing or outside the grid (unseen hour, kyc flag, ...);
+- the table score is within `band` of the 0.5 decision threshold. By
+  default the band is the smallest one with no flipped verdict on half of
+  the calibration rows; share and flips are reported on the other half.
+Unknown channels have their own slot (the model encodes them as all zeros).
+
+Build a table for the active model (written next to its fraud_model.pkl):
+    python -m src.utils.score_table --bins 32
+
+Configuration (environment variables):
+    SCORE_TABLE        1 to answer /predict from the table when the active version has one (default 0)
+    SCORE_TABLE_BINS   bins per continuous feature when building (default 32)
+"""
+
+import os
+import sys
+import json
+import hashlib
+from bisect import bisect_left
+
+import numpy as np
+
+from src.utils.compiled_model import CompiledModel, NODE_ARRAYS, compile_pipeline
+
+SCORE_TABLE = os.getenv("SCORE_TABLE", "0") == "1"
+SCORE_TABLE_BINS = int(os.getenv("SCORE_TABLE_BINS", "32"))
+TABLE_FILE = 'score_table.npz'
+DECISION_THRESHOLD = 0.5
+
+# Table axes, in order: channel, then the discrete and the binned features
+CATEGORICAL = 'channel'
+DISCRETE = {'kyc_verified_flag': 2, 'hour': 24, 'weekday': 7}
+CONTINUOUS = ['account_age_days', 'transaction_amount']
+UNKNOWN_CHANNEL = '\x00unknown'
+BUILD_CHUNK_ROWS = 100_000
+
+
+def model_fingerprint(compiled):
+    """
+    Identifies the model a table was built from: sha256 of the compiled
+    node arrays and preprocessing constants, so a retrained model of the
+    same shape does not match.
+    """
+    digest = hashlib.sha256(json.dumps(compiled.meta['blocks'], sort_keys=True).encode())
+    for name in NODE_ARRAYS:
+        array = np.ascontiguousarray(getattr(compiled, name))
+        digest.update(f"{name}:{array.dtype}:{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def split_thresholds(compiled, column):
+    """Every split threshold on a numeric input column, in raw (unscaled) units."""
+    for name, out, _, mean, scale in compiled._numeric:
+        if name == column:
+            splits = (compiled.feature == out) & ~compiled.is_leaf
+            return np.asarray(compiled.threshold)[splits] * scale + mean
+    raise ValueError(f"'{column}' is not a numeric model input")
+
+
+def bin_edges(thresholds, n_bins):
+    """At most n_bins - 1 edges: all thresholds, or quantiles of them when there are more."""
+    unique = np.unique(thresholds)
+    if len(unique) < n_bins:
+        return unique
+    return np.unique(np.quantile(thresholds, np.linspace(0, 1, n_bins - 1), method='nearest'))
+
+
+def bin_centers(edges):
+    """A representative value per bin; bin i is (edges[i-1], edges[i]] like a tree's x <= t split."""
+    if len(edges) == 0:
+        return np.zeros(1)
+    if len(edges) == 1:
+        return np.array([edges[0] - 1.0, edges[0] + 1.0])
+    inner = (edges[:-1] + edges[1:]) / 2
+    return np.concatenate([[edges[0] - (edges[1] - edges[0]) / 2], inner,
+                           [edges[-1] + (edges[-1] - edges[-2]) / 2]])
+
+
+class ScoreTable:
+    """Fraud probabilities over the discrete x binned feature grid."""
+
+    def __init__(self, scores, channels, edges, classes, band=0.0, error=None, fingerprint=None):
+        self.scores = scores
+        self.channels = list(channels)
+        self.edges = edges
+        self.classes_ = np.asarray(classes)
+        self.band = band
+        self.error = error or {}
+        self.fingerprint = fingerprint
+        self._channel_index = {c: i for i, c in enumerate(self.channels)}
+        self._edge_lists = [list(edges[c]) for c in CONTINUOUS]
+
+    @property
+    def cells(self):
+        return int(self.scores.size)
+
+    def lookup(self, records, band=None):
+        """
+        Table scores for records (dicts or objects with feature attributes);
+        NaN where the row must be scored exactly.
+        """
+        n = len(records)
+        get = (lambda r, c: r.get(c)) if n and isinstance(records[0], dict) else getattr
+        band = self.band if band is None else band
+        if n == 1:
+            return np.array([self._lookup_one(records[0], get, band)])
+        unknown = len(self.channels)
+        channel = np.empty(n, dtype=np.intp)
+        columns = list(DISCRETE) + CONTINUOUS
+        raw = np.empty((n, len(columns)), dtype=np.float64)
+        for i, record in enumerate(records):
+            value = get(record, CATEGORICAL)
+            channel[i] = -1 if value is None else self._channel_index.get(value, unknown)
+            for j, column in enumerate(columns):
+                value = get(record, column)
+                raw[i, j] = np.nan if value is None else value
+
+        valid = (channel >= 0) & ~np.isnan(raw).any(axis=1)
+        index = [channel]
+        for j, size in enumerate(DISCRETE.values()):
+            values = raw[:, j]
+            valid &= (values == np.round(values)) & (values >= 0) & (values < size)
+            index.append(np.where(valid, values, 0).astype(np.intp))
+        for j, column in enumerate(CONTINUOUS, start=len(DISCRETE)):
+            index.append(np.searchsorted(self.edges[column], raw[:, j], side='left'))
+
+        scores = self.scores[tuple(np.where(valid, i, 0) for i in index)].astype(np.float64)
+        valid &= np.abs(scores - DECISION_THRESHOLD) >= band
+        return np.where(valid, scores, np.nan)
+
+    def _lookup_one(self, record, get, band):
+        # Single-row /predict: plain Python is several times faster than numpy on 1-element arrays
+        value = get(record, CATEGORICAL)
+        if value is None:
+            return np.nan
+        index = [self._channel_index.get(value, len(self.channels))]
+        for column, size in DISCRETE.items():
+            value = get(record, column)
+            if value is None or not 0 <= value < size or value != int(value):
+                return np.nan
+            index.append(int(value))
+        for column, edges in zip(CONTINUOUS, self._edge_lists):
+            value = get(record, column)
+            if value is None or value != value:
+                return np.nan
+            index.append(bisect_left(edges, value))
+        score = float(self.scores[tuple(index)])
+        return score if abs(score - DECISION_THRESHOLD) >= band else np.nan
+
+    def predict(self, scores):
+        """Class labels for fraud probabilities, as argmax([1 - p, p]) would give."""
+        return self.classes_.take((scores > 1 - scores).astype(int))
+
+    def save(self, path):
+        meta = {'channels': self.channels, 'classes': self.classes_.tolist(), 'band': self.band,
+                'error': self.error, 'fingerprint': self.fingerprint}
+        np.savez(path, scores=self.scores, meta=np.array(json.dumps(meta)),
+                 **{f'edges_{c}': self.edges[c] for c in CONTINUOUS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            edges = {c: data[f'edges_{c}'] for c in CONTINUOUS}
+            return cls(data['scores'], meta['channels'], edges, meta['classes'], meta['band'], meta['error'],
+                       meta.get('fingerprint'))
+
+    def stats(self):
+        return dict({'cells': self.cells, 'band': self.band}, **self.error)
+
+
+def build_score_table(pipeline, calibration, n_bins=None, band=None):
+    """
+    Score the grid with a fitted Pipeline and measure the error on the
+    calibration frame (FEATURE_COLUMNS). band defaults to the fitted band.
+    """
+    import pandas as pd
+    compiled = CompiledModel(*compile_pipeline(pipeline))
+    n_bins = n_bins or SCORE_TABLE_BINS
+    channels = next(list(lookup) for column, _, lookup in compiled._onehot if column == CATEGORICAL)
+    edges = {c: bin_edges(split_thresholds(compiled, c), n_bins) for c in CONTINUOUS}
+
+    axes = [channels + [UNKNOWN_CHANNEL]] + [np.arange(size) for size in DISCRETE.values()]
+    axes += [bin_centers(edges[c]) for c in CONTINUOUS]
+    shape = tuple(len(a) for a in axes)
+    names = [CATEGORICAL] + list(DISCRETE) + CONTINUOUS
+    mesh = np.meshgrid(*[np.arange(len(a)) for a in axes], indexing='ij')
+    grid = pd.DataFrame({name: np.asarray(axis, dtype=object if name == CATEGORICAL else None)[m.ravel()]
+                         for name, axis, m in zip(names, axes, mesh)})
+    grid = grid[list(pipeline.named_steps['preprocessor'].feature_names_in_)]
+    positive = list(pipeline.classes_).index(compiled.classes_[-1])
+    scores = np.concatenate([
+        pipeline.predict_proba(grid.iloc[i:i + BUILD_CHUNK_ROWS])[:, positive]
+        for i in range(0, len(grid), BUILD_CHUNK_ROWS)
+    ]).astype(np.float32).reshape(shape)
+
+    table = ScoreTable(scores, channels, edges, compiled.classes_, fingerprint=model_fingerprint(compiled))
+    approx = table.lookup(calibration.to_dict(orient='records'), band=0.0)
+    exact = pipeline.predict_proba(calibration)[:, positive]
+    covered = ~np.isnan(approx)
+    flipped = covered & ((approx > DECISION_THRESHOLD) != (exact > DECISION_THRESHOLD))
+    # The band is fitted on even rows (smallest band with no flipped verdict)
+    # and checked on odd rows, so the reported share and flips are out of sample
+    fit = np.arange(len(calibration)) % 2 == 0
+    fit_flips = flipped & fit
+    if band is None:
+        band = np.abs(approx[fit_flips] - DECISION_THRESHOLD).max() + 1e-9 if fit_flips.any() else 0.0
+    table.band = float(band)
+    answered = covered & ~fit & (np.abs(approx - DECISION_THRESHOLD) >= table.band)
+    err = np.abs(approx[covered] - exact[covered]) if covered.any() else np.zeros(1)
+    table.error = {
+        'calibration_rows': int(len(calibration)),
+        'max_abs_error': float(err.max()),
+        'p99_abs_error': float(np.percentile(err, 99)),
+        'mean_abs_error': float(err.mean()),
+        'table_share': float(answered.sum() / max(1, (~fit).sum())),
+        'decision_flips': int((flipped & answered).sum()),
+    }
+    return table
+
+
+def _calibration_rows(data_path, db_path, limit=20000):
+    """The test split (as in train.py) if the processed data exists, else recent API traffic."""
+    import pandas as pd
+    from src.features.preprocess import FEATURE_COLUMNS, load_data
+    if os.path.exists(data_path):
+        from sklearn.model_selection import train_test_split
+        X, y = load_data(data_path)
+        return train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)[1]
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query(
+            f"SELECT {', '.join(FEATURE_COLUMNS)} FROM model_predictions ORDER BY id DESC LIMIT ?",
+            conn, params=(limit,)
+        )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import joblib
+    from src.utils.model_registry import ModelRegistry
+    from src.utils.db_connection import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Precompute the score lookup table for a model version")
+    parser.add_argument('--version', default=None, help="registry version (default: the active one)")
+    parser.add_argument('--bins', type=int, default=SCORE_TABLE_BINS)
+    parser.add_argument('--band', type=float, default=None, help="exact-scoring band around 0.5 (default: fitted)")
+    parser.add_argument('--data', default='data/processed/transactions_processed.csv')
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    paths = ModelRegistry().resolve(args.version)
+    if paths is None:
+        sys.exit("No model found; run src/modeling/train.py first")
+    table = build_score_table(joblib.load(paths['model_path']), _calibration_rows(args.data, args.db),
+                              n_bins=args.bins, band=args.band)
+    out_path = os.path.join(os.path.dirname(paths['model_path']), TABLE_FILE)
+    table.save(out_path)
+    print(json.dumps(table.stats(), indent=2))
+    print(f"Score table for {paths['version']} saved to {out_path}")
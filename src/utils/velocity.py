@@ -0,0 +1,171 @@
+"""
+Sliding-window transaction velocity per customer
+------------------------------------------------
+Keeps, for every active customer, the number and total amount of their
+transactions over the last 1 minute, 1 hour and 24 hours. Each window is a
+ring of time buckets with running totals, so adding an event and reading a
+window are O(1) (at most one ring's worth of stale buckets is cleared when
+a customer has been quiet). Windows are exact to one bucket width
+(5 s, 5 min and 1 h respectively).
+
+Events are transactions, not requests: a repeat of the customer's last
+transaction_id (a client retry) is not counted again, and the warm-up from
+the DB counts each transaction_id once.
+
+Memory is bounded: customers with no transaction in the longest window are
+evicted, and at most VELOCITY_MAX_CUSTOMERS are kept (least recently active
+evicted first).
+
+Configuration (environment variables):
+    VELOCITY_MAX_CUSTOMERS   customers tracked in memory (default 100000)
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from src.utils.db_pool import get_pool
+
+MAX_CUSTOMERS = int(os.getenv("VELOCITY_MAX_CUSTOMERS", "100000"))
+
+# (name, window seconds, buckets per window)
+WINDOWS = (('1m', 60, 12), ('1h', 3600, 12), ('24h', 86400, 24))
+LONGEST_WINDOW_S = max(w[1] for w in WINDOWS)
+
+
+class _Ring:
+    """Counts and amount sums per time bucket for one window, with running totals."""
+
+    __slots__ = ('width', 'size', 'head', 'counts', 'sums', 'count', 'total')
+
+    def __init__(self, window_s, size):
+        self.width = window_s / size
+        self.size = size
+        self.head = None  # newest bucket number seen
+        self.counts = [0] * size
+        self.sums = [0.0] * size
+        self.count = 0
+        self.total = 0.0
+
+    def _advance(self, bucket):
+        """Move the head forward to bucket, clearing buckets that fell out of the window."""
+        if self.head is None or bucket - self.head >= self.size:
+            self.counts = [0] * self.size
+            self.sums = [0.0] * self.size
+            self.count = 0
+            self.total = 0.0
+            self.head = bucket
+            return
+        while self.head < bucket:
+            self.head += 1
+            slot = self.head % self.size
+            self.count -= self.counts[slot]
+            self.total -= self.sums[slot]
+            self.counts[slot] = 0
+            self.sums[slot] = 0.0
+
+    def add(self, ts, amount):
+        bucket = int(ts // self.width)
+        if self.head is None or bucket > self.head:
+            self._advance(bucket)
+        elif bucket <= self.head - self.size:
+            return  # older than the window
+        slot = bucket % self.size
+        self.counts[slot] += 1
+        self.sums[slot] += amount
+        self.count += 1
+        self.total += amount
+
+    def read(self, ts):
+        bucket = int(ts // self.width)
+        if self.head is not None and bucket > self.head:
+            self._advance(bucket)
+        return self.count, self.total
+
+
+class VelocityStore:
+    """Per-customer transaction count / amount over sliding windows."""
+
+    def __init__(self, max_customers=None, windows=WINDOWS):
+        self.max_customers = max_customers or MAX_CUSTOMERS
+        self.windows = windows
+        self.longest_window_s = max(w[1] for w in windows)
+        # customer_id -> [last_seen, [_Ring per window], last transaction_id]; oldest activity first
+        self._customers = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def add(self, customer_id, amount, ts=None, transaction_id=None):
+        """Record one transaction (ts in epoch seconds, default now)."""
+        if customer_id is None or amount is None:
+            return
+        ts = time.time() if ts is None else ts
+        amount = float(amount)
+        with self._lock:
+            entry = self._customers.get(customer_id)
+            if entry is None:
+                rings = [_Ring(window_s, size) for _, window_s, size in self.windows]
+                entry = self._customers[customer_id] = [ts, rings, transaction_id]
+            else:
+                if transaction_id is not None and transaction_id == entry[2]:
+                    return  # retry of the same transaction
+                self._customers.move_to_end(customer_id)
+                entry[0] = max(entry[0], ts)
+                entry[2] = transaction_id
+            for ring in entry[1]:
+                ring.add(ts, amount)
+            self._evict(ts)
+
+    def _evict(self, now):
+        customers = self._customers
+        while customers:
+            customer_id, entry = next(iter(customers.items()))
+            if len(customers) <= self.max_customers and entry[0] > now - self.longest_window_s:
+                break
+            customers.popitem(last=False)
+            self.evictions += 1
+
+    def snapshot(self, customer_id, ts=None):
+        """{'count_1m': n, 'sum_1m': x, ...} for a customer; zeros if unknown."""
+        ts = time.time() if ts is None else ts
+        result = {}
+        with self._lock:
+            entry = self._customers.get(customer_id)
+            for i, (name, _, _) in enumerate(self.windows):
+                count, total = entry[1][i].read(ts) if entry is not None else (0, 0.0)
+                result[f'count_{name}'] = count
+                result[f'sum_{name}'] = total
+        return result
+
+    def warm_from_db(self, db_path, now=None):
+        """Replay the last 24h of model_predictions. Returns the number of events loaded."""
+        now = time.time() if now is None else now
+        since = datetime.fromtimestamp(now - self.longest_window_s).isoformat()
+        with get_pool(db_path).connection() as conn:
+            # First prediction per transaction_id; later rows are retries
+            rows = conn.execute(
+                "SELECT customer_id, transaction_amount, MIN(created_at) AS first_seen, transaction_id "
+                "FROM model_predictions WHERE created_at >= ? AND transaction_amount IS NOT NULL "
+                "GROUP BY transaction_id ORDER BY first_seen",
+                (since,)
+            ).fetchall()
+
+        with self._lock:
+            self._customers.clear()
+        loaded = 0
+        for customer_id, amount, created_at, transaction_id in rows:
+            try:
+                ts = datetime.fromisoformat(created_at).timestamp()
+            except (TypeError, ValueError):
+                continue
+            self.add(customer_id, amount, ts, transaction_id)
+            loaded += 1
+        return loaded
+
+    def stats(self):
+        return {'customers': len(self._customers), 'evictions': self.evictions}
+
+    def __len__(self):
+        return len(self._customers)
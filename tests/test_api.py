@@ -1,3 +1,4 @@
+import uuid
 import pytest
 from fastapi.testclient import TestClient
 from src.api.main import app
@@ -40,3 +41,78 @@ def test_predict_invalid_input(client):
     }
     response = client.post("/predict", json=payload)
     assert response.status_code == 422
+
+def test_predict_batch_preserves_order(client):
+    payloads = [
+        {
+            "transaction_id": f"TXN_BATCH_{i:03d}",
+            "customer_id": "CUST_BATCH",
+            "account_age_days": 365.0,
+            "transaction_amount": 50.0 + i,
+            "channel": "Online",
+            "kyc_verified_flag": 1,
+            "hour": 3 if i % 2 else 12,
+            "weekday": 2
+        }
+        for i in range(20)
+    ]
+    response = client.post("/predict/batch", json=payloads)
+    assert response.status_code == 200
+    data = response.json()
+    assert [d["transaction_id"] for d in data] == [p["transaction_id"] for p in payloads]
+    # Odd-hour rows are flagged by the rule engine
+    assert all(d["is_fraud"] for d in data[1::2])
+
+    # Batch scores match the single-transaction endpoint; a new transaction_id so it is scored, not cached
+    fresh = dict(payloads[0], transaction_id=f"TXN_BATCH_SINGLE_{uuid.uuid4().hex[:8]}")
+    single = client.post("/predict", json=fresh).json()
+    assert single["transaction_id"] == fresh["transaction_id"]
+    assert abs(single["risk_score"] - data[0]["risk_score"]) < 1e-9
+
+def test_bad_transaction_fails_only_its_own_request(client, monkeypatch):
+    from src.api import main
+    score = main.score
+
+    def failing_score(txns, bundle=None):
+        if any(t.transaction_id == "TXN_BAD" for t in txns):
+            raise ValueError("bad input")
+        return score(txns, bundle)
+
+    monkeypatch.setattr(main, "score", failing_score)
+    txns = [
+        main.TransactionInput(transaction_id=transaction_id, customer_id="CUST_PARTIAL", account_age_days=365.0,
+                              transaction_amount=50.0, channel="Pos", kyc_verified_flag=1, hour=12, weekday=2)
+        for transaction_id in ("TXN_GOOD_1", "TXN_BAD", "TXN_GOOD_2")
+    ]
+    results = main.evaluate_transactions(txns)
+    assert isinstance(results[1], main.HTTPException) and results[1].status_code == 500
+    assert [r[3] for r in (results[0], results[2])] == [main.model_bundle.version] * 2
+
+def test_predict_batch_empty(client):
+    response = client.post("/predict/batch", json=[])
+    assert response.status_code == 200
+    assert response.json() == []
+
+def test_runtime_metrics(client):
+    payload = {
+        "transaction_id": "TXN_METRICS_001",
+        "customer_id": "CUST_METRICS",
+        "account_age_days": 365.0,
+        "transaction_amount": 50.0,
+        "channel": "Online",
+        "kyc_verified_flag": 1,
+        "hour": 12,
+        "weekday": 2
+    }
+    assert client.post("/predict", json=payload).status_code == 200
+
+    data = client.get("/metrics/runtime").json()
+    assert data["counters"]["predictions"] >= 1
+    for stage in ("predict_proba", "check_rules", "get_user_average", "predict_total"):
+        assert data["stages"][stage]["count"] >= 1
+        assert data["stages"][stage]["p99_ms"] >= 0
+
+    response = client.get("/metrics/runtime", params={"format": "prometheus"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'fraud_api_stage_seconds_count{stage="predict_total"}' in response.text
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from src.api import main
+from src.utils.backpressure import BoundedExecutor, InFlightLimiter, Overloaded
+
+def test_in_flight_limiter():
+    limiter = InFlightLimiter(limit=1)
+    with limiter:
+        with pytest.raises(Overloaded) as e:
+            with limiter:
+                pass
+        assert e.value.status_code == 429
+    with limiter:
+        assert limiter.in_flight == 1
+    assert limiter.stats()['rejected'] == 1
+
+def test_bounded_executor_sheds_when_full():
+    executor = BoundedExecutor(workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as e:
+            await executor.run(lambda: None)
+        assert e.value.status_code == 503
+        release.set()
+        await asyncio.gather(*running)
+        return await executor.run(lambda: 42)
+
+    assert asyncio.run(scenario()) == 42
+    assert executor.stats()['rejected'] == 1
+    executor.shutdown()
+
+def test_predict_returns_429_when_saturated(monkeypatch):
+    monkeypatch.setattr(main, "admission", InFlightLimiter(limit=1))
+    main.admission.in_flight = 1  # one request already in flight
+    payload = {
+        "transaction_id": "TXN_SHED_001", "customer_id": "CUST_SHED", "account_age_days": 100,
+        "transaction_amount": 80.0, "channel": "atm", "kyc_verified_flag": 1, "hour": 12, "weekday": 1
+    }
+    with TestClient(main.app) as client:
+        response = client.post("/predict", json=payload)
+        batch = client.post("/predict/batch", json=[dict(payload, transaction_id="TXN_SHED_002")])
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    assert batch.status_code == 429
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from src.utils.compiled_model import CompiledModel, compile_pipeline, export_compiled_model
+
+NUMERIC = ['account_age_days', 'transaction_amount', 'kyc_verified_flag', 'hour', 'weekday']
+
+def _make_data(n, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'account_age_days': rng.integers(1, 3000, n).astype(float),
+        'transaction_amount': rng.lognormal(6, 1.2, n).round(2),
+        'channel': rng.choice(['Atm', 'Web', 'Mobile', 'Pos'], n),
+        'kyc_verified_flag': rng.integers(0, 2, n),
+        'hour': rng.integers(0, 24, n),
+        'weekday': rng.integers(0, 7, n),
+    })
+    y = ((df['transaction_amount'] > 1500) & (df['kyc_verified_flag'] == 0)) | (rng.random(n) < 0.1)
+    return df, y.astype(int)
+
+@pytest.fixture(scope="module")
+def pipeline():
+    preprocessor = ColumnTransformer([
+        ('num', Pipeline([('imputer', SimpleImputer(strategy='median')), ('scaler', StandardScaler())]), NUMERIC),
+        ('cat', Pipeline([('imputer', SimpleImputer(strategy='most_frequent')),
+                          ('onehot', OneHotEncoder(handle_unknown='ignore'))]), ['channel']),
+    ])
+    model = Pipeline([
+        ('preprocessor', preprocessor),
+        ('classifier', RandomForestClassifier(n_estimators=25, class_weight='balanced', random_state=42)),
+    ])
+    X, y = _make_data(2000, seed=0)
+    return model.fit(X, y)
+
+def test_parity_with_pipeline(pipeline, tmp_path):
+    X, _ = _make_data(500, seed=1)
+    # Missing values and an unseen category go through imputation / ignore
+    X.loc[0, 'transaction_amount'] = np.nan
+    X.loc[1, 'channel'] = 'Unknown'
+
+    export_compiled_model(pipeline, str(tmp_path / "compiled"))
+    compiled = CompiledModel.load(str(tmp_path / "compiled"))
+
+    records = X.to_dict(orient='records')
+    for record in records:
+        if pd.isna(record['transaction_amount']):
+            record['transaction_amount'] = None
+
+    np.testing.assert_allclose(compiled.predict_proba(records), pipeline.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(compiled.predict(records), pipeline.predict(X))
+
+def test_single_row_with_preallocated_buffer(pipeline):
+    compiled = CompiledModel(*compile_pipeline(pipeline))
+    X, _ = _make_data(5, seed=2)
+    buffer = np.zeros((1, compiled.n_features), dtype=np.float32)
+    for i in range(len(X)):
+        row = X.iloc[[i]]
+        proba = compiled.predict_proba(row.to_dict(orient='records'), out=buffer)
+        np.testing.assert_allclose(proba, pipeline.predict_proba(row), rtol=0, atol=1e-12)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.modeling.compress import build_variant, compare_variants, parse_spec
+from src.modeling.train import build_model
+from src.utils.compiled_model import CompiledModel, compile_pipeline
+
+def _data(n, seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        'account_age_days': rng.integers(1, 3000, n).astype(float),
+        'transaction_amount': rng.lognormal(6, 1.2, n),
+        'channel': rng.choice(['Atm', 'Web', 'Pos'], n),
+        'kyc_verified_flag': rng.integers(0, 2, n),
+        'hour': rng.integers(0, 24, n),
+        'weekday': rng.integers(0, 7, n),
+    })
+    y = ((X['transaction_amount'] > 1200) & (X['kyc_verified_flag'] == 0)) | (rng.random(n) < 0.1)
+    return X, y.astype(int)
+
+@pytest.fixture(scope="module")
+def teacher():
+    X, y = _data(1500, seed=0)
+    return build_model(n_jobs=1, n_estimators=20).fit(X, y), X
+
+def _compiled_proba(pipeline, X):
+    return CompiledModel(*compile_pipeline(pipeline)).predict_proba(X.to_dict(orient='records'))
+
+def test_depth_cap_truncates_without_refitting(teacher):
+    pipeline, X = teacher
+    clf = pipeline.named_steps['classifier']
+    deepest = max(e.tree_.max_depth for e in clf.estimators_)
+    # A cap at or beyond the deepest tree changes nothing
+    np.testing.assert_allclose(build_variant(pipeline, f'depth={deepest}').predict_proba(X), pipeline.predict_proba(X))
+
+    capped = build_variant(pipeline, 'trees=5,depth=3')
+    trees = capped.named_steps['classifier'].estimators_
+    assert len(trees) == 5 and all(e.tree_.max_depth <= 3 for e in trees)
+    assert sum(e.tree_.node_count for e in trees) <= 5 * 15
+    # A truncated tree predicts the class mix of the node at the cut
+    Xt = pipeline.named_steps['preprocessor'].transform(X).astype(np.float32)
+    original = clf.estimators_[0].tree_
+    path = original.decision_path(Xt).toarray()
+    depth_of = np.zeros(original.node_count, dtype=int)
+    for node in range(original.node_count):
+        for child in (original.children_left[node], original.children_right[node]):
+            if child != -1:
+                depth_of[child] = depth_of[node] + 1
+    cut = [max((n for n in np.flatnonzero(row) if depth_of[n] <= 3), key=lambda n: depth_of[n]) for row in path]
+    expected = original.value[cut, 0, :] / original.value[cut, 0, :].sum(axis=1, keepdims=True)
+    np.testing.assert_allclose(trees[0].predict_proba(Xt), expected)
+    # The compiled engine scores variants like the Pipeline
+    np.testing.assert_allclose(_compiled_proba(capped, X), capped.predict_proba(X), atol=1e-12)
+
+def test_distilled_student_and_report(teacher):
+    pipeline, X = teacher
+    X_test, y_test = _data(400, seed=1)
+    student = build_variant(pipeline, 'distill=1,depth=4', X)
+    assert student.named_steps['classifier'].get_depth() <= 4
+    np.testing.assert_allclose(_compiled_proba(student, X_test), student.predict_proba(X_test), atol=1e-12)
+
+    report = compare_variants(pipeline, X, X_test, y_test, ['trees=5', 'distill=1,depth=4'])
+    assert list(report['variant']) == ['baseline', 'trees=5', 'distill=1,depth=4']
+    assert list(report['trees']) == [20, 5, 1]
+    assert (report['compiled_kb'] > 0).all() and (report['single_row_p50_us'] > 0).all()
+    assert report['roc_auc'].between(0.5, 1.0).all()
+    assert report.loc[1, 'compiled_kb'] < report.loc[0, 'compiled_kb']
+
+def test_parse_spec_rejects_unknown_keys():
+    assert parse_spec('trees=50,depth=12') == {'trees': 50, 'depth': 12}
+    for spec in ('leaves=3', 'trees=0', 'distill=2,trees=5'):
+        with pytest.raises(ValueError):
+            parse_spec(spec)
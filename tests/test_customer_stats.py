@@ -0,0 +1,66 @@
+import json
+import sqlite3
+import pytest
+from src.utils.customer_stats import CustomerAggregates
+from src.utils.rule_engine import RuleEngine
+from src.utils.db_schema import migrate_model_predictions
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "test.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE model_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT,
+            customer_id TEXT,
+            features_json TEXT,
+            risk_score REAL,
+            prediction INTEGER,
+            created_at TEXT
+        )
+    ''')
+    rows = [
+        ("T1", "C1", json.dumps({"transaction_amount": [100.0]})),  # API format
+        ("T2", "C1", json.dumps({"transaction_amount": 300.0})),    # seed_db format
+        ("T3", "C2", json.dumps({"transaction_amount": 50.0})),
+    ]
+    conn.executemany(
+        "INSERT INTO model_predictions (transaction_id, customer_id, features_json) VALUES (?, ?, ?)",
+        rows
+    )
+    # Rows from before the typed columns existed are backfilled from features_json
+    migrate_model_predictions(conn.cursor())
+    conn.commit()
+    conn.close()
+    return path
+
+def test_warm_from_db(db_path):
+    stats = CustomerAggregates()
+    assert stats.warm_from_db(db_path) == 2
+    assert stats.count("C1") == 2
+    assert stats.average("C1") == pytest.approx(200.0)
+    assert stats.std("C1") == pytest.approx(100.0)
+    assert stats.average("C2") == pytest.approx(50.0)
+    assert stats.average("UNKNOWN") == 0.0
+
+def test_update_is_incremental(db_path):
+    stats = CustomerAggregates()
+    stats.warm_from_db(db_path)
+    stats.update("C2", 150.0)
+    stats.update("C3", 10.0)
+    assert stats.count("C2") == 2
+    assert stats.average("C2") == pytest.approx(100.0)
+    assert stats.average("C3") == pytest.approx(10.0)
+
+def test_rule_engine_uses_aggregates(db_path):
+    stats = CustomerAggregates()
+    stats.warm_from_db(db_path)
+    engine = RuleEngine(db_path, aggregates=stats)
+
+    # C1 average is 200 -> 1001 is > 5x
+    result = engine.check_rules({'transaction_amount': 1001, 'customer_id': 'C1', 'hour': 12})
+    assert any("Amount > 5x" in r for r in result['rules_triggered'])
+
+    result = engine.check_rules({'transaction_amount': 999, 'customer_id': 'C1', 'hour': 12})
+    assert result['triggered'] is False
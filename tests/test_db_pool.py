@@ -0,0 +1,53 @@
+import threading
+import pytest
+from src.utils.db_pool import SQLitePool
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), pool_size=2, busy_timeout_ms=2000)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER)")
+        conn.commit()
+    yield pool
+    pool.close()
+
+def test_wal_and_pragmas(pool):
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 2000
+
+def test_connections_are_reused(pool):
+    conn = pool.acquire()
+    conn.close()  # returns to the pool
+    assert pool.acquire() is conn
+
+def test_pool_is_bounded(pool):
+    pool.busy_timeout_ms = 50
+    a, b = pool.acquire(), pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    pool.release(a)
+    pool.release(b)
+
+def test_uncommitted_work_is_rolled_back_on_release(pool):
+    conn = pool.acquire()
+    conn.execute("INSERT INTO t (v) VALUES (1)")
+    conn.close()
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+def test_concurrent_writers(pool):
+    def write(n):
+        for i in range(50):
+            with pool.connection() as conn:
+                conn.execute("INSERT INTO t (v) VALUES (?)", (n,))
+                conn.commit()
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 300
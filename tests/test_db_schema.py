@@ -0,0 +1,74 @@
+import json
+import sqlite3
+from src.utils.db_schema import migrate_model_predictions
+
+def _legacy_db(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    conn.execute('''
+        CREATE TABLE model_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT, customer_id TEXT, features_json TEXT,
+            risk_score REAL, prediction INTEGER, created_at TEXT
+        )
+    ''')
+    api_features = {"account_age_days": [30], "transaction_amount": [120.5], "channel": ["Web"],
+                    "kyc_verified_flag": [0], "hour": [3], "weekday": [6]}
+    seed_features = {"account_age_days": 400, "transaction_amount": 99.0, "channel": "Pos",
+                     "kyc_verified_flag": 1, "hour": 14, "weekday": 1}
+    conn.executemany(
+        "INSERT INTO model_predictions (transaction_id, customer_id, features_json) VALUES (?, ?, ?)",
+        [("T1", "C1", json.dumps(api_features)), ("T2", "C1", json.dumps(seed_features)),
+         ("T3", "C2", "not json")]
+    )
+    conn.commit()
+    return conn
+
+def test_backfills_typed_columns_once(tmp_path):
+    conn = _legacy_db(tmp_path)
+    assert migrate_model_predictions(conn.cursor()) == 2
+    conn.commit()
+
+    rows = conn.execute('''
+        SELECT transaction_id, account_age_days, transaction_amount, channel, kyc_verified_flag, hour, weekday
+        FROM model_predictions ORDER BY id
+    ''').fetchall()
+    assert rows == [("T1", 30.0, 120.5, "Web", 0, 3, 6), ("T2", 400.0, 99.0, "Pos", 1, 14, 1),
+                    ("T3", None, None, None, None, None, None)]
+    # Second startup: nothing left to backfill
+    assert migrate_model_predictions(conn.cursor()) == 0
+
+def test_history_queries_use_indexes(tmp_path):
+    conn = _legacy_db(tmp_path)
+    migrate_model_predictions(conn.cursor())
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT AVG(transaction_amount) FROM model_predictions WHERE customer_id = ?", ("C1",)
+    ))
+    assert "idx_predictions_customer_created" in plan
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM model_predictions WHERE transaction_id = ?", ("T1",)
+    ))
+    assert "idx_predictions_transaction" in plan
+
+def _plan(conn, sql, *params):
+    return " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+def test_duplicate_transaction_ids_keep_a_plain_lookup_index(tmp_path, monkeypatch):
+    conn = _legacy_db(tmp_path)
+    conn.execute("INSERT INTO model_predictions (transaction_id, customer_id, features_json) VALUES ('T1', 'C1', '{}')")
+    conn.execute("CREATE TABLE fraud_alerts (alert_id INTEGER PRIMARY KEY AUTOINCREMENT, transaction_id TEXT)")
+    conn.executemany("INSERT INTO fraud_alerts (transaction_id) VALUES (?)", [("T1",), ("T1",)])
+    conn.commit()
+    conn.close()
+
+    from src.api import main
+    monkeypatch.setattr(main, 'DB_PATH', str(tmp_path / "legacy.db"))
+    main.init_db()
+
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_predictions_transaction', 'idx_alerts_transaction'} <= indexes
+    assert not {'idx_predictions_transaction_id', 'idx_alerts_transaction_id'} & indexes
+    assert "USING INDEX idx_predictions_transaction" in _plan(
+        conn, "SELECT * FROM model_predictions WHERE transaction_id IN (?, ?)", "T1", "T2")
+    assert "USING INDEX idx_alerts_transaction" in _plan(
+        conn, "SELECT * FROM fraud_alerts WHERE transaction_id = ?", "T1")
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from fastapi.testclient import TestClient
+from src.utils import llm_helper
+from src.utils.llm_helper import ExplanationService, TTLCache, explanation_cache_key
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Stands in for the Gemini generateContent API."""
+    calls = 0
+
+    def do_POST(self):
+        StubLLMHandler.calls += 1
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = json.dumps({
+            "candidates": [{"content": {"parts": [{"text": " Stub explanation. "}]}}]
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    server = HTTPServer(('127.0.0.1', 0), StubLLMHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubLLMHandler.calls = 0
+    monkeypatch.setattr(llm_helper, 'API_KEY', 'test-key')
+    monkeypatch.setattr(llm_helper, 'URL', f"http://127.0.0.1:{server.server_port}/generate")
+    yield StubLLMHandler
+    server.shutdown()
+
+def _wait_for(service, transaction_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = service.get(transaction_id)
+        if job and job['status'] != 'pending':
+            return job
+        time.sleep(0.01)
+    raise AssertionError("explanation not produced in time")
+
+def test_cache_key_normalizes_inputs():
+    a = explanation_cache_key({'channel': 'Web ', 'transaction_amount': 1200, 'hour': 3},
+                              ["Odd Hours (02:00-04:00)", "Amount > 5x User Average (Avg: 10.00)"],
+                              ['odd_hours', 'amount_above_user_average'])
+    b = explanation_cache_key({'channel': 'web', 'transaction_amount': 1900, 'hour': 3},
+                              ["Amount > 5x User Average (Avg: 99.00)", "Odd Hours (02:00-04:00)"],
+                              ['amount_above_user_average', 'odd_hours'])
+    assert a == b
+
+def test_cache_key_keeps_rules_with_the_same_label_prefix_apart():
+    txn = {'channel': 'web', 'transaction_amount': 1200, 'hour': 3}
+    assert (explanation_cache_key(txn, ["High Velocity (6 txns in 1m)"], ['velocity_1m'])
+            != explanation_cache_key(txn, ["High Velocity (31 txns in 1h)"], ['velocity_1h']))
+    # Without rule ids the full labels are the key
+    assert (explanation_cache_key(txn, ["High Velocity (6 txns in 1m)"])
+            != explanation_cache_key(txn, ["High Velocity (31 txns in 1h)"]))
+
+def test_ttl_cache_expires():
+    cache = TTLCache(maxsize=2, ttl=0.01)
+    cache.put('k', 'v')
+    assert cache.get('k') == 'v'
+    time.sleep(0.02)
+    assert cache.get('k') is None
+
+def test_service_uses_stub_and_cache(stub_llm):
+    saved = {}
+    threads = set()
+
+    def on_result(transaction_id, explanation):
+        threads.add(threading.current_thread())
+        saved[transaction_id] = explanation
+
+    service = ExplanationService(on_result=on_result, max_concurrency=2)
+    txn = {'channel': 'web', 'transaction_amount': 1200, 'hour': 3}
+
+    async def scenario():
+        assert service.request_async("T1", txn, 0.9, ["Odd Hours (02:00-04:00)"]) is None
+        assert service.get("T1")['status'] == 'pending'
+        await service.aclose()
+        assert service.get("T1") == {'status': 'ready', 'explanation': 'Stub explanation.'}
+
+        # Near-identical alert is answered from the cache without a remote call
+        similar = dict(txn, transaction_amount=1300)
+        assert service.request_async("T2", similar, 0.8, ["Odd Hours (02:00-04:00)"]) == 'Stub explanation.'
+        await service.aclose()
+
+    asyncio.run(scenario())
+    assert saved == {"T1": 'Stub explanation.', "T2": 'Stub explanation.'}
+    # Write-backs run off the event loop's thread
+    assert threading.main_thread() not in threads
+    assert stub_llm.calls == 1
+
+def test_service_records_failures(monkeypatch):
+    monkeypatch.setattr(llm_helper, 'API_KEY', None)
+    service = ExplanationService()
+
+    async def scenario():
+        assert service.request_async("T1", {'channel': 'web', 'hour': 3}, 0.9, []) is None
+        await service.aclose()
+
+    asyncio.run(scenario())
+    assert service.get("T1") == {'status': 'failed', 'explanation': 'Explanation unavailable (API Key missing).'}
+
+def test_alert_explanation_endpoint(stub_llm):
+    from src.api import main
+    with TestClient(main.app) as client:
+        payload = {
+            "transaction_id": "TXN_EXPLAIN_001",
+            "customer_id": "CUST_EXPLAIN",
+            "account_age_days": 100,
+            "transaction_amount": 73.0,
+            "channel": "atm",
+            "kyc_verified_flag": 1,
+            "hour": 3,
+            "weekday": 1
+        }
+        assert client.post("/predict", json=payload).json()["is_fraud"] is True
+        _wait_for(main.explanation_service, "TXN_EXPLAIN_001")
+
+        data = client.get("/alerts/TXN_EXPLAIN_001/explanation").json()
+        assert data["status"] == "ready"
+        assert data["explanation"] == "Stub explanation."
+
+        assert client.get("/alerts/NO_SUCH_TXN/explanation").status_code == 404
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_cached_explanation_is_stored_with_the_alert(stub_llm, tmp_path, monkeypatch, write_behind):
+    from src.api import main
+    monkeypatch.setattr(main, 'DB_PATH', str(tmp_path / "alerts.db"))
+    monkeypatch.setattr(main, 'WRITE_BEHIND', write_behind)
+    miss, hit = f"TXN_EXPLAIN_MISS_{write_behind}", f"TXN_EXPLAIN_HIT_{write_behind}"
+    payload = {
+        "transaction_id": miss, "customer_id": "CUST_EXPLAIN_A", "account_age_days": 100,
+        "transaction_amount": 73.0, "channel": "atm", "kyc_verified_flag": 1, "hour": 3, "weekday": 1
+    }
+    with TestClient(main.app) as client:
+        assert client.post("/predict", json=payload).json()["is_fraud"] is True
+        _wait_for(main.explanation_service, miss)
+        # Same channel, amount bucket, hour and rules: answered from the cache
+        similar = dict(payload, transaction_id=hit, customer_id="CUST_EXPLAIN_B")
+        assert "AI Explanation: Stub explanation." in client.post("/predict", json=similar).json()["reason"]
+        assert stub_llm.calls == 1
+
+    conn = sqlite3.connect(str(tmp_path / "alerts.db"))
+    rows = dict(conn.execute("SELECT transaction_id, explanation FROM fraud_alerts"))
+    conn.close()
+    assert rows == {miss: "Stub explanation.", hit: "Stub explanation."}
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import pytest
+from src.utils.backpressure import BoundedExecutor
+from src.utils.micro_batcher import MicroBatcher
+from src.utils.runtime_metrics import metrics
+
+def test_concurrent_requests_share_one_call():
+    calls = []
+    release = threading.Event()
+
+    def process(items):
+        calls.append(list(items))
+        if items == ['first']:
+            release.wait(5)
+        return [ValueError(item) if item == 'bad' else item.upper() for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher(process, BoundedExecutor(workers=1, max_queue=4), max_size=8, max_wait_ms=50)
+        batcher.start()
+        # An idle scheduler dispatches at once
+        first = asyncio.ensure_future(batcher.submit('first'))
+        await asyncio.sleep(0.01)
+        # Arrivals while it is busy are coalesced
+        others = [asyncio.ensure_future(batcher.submit(item)) for item in ('a', 'b', 'bad', 'c')]
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await first == 'FIRST'
+        results = await asyncio.gather(*others, return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results[:2] == ['A', 'B'] and results[3] == 'C'
+    assert isinstance(results[2], ValueError)
+    assert calls == [['first'], ['a', 'b', 'bad', 'c']]
+    assert metrics.to_json()['distributions']['microbatch_size']['count'] >= 2
+
+def test_batch_failure_reaches_every_caller():
+    def process(items):
+        raise RuntimeError("model down")
+
+    async def scenario():
+        batcher = MicroBatcher(process, BoundedExecutor(workers=1, max_queue=1), max_wait_ms=0)
+        batcher.start()
+        with pytest.raises(RuntimeError):
+            await batcher.submit('x')
+        await batcher.stop()
+
+    asyncio.run(scenario())
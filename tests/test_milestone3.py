@@ -1,5 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
+from src.api import main
 from src.api.main import app, init_db, DB_PATH
 import os
 import sqlite3
@@ -50,7 +51,9 @@ def test_predict_rule_fraud_odd_hour(client):
     assert data["is_fraud"] is True
     assert "Odd Hours" in data["reason"]
     
-    # Verify DB insertion
+    # Verify DB insertion (wait for the write-behind queue first)
+    if main.prediction_writer is not None:
+        main.prediction_writer.flush()
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute("SELECT * FROM fraud_alerts WHERE transaction_id=?", ("TEST_FRAUD_RULE_001",))
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from src.api import main
+from src.utils.model_registry import ModelRegistry
+
+NUMERIC = ['account_age_days', 'transaction_amount', 'kyc_verified_flag', 'hour', 'weekday']
+
+def _fit_pipeline(seed):
+    rng = np.random.default_rng(seed)
+    n = 500
+    X = pd.DataFrame({
+        'account_age_days': rng.integers(1, 3000, n).astype(float),
+        'transaction_amount': rng.lognormal(6, 1.2, n),
+        'channel': rng.choice(['Atm', 'Web', 'Pos'], n),
+        'kyc_verified_flag': rng.integers(0, 2, n),
+        'hour': rng.integers(0, 24, n),
+        'weekday': rng.integers(0, 7, n),
+    })
+    y = (rng.random(n) < 0.2).astype(int)
+    preprocessor = ColumnTransformer([
+        ('num', Pipeline([('imputer', SimpleImputer(strategy='median')), ('scaler', StandardScaler())]), NUMERIC),
+        ('cat', Pipeline([('imputer', SimpleImputer(strategy='most_frequent')),
+                          ('onehot', OneHotEncoder(handle_unknown='ignore'))]), ['channel']),
+    ])
+    return Pipeline([
+        ('preprocessor', preprocessor),
+        ('classifier', RandomForestClassifier(n_estimators=10, random_state=seed)),
+    ]).fit(X, y)
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / "registry"))
+
+def test_publish_and_resolve(registry):
+    v1 = registry.publish(_fit_pipeline(1), metrics={'roc_auc': 0.7}, version='v1')
+    v2 = registry.publish(_fit_pipeline(2), version='v2', activate=False)
+    assert registry.list_versions() == ['v1', 'v2']
+    assert registry.current_version() == v1
+
+    registry.set_current(v2)
+    paths = registry.resolve()
+    assert paths['version'] == 'v2'
+    assert paths['compiled_path'].endswith('fraud_model_compiled')
+    assert registry.info('v2')['version'] == 'v2'
+
+    with pytest.raises(ValueError):
+        registry.set_current('missing')
+    with pytest.raises(ValueError):
+        registry.resolve('../v1')
+    with pytest.raises(ValueError):
+        registry.publish(_fit_pipeline(3), version='v1')
+
+def test_hot_reload_swaps_model(registry, monkeypatch):
+    monkeypatch.setattr(main, 'model_registry', registry)
+    registry.publish(_fit_pipeline(1), version='v1')
+
+    with TestClient(main.app) as client:
+        assert client.get("/model").json()["version"] == 'v1'
+
+        registry.publish(_fit_pipeline(2), version='v2')
+        response = client.post("/model/reload", params={"wait": True})
+        assert response.status_code == 202
+        assert response.json()["version"] == 'v2'
+
+        info = client.get("/model").json()
+        assert info["version"] == 'v2'
+        assert info["engines"] == {"pipeline": True, "compiled": True}
+
+        payload = {
+            "transaction_id": "TXN_RELOAD_001", "customer_id": "CUST_RELOAD",
+            "account_age_days": 365.0, "transaction_amount": 50.0, "channel": "Pos",
+            "kyc_verified_flag": 1, "hour": 12, "weekday": 2
+        }
+        assert client.post("/predict", json=payload).status_code == 200
+        if main.prediction_writer is not None:
+            main.prediction_writer.flush()
+        with main.get_pool(main.DB_PATH).connection() as conn:
+            row = conn.execute(
+                "SELECT model_version FROM model_predictions WHERE transaction_id = ?", ("TXN_RELOAD_001",)
+            ).fetchone()
+        assert row[0] == 'v2'
+
+        assert client.post("/model/reload", params={"version": "missing", "wait": True}).status_code == 404
+        assert client.post("/model/reload", params={"version": "../../x"}).status_code == 404
+        # A failed reload keeps serving the previous version
+        assert client.get("/model").json()["version"] == 'v2'
+
+def test_resolve_rejects_paths_outside_the_registry(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "a" / "registry"))
+    registry.publish(_fit_pipeline(1), version='v1')
+    # A real model directory next to the registry must not be reachable by name
+    outside = ModelRegistry(str(tmp_path / "a"))
+    outside.publish(_fit_pipeline(2), version='vx')
+    for version in ('../vx', '..', '/tmp', 'v1/../../vx', 'x1'):
+        with pytest.raises(ValueError):
+            registry.resolve(version)
+    with pytest.raises(ValueError):
+        registry.publish(_fit_pipeline(3), version='../v9')
+    assert registry.resolve('v1')['version'] == 'v1'
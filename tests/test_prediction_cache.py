@@ -0,0 +1,116 @@
+import sqlite3
+import time
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from src.api import main
+from src.utils.db_schema import ensure_unique_index, archive_all_duplicates
+from src.utils.prediction_cache import PredictionCache, load_stored_predictions
+
+def test_cache_lru_and_ttl():
+    cache = PredictionCache(maxsize=2, ttl=60)
+    cache.put("T1", {"is_fraud": False})
+    cache.put("T2", {"is_fraud": True})
+    assert cache.get("T1") == {"is_fraud": False}
+    cache.put("T3", {"is_fraud": False})  # evicts T2, the least recently used
+    assert cache.get("T2") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+    short = PredictionCache(maxsize=10, ttl=0.01)
+    short.put("T1", {"is_fraud": False})
+    time.sleep(0.02)
+    assert short.get("T1") is None
+
+def test_unique_index_is_skipped_until_duplicates_are_archived(tmp_path):
+    db_path = str(tmp_path / "alerts.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE model_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, transaction_id TEXT, risk_score REAL, prediction INTEGER
+        )
+    ''')
+    conn.execute("CREATE TABLE fraud_alerts (alert_id INTEGER PRIMARY KEY AUTOINCREMENT, transaction_id TEXT, reason TEXT)")
+    conn.executemany("INSERT INTO model_predictions (transaction_id, risk_score, prediction) VALUES (?, ?, ?)",
+                     [("T1", 0.9, 1), ("T1", 0.8, 1), ("T2", 0.1, 0)])
+    conn.executemany("INSERT INTO fraud_alerts (transaction_id, reason) VALUES (?, ?)",
+                     [("T1", "first"), ("T1", "retry")])
+    conn.commit()
+
+    # Startup leaves the rows alone and does not create the index
+    cursor = conn.cursor()
+    assert not ensure_unique_index(cursor, 'model_predictions', 'transaction_id', 'idx_predictions_transaction_id')
+    assert conn.execute("SELECT COUNT(*) FROM model_predictions").fetchone()[0] == 3
+    conn.close()
+
+    assert archive_all_duplicates(db_path) == {'model_predictions': 1, 'fraud_alerts': 1}
+    assert archive_all_duplicates(db_path) == {'model_predictions': 0, 'fraud_alerts': 0}
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    assert ensure_unique_index(cursor, 'fraud_alerts', 'transaction_id', 'idx_alerts_transaction_id')
+    assert conn.execute("SELECT transaction_id, risk_score FROM model_predictions_duplicates").fetchall() == [("T1", 0.8)]
+    assert conn.execute("SELECT reason FROM fraud_alerts_duplicates").fetchall() == [("retry",)]
+    conn.execute("INSERT OR IGNORE INTO model_predictions (transaction_id, risk_score, prediction) VALUES ('T2', 0.5, 1)")
+
+    stored = load_stored_predictions(conn, ["T1", "T2", "T3"])
+    assert stored["T1"] == {"transaction_id": "T1", "risk_score": 0.9, "is_fraud": True, "prediction": 1,
+                            "reason": "first"}
+    assert stored["T2"]["reason"] == "Legit"
+    assert "T3" not in stored
+
+def test_retry_returns_stored_verdict(monkeypatch):
+    calls = []
+    score = main.score
+    monkeypatch.setattr(main, "score", lambda txns, bundle=None: calls.append(len(txns)) or score(txns, bundle))
+    transaction_id = f"TXN_RETRY_{uuid.uuid4().hex[:8]}"
+    payload = {
+        "transaction_id": transaction_id, "customer_id": "CUST_RETRY", "account_age_days": 100,
+        "transaction_amount": 80.0, "channel": "atm", "kyc_verified_flag": 1, "hour": 3, "weekday": 1
+    }
+    with TestClient(main.app) as client:
+        first = client.post("/predict", json=payload).json()
+        assert client.post("/predict", json=payload).json() == first
+        batch = client.post("/predict/batch", json=[payload, dict(payload, transaction_id=transaction_id + "_B")]).json()
+        assert batch[0] == first
+        assert calls == [1, 1]
+
+        if main.prediction_writer is not None:
+            main.prediction_writer.flush()
+        with main.get_pool(main.DB_PATH).connection() as conn:
+            counts = [conn.execute(f"SELECT COUNT(*) FROM {table} WHERE transaction_id = ?", (transaction_id,)).fetchone()[0]
+                      for table in ("model_predictions", "fraud_alerts")]
+        assert counts == [1, 1]
+
+        # After eviction (or from another worker) the verdict comes from the DB
+        main.prediction_cache.clear()
+        monkeypatch.setattr(main, "PREDICTION_LOOKUP_DB", True)
+        assert client.post("/predict", json=payload).json() == first
+        assert calls == [1, 1]
+        assert client.get("/metrics/runtime").json()["gauges"]["prediction_cache_hits"] >= 2
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_rescored_retry_is_not_counted_twice(tmp_path, monkeypatch, write_behind):
+    monkeypatch.setattr(main, "DB_PATH", str(tmp_path / "retry.db"))
+    monkeypatch.setattr(main, "WRITE_BEHIND", write_behind)
+    monkeypatch.setattr(main, "PREDICTION_LOOKUP_DB", False)
+    customer_id = f"CUST_RESCORE_{uuid.uuid4().hex[:8]}"
+    payloads = [{
+        "transaction_id": f"{customer_id}_TXN_{i}", "customer_id": customer_id, "account_age_days": 100,
+        "transaction_amount": amount, "channel": "Pos", "kyc_verified_flag": 1, "hour": 12, "weekday": 1
+    } for i, amount in enumerate([100.0, 300.0])]
+
+    def settle():
+        if main.prediction_writer is not None:
+            main.prediction_writer.flush()
+
+    with TestClient(main.app) as client:
+        for payload in payloads:
+            client.post("/predict", json=payload)
+        settle()
+        # The cached verdict expired: the retry is scored again, but its row is already stored
+        main.prediction_cache.clear()
+        client.post("/predict", json=payloads[0])
+        settle()
+        assert main.customer_stats.count(customer_id) == 2
+        assert main.customer_stats.average(customer_id) == 200.0
+        assert main.velocity_store.snapshot(customer_id)["count_1h"] == 2
@@ -0,0 +1,123 @@
+import os
+import queue
+import sqlite3
+import pytest
+from src.utils.prediction_writer import PredictionWriter
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "writer.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE model_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT, customer_id TEXT, features_json TEXT,
+            risk_score REAL, prediction INTEGER, created_at TEXT, model_version TEXT,
+            account_age_days REAL, transaction_amount REAL, channel TEXT,
+            kyc_verified_flag INTEGER, hour INTEGER, weekday INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE fraud_alerts (
+            alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT, customer_id TEXT, risk_score REAL,
+            reason TEXT, created_at TEXT
+        )
+    ''')
+    conn.commit()
+    conn.close()
+    return path
+
+def _rows(i):
+    prediction = (f"T{i}", "C1", "{}", 0.5, i % 2, "2025-01-01T00:00:00", "v1",
+                  365, 10.0 * i, "Web", 1, 12, 2)
+    alert = (f"T{i}", "C1", 0.5, "test", "2025-01-01T00:00:00") if i % 2 else None
+    return prediction, alert
+
+def _count(db_path, table):
+    conn = sqlite3.connect(db_path)
+    n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return n
+
+def test_batches_rows_into_few_commits(db_path):
+    writer = PredictionWriter(db_path, batch_size=100, flush_interval_ms=1000)
+    writer.start()
+    for i in range(250):
+        writer.submit(*_rows(i))
+    writer.flush()
+
+    stats = writer.stats()
+    assert stats['rows_written'] == 250
+    assert stats['queue_depth'] == 0
+    assert stats['commits'] <= 3
+    assert _count(db_path, "model_predictions") == 250
+    assert _count(db_path, "fraud_alerts") == 125
+    writer.stop()
+
+def test_stop_flushes_pending_rows(db_path):
+    writer = PredictionWriter(db_path, batch_size=1000, flush_interval_ms=10000)
+    writer.start()
+    for i in range(10):
+        writer.submit(*_rows(i))
+    writer.stop()
+    assert _count(db_path, "model_predictions") == 10
+
+def test_failed_batch_is_retried_spilled_and_replayed(tmp_path, db_path):
+    missing = str(tmp_path / "no_dir" / "writer.db")  # cannot be opened
+    spill = str(tmp_path / "spill.jsonl")
+    writer = PredictionWriter(missing, retries=2, retry_backoff_s=0.001, spill_path=spill)
+    writer.start()
+    for i in range(5):
+        writer.submit(*_rows(i))
+    writer.stop()
+    stats = writer.stats()
+    assert stats['rows_written'] == 0 and stats['retried_commits'] == 2
+    assert stats['failed_rows'] == stats['spilled_rows'] == 5
+
+    # The next writer replays the spilled rows before anything else
+    writer = PredictionWriter(db_path, spill_path=spill)
+    writer.start()
+    writer.stop()
+    assert writer.stats()['replayed_rows'] == 5
+    assert _count(db_path, "model_predictions") == 5
+    assert _count(db_path, "fraud_alerts") == 2
+    assert not os.path.exists(spill)
+
+def test_submit_without_blocking_raises_when_full(db_path):
+    writer = PredictionWriter(db_path, max_queue=1)  # not started: nothing drains the queue
+    writer.submit(*_rows(0), block=False)
+    with pytest.raises(queue.Full):
+        writer.submit(*_rows(1), block=False)
+
+def test_explanation_submit_without_blocking_raises_when_full(db_path):
+    writer = PredictionWriter(db_path, max_queue=1)  # not started: nothing drains the queue
+    writer.submit_explanation("T1", "first", block=False)
+    with pytest.raises(queue.Full):
+        writer.submit_explanation("T2", "second", block=False)
+
+def test_explanation_write_back_is_dropped_and_counted_when_full(db_path, monkeypatch):
+    from src.api import main
+    from src.utils.runtime_metrics import metrics
+    writer = PredictionWriter(db_path, max_queue=1)
+    writer.submit(*_rows(1))
+    monkeypatch.setattr(main, 'prediction_writer', writer)
+    metrics.reset()
+    main.save_explanation("T1", "late")  # returns instead of waiting for space
+    assert metrics.to_json()['counters']['explanation_writes_dropped'] == 1
+
+def test_on_inserted_skips_rows_already_stored(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE UNIQUE INDEX idx_txn ON model_predictions (transaction_id)")
+    conn.commit()
+    conn.close()
+    inserted = []
+    writer = PredictionWriter(db_path, flush_interval_ms=10, on_inserted=inserted.extend)
+    writer.start()
+    for i in (0, 1, 0):
+        writer.submit(*_rows(i))
+    writer.flush()
+    writer.submit(*_rows(1))
+    writer.stop()
+    assert [row[0] for row in inserted] == ["T0", "T1"]
+    assert _count(db_path, "model_predictions") == 2
@@ -0,0 +1,130 @@
+import sqlite3
+import pandas as pd
+import pytest
+from src.preprocessing import preprocess
+
+
+def make_raw(n=400):
+    rows = []
+    for i in range(n):
+        rows.append({
+            "transaction_id": f"T{i % 300}",  # ids 0-99 repeat later in the file
+            "customer_id": f"C{i % 17}",
+            "timestamp": f"2024-01-{1 + i % 28:02d} {i % 24:02d}:15:00",
+            "transaction_amount": f"₹{1000 + i:,}" if i % 3 == 0 else (None if i % 50 == 7 else str(10.5 + i)),
+            "channel": [" web", "Mobile ", "pos"][i % 3],
+            "kyc_verified": [None, "Yes", "no", "Y"][i % 4],
+            "account_age_days": 30 + i,
+            "is_fraud": int(i % 5 == 0),
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def raw_file(tmp_path, monkeypatch):
+    path = tmp_path / "raw.csv"
+    make_raw().to_csv(path, index=False)
+    inserted = []
+    monkeypatch.setattr(preprocess, "RAW_FILE", str(path))
+    monkeypatch.setattr(preprocess, "PROCESSED_DIR", str(tmp_path))
+    monkeypatch.setattr(preprocess, "insert_data", lambda df: inserted.append(len(df)))
+    return path, inserted
+
+
+@pytest.mark.parametrize("backend", ["disk", "memory"])
+def test_streaming_matches_in_memory_cleaning(raw_file, tmp_path, backend):
+    path, inserted = raw_file
+    expected = preprocess.clean_data(pd.read_csv(path))
+
+    stats = preprocess.run_streaming_pipeline(chunksize=64, seen_backend=backend)
+
+    out = pd.read_csv(tmp_path / "transactions_processed.csv")
+    assert list(out["transaction_id"]) == list(expected["transaction_id"])
+    assert out["transaction_amount"].tolist() == expected["transaction_amount"].tolist()
+    assert stats["rows_in"] == 400
+    assert stats["rows_out"] == len(expected) == sum(inserted)
+
+    train = pd.read_csv(tmp_path / "train.csv")
+    test = pd.read_csv(tmp_path / "test.csv")
+    assert len(train) + len(test) == len(expected)
+    assert set(train["transaction_id"]).isdisjoint(test["transaction_id"])
+
+
+def test_seen_ids_keeps_first_occurrence():
+    for backend in ("disk", "memory"):
+        seen = preprocess.SeenIds(backend)
+        assert seen.filter_new(["a", "b", "a"]).tolist() == [True, True, False]
+        assert seen.filter_new(["b", "c"]).tolist() == [False, True]
+        seen.close()
+
+
+def test_parquet_storage_matches_csv(raw_file, tmp_path):
+    pytest.importorskip("pyarrow")
+    from src.features.preprocess import load_data, resolve_data_path
+
+    path, _ = raw_file
+    df = preprocess.clean_data(pd.read_csv(path))
+    preprocess.write_table(df, "transactions_processed", "both")
+    csv_path = str(tmp_path / "transactions_processed.csv")
+    assert resolve_data_path(csv_path).endswith(".parquet")
+
+    X, y = load_data(csv_path)
+    assert str(X["channel"].dtype) == "category"
+    assert X["kyc_verified_flag"].dtype == "int8"
+    assert list(X.columns) == ["account_age_days", "transaction_amount", "kyc_verified_flag",
+                               "hour", "weekday", "channel"]
+
+    expected = pd.read_csv(csv_path)
+    assert X["transaction_amount"].tolist() == expected["transaction_amount"].tolist()
+    assert X["channel"].astype(str).tolist() == expected["channel"].tolist()
+    assert y.tolist() == expected["is_fraud"].tolist()
+
+
+def test_streaming_parquet_output(raw_file, tmp_path):
+    pytest.importorskip("pyarrow")
+    path, _ = raw_file
+    stats = preprocess.run_streaming_pipeline(chunksize=64, fmt="parquet")
+    out = pd.read_parquet(tmp_path / "transactions_processed.parquet")
+    assert len(out) == stats["rows_out"]
+    assert out["transaction_id"].is_unique
+
+
+def test_parallel_clean_data_is_byte_identical(raw_file):
+    path, _ = raw_file
+    raw = pd.read_csv(path)
+    raw.loc[0, "timestamp"] = None
+    raw.loc[150, "timestamp"] = "not a date"
+
+    serial = preprocess.clean_data(raw.copy()).to_csv(index=False)
+    parallel = preprocess.parallel_clean_data(raw.copy(), workers=3).to_csv(index=False)
+    assert parallel == serial
+
+
+def test_insert_data_upserts_on_rerun(tmp_path):
+    df = preprocess.clean_data(make_raw(120))
+    conn = sqlite3.connect(str(tmp_path / "load.db"))
+
+    stats = preprocess.insert_data(df, conn=conn)
+    assert stats["rows"] == len(df)
+    # Re-running the load must not fail on the transaction_id primary key
+    changed = df.assign(transaction_amount=df["transaction_amount"] + 1)
+    preprocess.insert_data(changed, conn=conn)
+
+    count, total = conn.execute("SELECT COUNT(*), SUM(transaction_amount) FROM transactions").fetchone()
+    assert count == len(df)
+    assert total == pytest.approx(changed["transaction_amount"].sum())
+
+    preprocess.insert_data(df, conn=conn, on_conflict="ignore")
+    total = conn.execute("SELECT SUM(transaction_amount) FROM transactions").fetchone()[0]
+    assert total == pytest.approx(changed["transaction_amount"].sum())
+    conn.close()
+
+def test_insert_data_reports_duplicate_ids_in_a_legacy_table(tmp_path):
+    df = preprocess.clean_data(make_raw(20))
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    # Older loads used to_sql: no primary key, so ids could repeat
+    pd.concat([df, df.head(2)])[preprocess.TRANSACTION_COLUMNS].to_sql("transactions", conn, index=False)
+    with pytest.raises(ValueError, match="2 duplicated transaction_ids"):
+        preprocess.insert_data(df, conn=conn)
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == len(df) + 2
+    conn.close()
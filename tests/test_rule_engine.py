@@ -10,6 +10,9 @@ class MockRuleEngine(RuleEngine):
         # Return a fixed value for testing
         return 100.0
 
+    def _get_user_averages(self, customer_ids):
+        return {c: 100.0 for c in customer_ids}
+
 def test_odd_hours():
     engine = MockRuleEngine()
     
@@ -58,3 +61,14 @@ def test_high_amount():
     txn = {'transaction_amount': 400, 'customer_id': 'C1'}
     result = engine.check_rules(txn)
     assert result['triggered'] is False
+
+def test_check_rules_batch_matches_single():
+    engine = MockRuleEngine()
+    txns = [
+        {'hour': 3, 'customer_id': 'C1'},
+        {'channel': 'web', 'kyc_verified_flag': 0, 'customer_id': 'C2'},
+        {'transaction_amount': 600, 'customer_id': 'C1'},
+        {'transaction_amount': 400, 'hour': 12, 'customer_id': 'C3'},
+    ]
+    results = engine.check_rules_batch(txns)
+    assert results == [engine.check_rules(t) for t in txns]
@@ -0,0 +1,131 @@
+import json
+import os
+import random
+import threading
+import pandas as pd
+import pytest
+from src.utils import rule_engine
+from src.utils.rule_engine import RuleEngine
+from src.utils.rule_plan import RulePlan, RuleConfigError
+from src.utils.velocity import VelocityStore
+
+class HistoryEngine(RuleEngine):
+    """Fixed user averages; counts history lookups."""
+    AVERAGES = {'C1': 100.0, 'C2': 20.0}
+
+    def __init__(self, **kwargs):
+        self.lookups = []
+        super().__init__("dummy.db", **kwargs)
+
+    def _get_user_average(self, customer_id):
+        self.lookups.append(customer_id)
+        return self.AVERAGES.get(customer_id, 0.0)
+
+    def _get_user_averages(self, customer_ids):
+        self.lookups.extend(customer_ids)
+        return {c: self.AVERAGES[c] for c in customer_ids if c in self.AVERAGES}
+
+def _write_rules(path, rules, **extra):
+    with open(path, 'w') as f:
+        json.dump(dict(extra, rules=rules), f)
+    return str(path)
+
+def test_batch_matches_single_with_default_rules():
+    velocity = VelocityStore()
+    for i in range(7):
+        velocity.add('C1', 300.0, transaction_id=f"T{i}")
+    engine = HistoryEngine(velocity=velocity)
+
+    rng = random.Random(0)
+    txns = []
+    for _ in range(300):
+        txn = {
+            'customer_id': rng.choice(['C1', 'C2', 'C3', None]),
+            'transaction_amount': rng.choice([10.0, 150.0, 600.0, 2500.0]),
+            'hour': rng.randint(0, 23),
+            'channel': rng.choice(['web', 'Pos', 'unknown', 'atm']),
+            'kyc_verified_flag': rng.randint(0, 1),
+        }
+        # Some transactions omit fields and rely on the defaults
+        for key in ('hour', 'channel', 'kyc_verified_flag'):
+            if rng.random() < 0.1:
+                del txn[key]
+        txns.append(txn)
+
+    assert engine.check_rules_batch(txns) == [engine.check_rules(t) for t in txns]
+    # A DataFrame is read column-wise; missing fields (NaN) fall back to the defaults
+    assert engine.check_rules_batch(pd.DataFrame(txns)) == engine.check_rules_batch(txns)
+    reasons = " ".join(r['reason'] for r in engine.check_rules_batch(txns))
+    for label in ("Odd Hours", "Risky Channel", "Amount > 5x", "High Velocity (8 txns in 1m)", "24h Spend"):
+        assert label in reasons
+
+def test_history_is_loaded_lazily(tmp_path):
+    path = _write_rules(tmp_path / "rules.json", [
+        {"name": "big_unverified", "label": "Big Unverified",
+         "when": [{"field": "transaction_amount", "op": ">", "value": {"field": "user_avg", "times": 3}},
+                  {"field": "kyc_verified_flag", "op": "==", "value": 0}]},
+    ])
+    engine = HistoryEngine(rules_path=path)
+
+    # The cheap KYC condition fails first, so no user average is fetched
+    assert engine.check_rules({'customer_id': 'C1', 'transaction_amount': 500, 'kyc_verified_flag': 1})['triggered'] is False
+    assert engine.lookups == []
+    assert engine.check_rules({'customer_id': 'C1', 'transaction_amount': 500, 'kyc_verified_flag': 0})['triggered'] is True
+    assert engine.lookups == ['C1']
+
+    engine.lookups = []
+    results = engine.check_rules_batch([
+        {'customer_id': 'C1', 'transaction_amount': 500, 'kyc_verified_flag': 1},
+        {'customer_id': 'C2', 'transaction_amount': 500, 'kyc_verified_flag': 0},
+    ])
+    assert [r['triggered'] for r in results] == [False, True]
+    assert engine.lookups == ['C2']
+
+def test_hot_reload_and_stats(tmp_path, monkeypatch):
+    monkeypatch.setattr(rule_engine, "RULES_RELOAD_INTERVAL_S", 1e-9)
+    path = _write_rules(tmp_path / "rules.json", [
+        {"name": "late", "label": "Late", "when": [{"field": "hour", "op": ">=", "value": 22}]},
+    ])
+    engine = HistoryEngine(rules_path=path)
+    assert engine.check_rules({'hour': 23})['rules_triggered'] == ["Late"]
+    assert engine.check_rules({'hour': 12})['triggered'] is False
+    stats = engine.rule_stats()
+    assert (stats['late_evaluated'], stats['late_hits']) == (2, 1)
+    assert stats['late_mean_us'] > 0
+
+    _write_rules(path, [
+        {"name": "very_late", "label": "Very Late", "when": [{"field": "hour", "op": "==", "value": 23}]},
+    ])
+    os.utime(path, (1, 1))
+    assert engine.check_rules({'hour': 23})['rules_triggered'] == ["Very Late"]
+
+    # A broken file keeps the current plan
+    with open(path, 'w') as f:
+        f.write("{not json")
+    os.utime(path, (2, 2))
+    assert engine.check_rules({'hour': 23})['rules_triggered'] == ["Very Late"]
+
+def test_invalid_config_is_rejected():
+    with pytest.raises(RuleConfigError):
+        RulePlan({"rules": [{"name": "x", "when": [{"field": "hour", "op": "~", "value": 1}]}]})
+    with pytest.raises(RuleConfigError):
+        RulePlan({"rules": [{"name": "x", "when": [{"field": "channel", "op": "in", "value": "$missing"}]}]})
+
+def test_counters_are_exact_under_concurrent_evaluation():
+    engine = HistoryEngine(velocity=VelocityStore())
+    txn = {'customer_id': 'C1', 'transaction_amount': 2500.0, 'hour': 3, 'channel': 'web', 'kyc_verified_flag': 0}
+
+    def work():
+        for _ in range(500):
+            engine.check_rules(txn)
+        engine.check_rules_batch([txn] * 100)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for rule in engine.plan.describe():
+        assert rule['evaluated'] == 4 * 600
+    hits = {r['name']: r['hits'] for r in engine.plan.describe()}
+    assert hits['odd_hours'] == hits['risky_channel_unverified_kyc'] == 4 * 600
@@ -0,0 +1,36 @@
+from src.utils.runtime_metrics import RuntimeMetrics
+
+def test_histogram_and_counters():
+    m = RuntimeMetrics()
+    for ms in range(1, 101):
+        m.observe('stage', ms / 1000)
+    m.incr('requests', 3)
+    m.register_gauges('queue', lambda: {'depth': 7, 'enabled': True})
+
+    data = m.to_json()
+    stage = data['stages']['stage']
+    assert stage['count'] == 100
+    assert 49 <= stage['p50_ms'] <= 51
+    assert 98 <= stage['p99_ms'] <= 100
+    assert data['counters']['requests'] == 3
+    assert data['gauges'] == {'queue_depth': 7}
+
+def test_prometheus_buckets_are_cumulative():
+    m = RuntimeMetrics()
+    with m.timer('fast'):
+        pass
+    m.observe('fast', 20.0)  # beyond the last bucket
+    text = m.to_prometheus()
+    assert 'fraud_api_stage_seconds_bucket{stage="fast",le="10.0"} 1' in text
+    assert 'fraud_api_stage_seconds_bucket{stage="fast",le="+Inf"} 2' in text
+    assert 'fraud_api_stage_seconds_count{stage="fast"} 2' in text
+
+def test_value_distributions():
+    m = RuntimeMetrics()
+    for size in (1, 8, 8, 64):
+        m.observe_value('batch_size', size)
+    data = m.to_json()
+    assert data['distributions']['batch_size']['count'] == 4
+    assert data['distributions']['batch_size']['p50'] == 8
+    assert 'batch_size' not in data['stages']
+    assert 'fraud_api_batch_size_bucket{le="8"} 3' in m.to_prometheus()
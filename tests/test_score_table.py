@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import os
+import pytest
+from fastapi.testclient import TestClient
+from src.api import main
+from src.modeling.train import build_model
+from src.utils.compiled_model import CompiledModel, compile_pipeline
+from src.utils.model_registry import ModelRegistry
+from src.utils.runtime_metrics import metrics
+from src.utils.score_table import ScoreTable, TABLE_FILE, build_score_table, model_fingerprint
+
+def _data(n, seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        'account_age_days': rng.integers(1, 3000, n).astype(float),
+        'transaction_amount': rng.lognormal(6, 1.2, n).round(2),
+        'channel': rng.choice(['Atm', 'Web', 'Pos'], n),
+        'kyc_verified_flag': rng.integers(0, 2, n),
+        'hour': rng.integers(0, 24, n),
+        'weekday': rng.integers(0, 7, n),
+    })
+    y = ((X['transaction_amount'] > 1200) & (X['kyc_verified_flag'] == 0)) | (rng.random(n) < 0.1)
+    return X, y.astype(int)
+
+@pytest.fixture(scope="module")
+def model():
+    X, y = _data(2000, seed=0)
+    return build_model(n_jobs=1, n_estimators=5, max_depth=5).fit(X, y)
+
+def test_table_with_every_threshold_is_exact(model, tmp_path):
+    calibration, _ = _data(1000, seed=1)
+    table = build_score_table(model, calibration, n_bins=1000, band=0.0)
+    assert table.error['max_abs_error'] < 1e-6
+    assert table.error['table_share'] == 1.0 and table.error['decision_flips'] == 0
+
+    table.save(str(tmp_path / "table.npz"))
+    loaded = ScoreTable.load(str(tmp_path / "table.npz"))
+    records = calibration.head(50).to_dict(orient='records')
+    batch = loaded.lookup(records)
+    np.testing.assert_allclose(batch, model.predict_proba(calibration.head(50))[:, 1], atol=1e-6)
+    # The single-row path gives the same answers
+    np.testing.assert_array_equal([loaded.lookup([r])[0] for r in records], batch)
+
+def test_off_grid_and_near_threshold_rows_are_not_answered(model):
+    calibration, _ = _data(1000, seed=1)
+    table = build_score_table(model, calibration, n_bins=4)
+    row = calibration.iloc[0].to_dict()
+    off_grid = [dict(row, hour=24), dict(row, weekday=None), dict(row, kyc_verified_flag=0.5),
+                dict(row, transaction_amount=float('nan'))]
+    for record in off_grid:
+        assert np.isnan(table.lookup([record])[0])
+    assert np.isnan(table.lookup(off_grid)).all()
+    assert not np.isnan(table.lookup([dict(row, channel='Carrier pigeon')], band=0.0)[0])
+
+    scores = table.lookup(calibration.to_dict(orient='records'), band=0.0)
+    near = np.abs(scores - 0.5) < 0.2
+    assert np.isnan(table.lookup(calibration.to_dict(orient='records'), band=0.2)[near]).all()
+    assert table.error['decision_flips'] == 0 or table.band > 0
+
+def test_score_falls_back_to_exact_model(model):
+    compiled = CompiledModel(*compile_pipeline(model))
+    calibration, _ = _data(1000, seed=1)
+    table = build_score_table(model, calibration, n_bins=8, band=0.3)
+    bundle = main.ModelBundle('test', model, compiled, table)
+    records = calibration.head(40).to_dict(orient='records') + [dict(calibration.iloc[0].to_dict(), hour=99)]
+    metrics.reset()
+
+    risk_scores, predictions = main.score(records, bundle)
+    exact, exact_predictions = main.score_exact(records, bundle)
+    answered = ~np.isnan(table.lookup(records))
+    assert not answered[-1]
+    np.testing.assert_array_equal(risk_scores[~answered], exact[~answered])
+    assert np.abs(risk_scores[answered] - exact[answered]).max() <= table.error['max_abs_error'] + 1e-6
+    np.testing.assert_array_equal(predictions, exact_predictions)
+    counters = metrics.to_json()['counters']
+    assert counters['score_table_hits'] == answered.sum()
+    assert counters['score_table_fallbacks'] == (~answered).sum()
+
+def test_table_is_rejected_for_a_retrained_model_of_the_same_shape(model):
+    compiled = CompiledModel(*compile_pipeline(model))
+    calibration, _ = _data(500, seed=1)
+    table = build_score_table(model, calibration, n_bins=4)
+    assert table.fingerprint == model_fingerprint(CompiledModel(*compile_pipeline(model)))
+
+    X, y = _data(2000, seed=0)
+    retrained = build_model(n_jobs=1, n_estimators=5, max_depth=5, random_state=7).fit(X, y)
+    other = CompiledModel(*compile_pipeline(retrained))
+    assert other.n_trees == compiled.n_trees
+    assert model_fingerprint(other) != table.fingerprint
+    bundle = main.ModelBundle('test', None, other, table)
+    main.warm_up(bundle)
+    assert bundle.table is None
+
+def test_app_serves_exactly_with_a_stale_table(model, tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    registry.publish(model, version='v1')
+    X, y = _data(2000, seed=0)
+    retrained = build_model(n_jobs=1, n_estimators=5, max_depth=5, random_state=7).fit(X, y)
+    calibration, _ = _data(500, seed=1)
+    table_dir = os.path.dirname(registry.resolve()['model_path'])
+    build_score_table(retrained, calibration, n_bins=4).save(os.path.join(table_dir, TABLE_FILE))
+    monkeypatch.setattr(main, 'model_registry', registry)
+    monkeypatch.setattr(main, 'SCORE_TABLE', True)
+    monkeypatch.setattr(main, 'DB_PATH', str(tmp_path / "stale.db"))
+
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+        payload = {
+            "transaction_id": "TXN_STALE_TABLE", "customer_id": "CUST_STALE", "account_age_days": 365.0,
+            "transaction_amount": 50.0, "channel": "Pos", "kyc_verified_flag": 1, "hour": 12, "weekday": 2
+        }
+        response = client.post("/predict", json=payload)
+        assert response.status_code == 200
+        assert main.model_bundle.version == 'v1' and main.model_bundle.table is None
+        exact, _ = main.score_exact([payload], main.model_bundle)
+        assert abs(response.json()["risk_score"] - exact[0]) < 1e-9
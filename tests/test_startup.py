@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import subprocess
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from src.api import main
+from src.modeling.train import build_model
+from src.utils.model_registry import ModelRegistry
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['pandas', 'sklearn', 'scipy', 'joblib', 'requests', 'httpx', 'dotenv']
+
+def _fit_pipeline(seed):
+    rng = np.random.default_rng(seed)
+    n = 500
+    X = pd.DataFrame({
+        'account_age_days': rng.integers(1, 3000, n).astype(float),
+        'transaction_amount': rng.lognormal(6, 1.2, n),
+        'channel': rng.choice(['Atm', 'Web', 'Pos'], n),
+        'kyc_verified_flag': rng.integers(0, 2, n),
+        'hour': rng.integers(0, 24, n),
+        'weekday': rng.integers(0, 7, n),
+    })
+    y = (rng.random(n) < 0.2).astype(int)
+    return build_model(n_jobs=1, n_estimators=10).fit(X, y)
+
+def test_import_does_not_load_heavy_modules():
+    code = (f"import sys\nfrom src.api import main\n"
+            f"print('loaded:', [m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+    out = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, capture_output=True, text=True,
+                         env=dict(os.environ, PYTHONPATH=BASE_DIR))
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip().splitlines()[-1] == 'loaded: []'
+
+def test_health_serves_compiled_model_while_pipeline_loads(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    registry.publish(_fit_pipeline(1), version='v1')
+    monkeypatch.setattr(main, 'model_registry', registry)
+    monkeypatch.setattr(main, 'MODEL_LOAD_MODE', 'full')
+
+    with TestClient(main.app) as client:
+        health = client.get("/health")
+        assert health.status_code == 200
+        assert health.json()["status"] in ("warming", "warm")
+        assert health.json()["version"] == 'v1' and health.json()["engines"]["compiled"]
+
+        payload = {
+            "transaction_id": "TXN_STARTUP_001", "customer_id": "CUST_STARTUP",
+            "account_age_days": 365.0, "transaction_amount": 50.0, "channel": "Pos",
+            "kyc_verified_flag": 1, "hour": 12, "weekday": 2
+        }
+        assert client.post("/predict", json=payload).status_code == 200
+
+        deadline = time.time() + 30
+        while health.json()["status"] == "warming" and time.time() < deadline:
+            time.sleep(0.05)
+            health = client.get("/health")
+        body = health.json()
+        assert body["status"] == "warm" and body["error"] is None
+        assert body["engines"] == {"pipeline": True, "compiled": True}
+        assert body["ready_s"] <= body["warm_s"]
+        assert main.model is main.model_bundle.pipeline
+
+def test_health_is_503_without_a_model(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    monkeypatch.setattr(registry, 'resolve', lambda version=None: None)
+    monkeypatch.setattr(main, 'model_registry', registry)
+    monkeypatch.setattr(main, 'model_bundle', None)
+
+    with TestClient(main.app) as client:
+        response = client.get("/health")
+        assert response.status_code == 503
+        assert response.json()["status"] == "cold" and response.json()["version"] is None
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import datetime
+import numpy as np
+import pandas as pd
+from src.modeling.retrain import grow_forest, retrain
+from src.modeling.train import build_model, core_budget, grid_configs, run_search
+from src.utils.model_registry import ModelRegistry
+
+def _data(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        'account_age_days': rng.integers(1, 3000, n).astype(float),
+        'transaction_amount': rng.lognormal(6, 1.2, n),
+        'channel': rng.choice(['Atm', 'Web', 'Pos'], n),
+        'kyc_verified_flag': rng.integers(0, 2, n),
+        'hour': rng.integers(0, 24, n),
+        'weekday': rng.integers(0, 7, n),
+    })
+    y = pd.Series(((X['transaction_amount'] > 800) & (X['kyc_verified_flag'] == 0)).astype(int))
+    return X, y
+
+def test_core_budget_never_oversubscribes():
+    assert core_budget(20, 8) == (8, 1)
+    assert core_budget(2, 8) == (2, 4)
+    assert core_budget(5, 1) == (1, 1)
+    for tasks in range(1, 12):
+        processes, threads = core_budget(tasks, 6)
+        assert processes * threads <= 6
+
+def test_search_ranks_configs_and_caches_preprocessor(tmp_path):
+    X, y = _data()
+    grid = {'n_estimators': [5, 20], 'max_depth': [1, None]}
+    cache_dir = str(tmp_path / "cache")
+    results, best = run_search(X, y, grid=grid, folds=3, n_jobs=2, cache_dir=cache_dir)
+
+    assert len(results) == len(grid_configs(grid)) == 4
+    assert list(results['rank']) == [1, 2, 3, 4]
+    assert results['mean_roc_auc'].is_monotonic_decreasing
+    assert best == grid_configs(grid)[int(results.iloc[0]['config_id'])]
+    assert (results['wall_s'] > 0).all() and (results['fit_s'] > 0).all()
+    # The fitted preprocessor is cached per fold, not per configuration
+    cached = [d for d, _, files in os.walk(cache_dir) if 'output.pkl' in files]
+    assert len(cached) == 3
+
+def _prediction_db(path, n, labeled, start_id=1):
+    X, y = _data(n, seed=start_id)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS model_predictions (id INTEGER PRIMARY KEY, transaction_id TEXT, "
+                 "created_at TEXT, account_age_days REAL, transaction_amount REAL, channel TEXT, "
+                 "kyc_verified_flag INTEGER, hour INTEGER, weekday INTEGER)")
+    conn.execute("CREATE TABLE IF NOT EXISTS transactions (transaction_id TEXT PRIMARY KEY, is_fraud INTEGER)")
+    now = datetime.datetime.now().isoformat()
+    for i, row in enumerate(X.itertuples(index=False)):
+        txn_id = f"T{start_id + i}"
+        conn.execute("INSERT INTO model_predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (start_id + i, txn_id, now, *row))
+        if i < labeled:
+            conn.execute("INSERT INTO transactions VALUES (?, ?)", (txn_id, int(y.iloc[i])))
+    conn.commit()
+    conn.close()
+
+def test_incremental_retrain_reads_only_new_rows(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    X, y = _data(1000, seed=42)
+    base = build_model(n_jobs=1, n_estimators=10).fit(X, y)
+    registry.publish(base, info={'last_prediction_id': 100}, version='v1')
+
+    db = str(tmp_path / "api.db")
+    _prediction_db(db, 100, labeled=0)               # before the watermark: never read
+    _prediction_db(db, 1000, labeled=900, start_id=101)  # the last 100 still await labels
+
+    result = retrain(db, registry=registry, n_trees=5, holdout=0.2, min_rows=100)
+    assert result['status'] == 'published', result['reason']
+    assert (result['delta_rows'], result['train_rows'], result['holdout_rows']) == (1000, 720, 180)
+    info = registry.info(result['version'])
+    assert info['parent_version'] == 'v1' and info['n_estimators'] == 15
+    # Watermark is the last training row; the held-out rows are next run's training data
+    assert info['last_prediction_id'] == 100 + 720
+    assert retrain(db, registry=registry, n_trees=5, min_rows=100)['delta_rows'] == 280
+
+    # Nothing new and labeled: skipped, no new version
+    assert retrain(db, registry=registry, min_rows=1000)['status'] == 'skipped'
+    assert len(registry.list_versions()) == 3
+
+def test_grow_forest_caps_trees():
+    X, y = _data(400)
+    model = grow_forest(build_model(n_jobs=1, n_estimators=10).fit(X, y), X, y, n_trees=10, max_trees=15)
+    assert len(model.named_steps['classifier'].estimators_) == 15
+    assert model.predict_proba(X).shape == (400, 2)
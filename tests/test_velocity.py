@@ -0,0 +1,88 @@
+import sqlite3
+from datetime import datetime
+from src.utils.velocity import VelocityStore
+from src.utils.rule_engine import RuleEngine
+from src.utils.db_schema import migrate_model_predictions
+
+T0 = 1_700_000_000.0  # bucket-aligned for every window
+
+def test_windows_slide():
+    store = VelocityStore()
+    store.add("C1", 10.0, T0)
+    store.add("C1", 20.0, T0 + 30)
+    snap = store.snapshot("C1", T0 + 40)
+    assert (snap["count_1m"], snap["sum_1m"]) == (2, 30.0)
+
+    # First event leaves the 1 min window, both stay in 1 h / 24 h
+    snap = store.snapshot("C1", T0 + 65)
+    assert (snap["count_1m"], snap["sum_1m"]) == (1, 20.0)
+    assert (snap["count_1h"], snap["count_24h"]) == (2, 2)
+
+    snap = store.snapshot("C1", T0 + 2 * 3600)
+    assert (snap["count_1m"], snap["count_1h"], snap["sum_24h"]) == (0, 0, 30.0)
+    assert store.snapshot("UNKNOWN", T0)["count_24h"] == 0
+
+def test_retry_of_same_transaction_is_not_counted():
+    store = VelocityStore()
+    store.add("C1", 10.0, T0, "T1")
+    store.add("C1", 10.0, T0 + 1, "T1")
+    store.add("C1", 10.0, T0 + 2, "T2")
+    assert store.snapshot("C1", T0 + 3)["count_1m"] == 2
+
+def test_evicts_idle_and_least_recent_customers():
+    store = VelocityStore(max_customers=2)
+    store.add("C1", 1.0, T0)
+    store.add("C2", 1.0, T0 + 1)
+    store.add("C3", 1.0, T0 + 2)
+    assert len(store) == 2 and store.snapshot("C1", T0 + 3)["count_1m"] == 0
+
+    store.add("C4", 1.0, T0 + 2 * 86400)
+    assert len(store) == 1
+    assert store.stats()["evictions"] == 3
+
+def test_velocity_rules():
+    store = VelocityStore()
+    engine = RuleEngine("dummy.db", velocity=store)
+    engine._get_user_average = lambda customer_id: 100.0
+    for i in range(5):
+        store.add("C1", 100.0, transaction_id=f"T{i}")
+
+    result = engine.check_rules({"customer_id": "C1", "transaction_amount": 100.0, "hour": 12})
+    assert "High Velocity (6 txns in 1m)" in result["rules_triggered"]
+    # 600 spent in 24h is under 10x the average
+    assert not any("24h Spend" in r for r in result["rules_triggered"])
+
+    result = engine.check_rules({"customer_id": "C2", "transaction_amount": 1001.0, "hour": 12})
+    assert any("24h Spend > 10x" in r for r in result["rules_triggered"])
+    assert not any("Velocity" in r for r in result["rules_triggered"])
+
+def test_warm_from_db(tmp_path):
+    path = str(tmp_path / "velocity.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE model_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, transaction_id TEXT, customer_id TEXT,
+            features_json TEXT, risk_score REAL, prediction INTEGER, created_at TEXT, transaction_amount REAL
+        )
+    ''')
+    now = T0 + 100_000
+    rows = [
+        ("T1", "C1", 10.0, now - 30),
+        ("T1", "C1", 10.0, now - 20),       # retry
+        ("T2", "C1", 5.0, now - 3000),
+        ("T3", "C2", 7.0, now - 2 * 86400),  # outside 24 h
+    ]
+    conn.executemany(
+        "INSERT INTO model_predictions (transaction_id, customer_id, transaction_amount, created_at) VALUES (?, ?, ?, ?)",
+        [(t, c, a, datetime.fromtimestamp(ts).isoformat()) for t, c, a, ts in rows]
+    )
+    # Older versions could store a retry twice; the migration keeps the first row
+    migrate_model_predictions(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    store = VelocityStore()
+    assert store.warm_from_db(path, now=now) == 2
+    snap = store.snapshot("C1", now)
+    assert (snap["count_1m"], snap["count_1h"], snap["sum_1h"]) == (1, 2, 15.0)
+    assert len(store) == 1